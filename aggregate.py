@@ -0,0 +1,431 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from itertools import chain
+from multiprocessing import Pool
+import numpy as np
+from config import *
+from grid import MAX_RESOLUTION, cell_indices_from_points, pack_grid_index, unpack_array
+from streams import _LAT_COLUMNS, _LON_COLUMNS, iter_csv
+
+# Bins points into the TB16Pix Cells at a resolution that contain them, with the count of points and the count,
+# sum, min, max and mean of any value columns per Cell, optionally rolled up to coarser resolutions, e.g.
+#
+#   python aggregate.py points.csv --resolution 10 --values depth,temp --rollup 8,6 --workers 8 -o cells.csv
+#
+# and POST /zones/aggregate?resolution=10&values=depth,temp does the same for a request body.
+#
+# Points are read as CSV, with lon and lat (and the value) columns named in a header row, or as NDJSON, one
+# {"lon": .., "lat": .., <value>: ..} object, [lon, lat, <values>...] list or GeoJSON Point Feature, with the values
+# in its properties, per line. They are parsed and assigned to Cells a chunk of AGGREGATE_CHUNK_SIZE points at a
+# time, with NumPy, and each chunk is reduced to one row per Cell, so memory use grows with the number of distinct
+# Cells, not of points. Points that can't be read, or aren't lon/lat, are counted as invalid; missing, infinite or
+# non-numeric values aren't counted in their column's statistics. A coarser Cell's statistics are those of its
+# descendants combined, as a Cell's Grid index divided by 9 is its parent's.
+#
+# A large file is split into byte ranges, at line boundaries, which a pool of worker processes aggregate
+# separately, their results being merged at the end.
+
+
+def _number(value):
+    # a JSON or CSV value as a float, or NaN if it isn't a number
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def csv_columns(header, values=()):
+    """The positions of the lon, lat and value columns in a CSV header row, given as a list of names. Raises
+    ValueError if any of them is missing"""
+    names = [name.strip().lower() for name in header]
+    lon = next((names.index(c) for c in _LON_COLUMNS if c in names), None)
+    lat = next((names.index(c) for c in _LAT_COLUMNS if c in names), None)
+    if lon is None or lat is None:
+        raise ValueError(
+            "A CSV of points must have lon and lat columns, named in a header row as one of {} and one of {}"
+            .format(", ".join(_LON_COLUMNS), ", ".join(_LAT_COLUMNS))
+        )
+    missing = [v for v in values if v.strip().lower() not in names]
+    if missing:
+        raise ValueError("The CSV has no column named {}".format(", ".join(missing)))
+    return (lon, lat) + tuple(names.index(v.strip().lower()) for v in values)
+
+
+def _csv_table(lines, positions):
+    # an (n, len(positions)) array of the numbers in the given columns of CSV lines, parsed by NumPy unless a line
+    # is short or has a value that isn't a number, when the lines are parsed one at a time
+    try:
+        return np.loadtxt(lines, delimiter=",", usecols=positions, ndmin=2, comments=None, quotechar='"')
+    except ValueError:
+        rows = [[_number(row[p]) if p < len(row) else np.nan for p in positions] for row in csv.reader(lines)]
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(positions))
+
+
+def _ndjson_row(line, values):
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return [np.nan] * (2 + len(values))
+    if isinstance(value, list):
+        row = [_number(v) for v in value[:2 + len(values)]]
+        return row + [np.nan] * (2 + len(values) - len(row))
+    if not isinstance(value, dict):
+        return [np.nan] * (2 + len(values))
+    if value.get("type") == "Feature":
+        geometry = value.get("geometry") if isinstance(value.get("geometry"), dict) else {}
+        coordinates = geometry.get("coordinates") if geometry.get("type") == "Point" else None
+        if not isinstance(coordinates, list) or len(coordinates) < 2:
+            coordinates = [None, None]
+        properties = value.get("properties") if isinstance(value.get("properties"), dict) else {}
+        return [_number(coordinates[0]), _number(coordinates[1])] + [_number(properties.get(v)) for v in values]
+    return [_number(value.get("lon")), _number(value.get("lat"))] + [_number(value.get(v)) for v in values]
+
+
+def _ndjson_table(lines, values):
+    return np.array([_ndjson_row(line, values) for line in lines], dtype=np.float64).reshape(len(lines), -1)
+
+
+def iter_line_blocks(stream, limit=None, size=4 * 1024 * 1024):
+    """Yields lists of the non-empty lines of a binary stream, decoded, reading about size bytes at a time and, if
+    limit is given, no more than limit bytes"""
+    rest = b""
+    while limit is None or limit > 0:
+        data = stream.read(size if limit is None else min(size, limit))
+        if not data:
+            break
+        if limit is not None:
+            limit -= len(data)
+        # a block ends at its last line break, the rest of it being the start of the next one
+        cut = data.rfind(b"\n") + 1
+        if cut:
+            data, rest = rest + data[:cut], data[cut:]
+            yield [line for line in data.decode("utf-8").splitlines() if line]
+        else:
+            rest += data
+    if rest:
+        yield [line for line in rest.decode("utf-8").splitlines() if line]
+
+
+def iter_point_tables(blocks, format, values=(), positions=None, chunk_size=AGGREGATE_CHUNK_SIZE):
+    """Yields (n, 2 + len(values)) arrays of the lon, lat and values of chunks of up to chunk_size points, from
+    lists of lines of CSV or NDJSON, as iter_line_blocks() gives them, format being "csv" or "ndjson". A CSV's header
+    row is its first line, unless the positions of its columns, from csv_columns(), are given. Raises ValueError if
+    a CSV header is missing or lacks a column"""
+    for lines in blocks:
+        if format == "csv" and positions is None:
+            if not lines:
+                continue
+            positions = csv_columns(next(csv.reader(lines[:1])), values)
+            lines = lines[1:]
+        for start in range(0, len(lines), chunk_size):
+            chunk = lines[start:start + chunk_size]
+            yield _csv_table(chunk, positions) if format == "csv" else _ndjson_table(chunk, values)
+
+
+def _reduce(keys, counts, value_counts, sums, mins, maxs):
+    # combines the rows with the same key
+    if not len(keys):
+        return keys, counts, value_counts, sums, mins, maxs
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    return (
+        keys[starts],
+        np.add.reduceat(counts[order], starts),
+        np.add.reduceat(value_counts[order], starts, axis=0),
+        np.add.reduceat(sums[order], starts, axis=0),
+        np.fmin.reduceat(mins[order], starts, axis=0),
+        np.fmax.reduceat(maxs[order], starts, axis=0),
+    )
+
+
+def _json_values(name, counts, sums, mins, maxs, means):
+    # the JSON of a value column's statistics for each of a list of Cells, with a float's repr as its JSON, as the
+    # values are all finite; a Cell with one value has it as its sum, min, max and mean
+    name = json.dumps(name)
+    objects = []
+    for count, sum_, min_, max_, mean in zip(counts, sums, mins, maxs, means):
+        if count == 1:
+            value = repr(sum_)
+            objects.append('%s:{"count":1,"sum":%s,"min":%s,"max":%s,"mean":%s}' % (name, value, value, value, value))
+        elif count:
+            objects.append('%s:{"count":%d,"sum":%r,"min":%r,"max":%r,"mean":%r}' % (
+                name, count, sum_, min_, max_, mean
+            ))
+        else:
+            objects.append('%s:{"count":0,"sum":0.0,"min":null,"max":null,"mean":null}' % name)
+    return objects
+
+
+def _csv_values(counts, sums, mins, maxs, means):
+    # the CSV fields of a value column's statistics for each of a list of Cells, as _json_values() gives them
+    fields = []
+    for count, sum_, min_, max_, mean in zip(counts, sums, mins, maxs, means):
+        if count == 1:
+            value = repr(sum_)
+            fields.append(",1,%s,%s,%s,%s" % (value, value, value, value))
+        elif count:
+            fields.append(",%d,%r,%r,%r,%r" % (count, sum_, min_, max_, mean))
+        else:
+            fields.append(",0,0.0,,,")
+    return fields
+
+
+class CellAggregator:
+    """The count of points, and the count, sum, min and max of each of their value columns, per Cell at a
+    resolution, kept as arrays in Grid order with one row per Cell that has points"""
+    def __init__(self, resolution, values=()):
+        self.resolution = resolution
+        self.values = list(values)
+        self.points = 0
+        self.invalid = 0
+        self._table = self._empty()
+        self._pending = []
+        self._pending_rows = 0
+
+    def _empty(self):
+        n = len(self.values)
+        return (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, n), dtype=np.int64),
+            np.empty((0, n)), np.empty((0, n)), np.empty((0, n)),
+        )
+
+    def add(self, table):
+        """Adds the points of an (n, 2 + len(values)) array of lon, lat and values"""
+        lon, lat, values = table[:, 0], table[:, 1], table[:, 2:]
+        valid = (lon >= -180) & (lon <= 180) & (lat >= -90) & (lat <= 90)  # False for NaNs
+        index = cell_indices_from_points(lon[valid], lat[valid], self.resolution)
+        on_grid = index >= 0
+        values = values[valid][on_grid]
+        self.points += len(table)
+        self.invalid += len(table) - int(on_grid.sum())
+        counted = np.isfinite(values)
+        self._add_rows(_reduce(
+            index[on_grid], np.ones(len(values), dtype=np.int64), counted.astype(np.int64),
+            np.where(counted, values, 0.0), values, values,
+        ))
+
+    def _add_rows(self, rows):
+        self._pending.append(rows)
+        self._pending_rows += len(rows[0])
+        # merged into the table once there are as many pending rows as in it, so each row is merged O(log) times
+        if self._pending_rows > max(len(self._table[0]), AGGREGATE_CHUNK_SIZE):
+            self._merge()
+
+    def _merge(self):
+        if self._pending:
+            parts = [self._table] + self._pending
+            self._table = _reduce(*(np.concatenate([p[i] for p in parts]) for i in range(6)))
+            self._pending = []
+            self._pending_rows = 0
+
+    def update(self, other):
+        """Adds the Cells of another CellAggregator of the same resolution and values, or of its state()"""
+        state = other.state() if isinstance(other, CellAggregator) else other
+        self.points += state["points"]
+        self.invalid += state["invalid"]
+        self._add_rows(state["table"])
+
+    def state(self):
+        """The aggregates as a dict of plain values and arrays, e.g. to be sent between processes"""
+        self._merge()
+        return {"points": self.points, "invalid": self.invalid, "table": self._table}
+
+    def rollup(self, resolution):
+        """A CellAggregator of the same points at a coarser resolution"""
+        self._merge()
+        coarser = CellAggregator(resolution, self.values)
+        keys, *rest = self._table
+        coarser.update({
+            "points": self.points,
+            "invalid": self.invalid,
+            "table": _reduce(keys // 9 ** (self.resolution - resolution), *rest),
+        })
+        coarser._merge()
+        return coarser
+
+    def __len__(self):
+        self._merge()
+        return len(self._table[0])
+
+    def _batches(self, batch_size):
+        # the Cells' IDs and counts, and their value counts, sums, mins, maxs and means, each as a list per value
+        # column, batch_size Cells at a time, in Grid order
+        self._merge()
+        keys, counts, value_counts, sums, mins, maxs = self._table
+        for start in range(0, len(keys), batch_size):
+            stop = start + batch_size
+            zone_ids = unpack_array(pack_grid_index(keys[start:stop], self.resolution)).tolist()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = sums[start:stop] / value_counts[start:stop]
+            yield zone_ids, counts[start:stop].tolist(), [
+                a.T.tolist() for a in (value_counts[start:stop], sums[start:stop], mins[start:stop], maxs[start:stop],
+                                       means)
+            ]
+
+    def ndjson_lines(self, batch_size=4096):
+        """Yields a line of NDJSON per Cell, in Grid order: an object of its "zone" ID, "resolution" and "count" of
+        points and, under "values", the "count", "sum", "min", "max" and "mean" of each value column, the last three
+        null where it has no values. The lines are formatted directly, rather than by json, as there are as many of
+        them as Cells"""
+        prefix = '{{"zone":"%s","resolution":{},"count":%d'.format(self.resolution)
+        for zone_ids, counts, columns in self._batches(batch_size):
+            lines = [prefix % line for line in zip(zone_ids, counts)]
+            if self.values:
+                objects = zip(*(_json_values(name, *(c[j] for c in columns)) for j, name in enumerate(self.values)))
+                lines = [line + ',"values":{' + ",".join(o) + "}" for line, o in zip(lines, objects)]
+            for line in lines:
+                yield line + "}\n"
+
+    def csv_lines(self, batch_size=4096):
+        """Yields a line of CSV per Cell, in Grid order, under csv_header(): its zone ID, resolution and count of
+        points and the count, sum, min, max and mean of each value column, the last three empty where it has no
+        values. None of them needs quoting, so the lines are formatted directly"""
+        prefix = "%s,{},%d".format(self.resolution)
+        for zone_ids, counts, columns in self._batches(batch_size):
+            lines = [prefix % line for line in zip(zone_ids, counts)]
+            for j in range(len(self.values)):
+                lines = [line + value for line, value in zip(lines, _csv_values(*(c[j] for c in columns)))]
+            for line in lines:
+                yield line + "\n"
+
+
+def aggregate(tables, resolution, values=()):
+    """A CellAggregator of the points in an iterable of arrays, as iter_point_tables() gives them"""
+    aggregator = CellAggregator(resolution, values)
+    for table in tables:
+        aggregator.add(table)
+    return aggregator
+
+
+def rollups(aggregator, resolutions):
+    """The aggregator and its rollups to each of the coarser resolutions, finest first"""
+    result = [aggregator]
+    for r in sorted(set(resolutions) - {aggregator.resolution}, reverse=True):
+        result.append(result[-1].rollup(r))
+    return result
+
+
+def csv_header(values):
+    """The header of CellAggregator.csv_lines()"""
+    header = ["zone", "resolution", "count"]
+    for name in values:
+        header += ["{}_{}".format(name, s) for s in ("count", "sum", "min", "max", "mean")]
+    return header
+
+
+def _file_ranges(path, parts, skip_first_line):
+    # byte ranges of about equal size, each starting at the start of a line
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = len(f.readline()) if skip_first_line else 0
+        step = max(1, (size - start) // parts + 1)
+        bounds = [start]
+        for b in range(start + step, size, step):
+            if b > bounds[-1]:
+                # the start of the first line starting at or after b: from the byte before it, so a line starting
+                # exactly at b is its own
+                f.seek(b - 1)
+                f.readline()
+                bounds.append(f.tell())
+    bounds = sorted(set(b for b in bounds if b < size)) + [size]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def aggregate_range(task):
+    """The CellAggregator.state() of the points in a byte range of a file"""
+    path, start, stop, format, positions, resolution, values, chunk_size = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        tables = iter_point_tables(iter_line_blocks(f, stop - start), format, values, positions, chunk_size)
+        return aggregate(tables, resolution, values).state()
+
+
+def aggregate_file(path, format, resolution, values=(), workers=None, chunk_size=AGGREGATE_CHUNK_SIZE):
+    """A CellAggregator of the points in a CSV or NDJSON file, or "-" for stdin, which, unless it's stdin or a
+    pipe, is split into ranges aggregated by a pool of worker processes. Raises ValueError if a CSV header is
+    missing or lacks a column"""
+    if path == "-" or not os.path.isfile(path):
+        with (open(sys.stdin.fileno(), "rb", closefd=False) if path == "-" else open(path, "rb")) as f:
+            tables = iter_point_tables(iter_line_blocks(f), format, values, None, chunk_size)
+            return aggregate(tables, resolution, values)
+
+    positions = None
+    if format == "csv":
+        with open(path, "rb") as f:
+            positions = csv_columns(next(csv.reader([f.readline().decode("utf-8")]), []), values)
+    workers = workers or os.cpu_count()
+    tasks = [
+        (path, start, stop, format, positions, resolution, tuple(values), chunk_size)
+        for start, stop in _file_ranges(path, workers * 4, format == "csv")
+    ]
+    aggregator = CellAggregator(resolution, values)
+    if workers == 1:
+        for state in map(aggregate_range, tasks):
+            aggregator.update(state)
+        return aggregator
+    with Pool(workers) as pool:
+        for state in pool.imap_unordered(aggregate_range, tasks):
+            aggregator.update(state)
+    return aggregator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Counts points, and aggregates their values, per TB16Pix Cell")
+    parser.add_argument("input", help="a CSV or NDJSON file of points, or - for stdin")
+    parser.add_argument("-r", "--resolution", type=int, required=True, help="the resolution of the Cells")
+    parser.add_argument("-v", "--values", default="", help="value columns to aggregate, comma separated")
+    parser.add_argument("--rollup", default="", help="coarser resolutions to roll up to as well, comma separated")
+    parser.add_argument(
+        "-f", "--format", choices=("csv", "ndjson"), help="the input's format, default: from its extension, or csv"
+    )
+    parser.add_argument("-o", "--output", default="-", help="a .csv or .ndjson file to write to, default: stdout")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes, default: one per CPU")
+    parser.add_argument(
+        "--chunk-size", type=int, default=AGGREGATE_CHUNK_SIZE, help="points parsed and binned together"
+    )
+    args = parser.parse_args()
+    values = [v.strip() for v in args.values.split(",") if v.strip()]
+    try:
+        rollup_resolutions = [int(r) for r in args.rollup.split(",") if r.strip()]
+    except ValueError:
+        parser.error("rollup must be a list of resolutions")
+    if not 0 <= args.resolution <= MAX_RESOLUTION:
+        parser.error("resolution must be 0 - {}".format(MAX_RESOLUTION))
+    if any(not 0 <= r <= args.resolution for r in rollup_resolutions):
+        parser.error("rollup resolutions must be 0 - {}".format(args.resolution))
+    if args.chunk_size < 1:
+        parser.error("chunk size must be 1 or more")
+    format = args.format or ("ndjson" if args.input.lower().endswith((".ndjson", ".jsonl", ".json")) else "csv")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    started = time.time()
+    try:
+        aggregator = aggregate_file(args.input, format, args.resolution, values, args.workers, args.chunk_size)
+    except ValueError as e:
+        parser.error(str(e))
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    aggregators = rollups(aggregator, rollup_resolutions)
+    if args.output.lower().endswith(".csv"):
+        lines = chain(iter_csv((), csv_header(values)), (line for a in aggregators for line in a.csv_lines()))
+    else:
+        lines = (line for a in aggregators for line in a.ndjson_lines())
+    for line in lines:
+        out.write(line)
+    if out is not sys.stdout:
+        out.close()
+    logging.info("{} points ({} invalid) in {} Cells at resolution {}, {:.0f} points/s".format(
+        aggregator.points, aggregator.invalid, len(aggregator), args.resolution,
+        aggregator.points / max(time.time() - started, 1e-9)
+    ))
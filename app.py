@@ -1,5 +1,11 @@
 import logging
-import markdown
+import os
+import re
+import time
+from functools import lru_cache
+from itertools import chain
+
+STARTUP = {"started": time.perf_counter()}  # the start-up report in /status
 from flask import (
     Flask,
     request,
@@ -9,28 +15,111 @@ from flask import (
     redirect,
     url_for,
     jsonify,
+    Response,
+    stream_with_context,
 )
 from config import *
-from pyldapi import Renderer, ContainerRenderer
-from model import DatasetRenderer, EarthRenderer, ZoneRenderer, CellRenderer
-
-from utils import make_cached_graph, calculate_neighbours, get_collections
+from pyldapi import Renderer
+from jinja2 import FileSystemBytecodeCache
+from model import DatasetRenderer, EarthRenderer, ZoneRenderer, CellRenderer, StreamingContainerRenderer, negotiate
+from model.rdf import GEO, iter_ntriples
+
+from utils import (
+    GRAPH_STORE,
+    ZONE_RECORD_FIELDS,
+    calculate_neighbours,
+    get_collections,
+    is_zone_id,
+    markdown_html,
+    iter_point_records,
+    iter_ring_records,
+    iter_zone_records,
+    ring_record,
+)
+from aggregate import aggregate, csv_header, iter_line_blocks, iter_point_tables, rollups
+from streams import NDJSON, iter_chunks, iter_csv, iter_ndjson, request_ids, request_points, template_response
+from grid import (
+    MAX_RESOLUTION,
+    attribute_stats,
+    attribute_tables,
+    cell_area,
+    cell_attributes,
+    cell_geojsons,
+    cell_id_from_point,
+    geometry_stats,
+    geometry_table,
+    iter_ancestors,
+    iter_attributes,
+    iter_cover,
+    iter_descendants,
+    num_cells,
+    page_cell_ids,
+    parse_bbox,
+    region_from_bbox,
+    region_from_geojson,
+)
+from caching import RESPONSE_CACHE_STORE, conditional_render, conditional_view
+from sparql import (
+    SPARQL_QUERY,
+    SPARQL_RESULTS_JSON,
+    SPARQL_RESULTS_XML,
+    QueryTimeout,
+    iter_results_csv,
+    iter_results_json,
+    query_errors,
+    query as sparql_query,
+    started,
+)
+from sparql_client import SPARQL_CLIENT
+from metrics import end_request, exposition, instrument_templates, phase, start_request
 
 app = Flask(__name__, template_folder=TEMPLATES_DIR, static_folder=STATIC_DIR)
+if TEMPLATE_CACHE_DIR:
+    # compiled templates are kept on disk, so new worker processes load them rather than compiling them again
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR))
+
+# load the static graph once per process, at startup (before gunicorn forks, if --preload is used)
+GRAPH_STORE.current()
+# and map the coarse Cells' geometry and attribute tables, building them first if need be
+geometry_table()
+attribute_tables()
+STARTUP["import_seconds"] = round(time.perf_counter() - STARTUP.pop("started"), 6)
+
+if METRICS:
+    # registered first, so the timing starts before and ends after all the other request hooks
+    @app.before_request
+    def start_timing():
+        start_request()
+
+    @app.after_request
+    def end_timing(response):
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        response.headers["Server-Timing"] = end_request(route, response.mimetype or "", response.status_code)
+        return response
+
+    instrument_templates(app)
 
 
 @app.before_request
 def before_request():
     """
-    Runs before every request and populates vocab index either from disk (VOCABS.p) or from a complete reload by
-    calling collect() for each of the vocab sources defined in config/__init__.py -> VOCAB_SOURCES
+    Runs before every request and makes the process-wide graph available as g.DATA. The graph is only reloaded by
+    the GraphStore if the data/*.ttl sources have changed.
     :return: nothing
     """
-    # check to see if g.DATA exists, if so, do nothing
-    if hasattr(g, "DATA"):
-        return
-    else:
-        g.DATA = make_cached_graph()
+    g.started = time.perf_counter()
+    with phase("graph"):
+        g.DATA = GRAPH_STORE.graph
+
+
+@app.after_request
+def after_request(response):
+    # records how long the process's first request took, which includes any work deferred from start-up
+    if "first_request_seconds" not in STARTUP and "started" in g:
+        STARTUP["first_request_seconds"] = round(time.perf_counter() - g.started, 6)
+        STARTUP["first_request"] = request.full_path
+    return response
 
 
 @app.context_processor
@@ -58,7 +147,7 @@ def context_processor():
 
 @app.route("/")
 def landing_page():
-    return DatasetRenderer(request).render()
+    return conditional_render(DatasetRenderer(request))
 
 
 @app.route("/conformance")
@@ -69,17 +158,19 @@ def conformance():
 @app.route("/collections")
 def collections():
     collections = get_collections()
-    return ContainerRenderer(
-        request,
-        "https://w3id.org/dggs/tb16pix/grid/",
-        "Collections",
-        "DGGs are made of hierarchical layers of Cell geometries. In TB16Pix, these layers are called Grids. "
-        "Additionally, this API delivers TB16Pix Zones in Collections too.",
-        "https://w3id.org/dggs/tb16pix",
-        "TB16Pix Dataset",
-        collections,
-        len(collections)
-    ).render()
+    with phase("conneg"):
+        renderer = StreamingContainerRenderer(
+            request,
+            "https://w3id.org/dggs/tb16pix/grid/",
+            "Collections",
+            "DGGs are made of hierarchical layers of Cell geometries. In TB16Pix, these layers are called Grids. "
+            "Additionally, this API delivers TB16Pix Zones in Collections too.",
+            "https://w3id.org/dggs/tb16pix",
+            "TB16Pix Dataset",
+            collections,
+            len(collections)
+        )
+    return conditional_render(renderer)
 
 
 @app.route("/collections/<string:collection_id>")
@@ -90,42 +181,128 @@ def collection(collection_id):
             400,
             "The Collection ID must be one of 'level{}'".format("', 'level".join([str(x) for x in range(10)]))
         )
-    return render_template(
+    return conditional_view(lambda: render_template(
         "collection.html",
         collection_id=collection_id,
         collection_name="Grid " + str(collection_id)
-    )
+    ))
 
 
 @app.route("/collections/<string:collection_id>/items")
 def items(collection_id):
-    features = []
-    for cell in TB16Pix.grid(int(collection_id[-1])):
+    """A page of the Cells in a Grid, as per OGC API - Features, with limit, offset and bbox paging
+
+    The page is computed directly from Cell indices (or by a pruned descent of the Grid, for a bbox) so its cost
+    doesn't depend on the Grid's resolution.
+    """
+    return conditional_view(lambda: _items_page(collection_id))
+
+
+def _items_page(collection_id):
+    try:
+        resolution = int(collection_id[-1])
+        limit = int(request.values.get("limit", ITEMS_LIMIT))
+        offset = int(request.values.get("offset", 0))
+        if not 1 <= limit <= ITEMS_MAX_LIMIT or offset < 0:
+            raise ValueError("limit must be 1 - {} and offset must not be negative".format(ITEMS_MAX_LIMIT))
+        bbox = parse_bbox(request.values["bbox"]) if request.values.get("bbox") else None
+        cell_ids, prev, next = page_cell_ids(
+            resolution,
+            limit,
+            offset=offset,
+            bbox=bbox,
+            after=request.values.get("after"),
+            before=request.values.get("before"),
+        )
+    except ValueError as e:
+        return render_api_error("Invalid Items request", 400, str(e))
+
+    mediatype = request.values.get("_mediatype") or request.accept_mimetypes.best_match(
+        ["text/html", "application/geo+json", "application/json"], default="text/html"
+    )
+    json_response = mediatype in ["application/geo+json", "application/json"]
+
+    def page_url(args):
+        if args is None:
+            return None
+        page_args = {"limit": limit}
+        if bbox is not None:
+            page_args["bbox"] = request.values["bbox"]
+        if json_response:
+            page_args["_mediatype"] = mediatype
+        page_args.update(args)
+        return url_for("items", collection_id=collection_id, _external=json_response, **page_args)
+
+    prev_url = page_url(prev)
+    next_url = page_url(next)
+    link_header = ", ".join(
+        '<{}>; rel="{}"'.format(url, rel) for url, rel in [(prev_url, "prev"), (next_url, "next")] if url is not None
+    )
+    headers = {"Link": link_header} if link_header else {}
+
+    def item_uri(cell_id):
         if LOCAL_URIS:
-            features.append((
-                url_for("item", collection_id=collection_id, item_id=str(cell)),
-                "Cell {}".format(str(cell))
-            ))
+            return url_for("item", collection_id=collection_id, item_id=cell_id, _external=json_response)
         else:
-            features.append((
-                URI_BASE_CELL[str(cell)],
-                "Cell {}".format(str(cell))
-            ))
-
-    return render_template(
+            return URI_BASE_CELL[cell_id]
+
+    if json_response:
+        links = [{"href": request.url, "rel": "self", "type": mediatype}]
+        if prev_url is not None:
+            links.append({"href": prev_url, "rel": "prev", "type": mediatype})
+        if next_url is not None:
+            links.append({"href": next_url, "rel": "next", "type": mediatype})
+        collection = {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "id": cell_id,
+                    "geometry": geometry,
+                    "properties": {"label": "Cell {}".format(cell_id), "uri": str(URI_BASE_CELL[cell_id])},
+                    "links": [{"href": item_uri(cell_id), "rel": "item"}],
+                }
+                for cell_id, geometry in zip(cell_ids, cell_geojsons(cell_ids))
+            ],
+            "links": links,
+            "numberReturned": len(cell_ids),
+        }
+        if bbox is None:
+            collection["numberMatched"] = num_cells(resolution)
+        response = jsonify(collection)
+        response.mimetype = mediatype
+        response.headers.extend(headers)
+        return response
+
+    return template_response(
         "items.html",
+        headers=headers,
         collection_name="Grid " + str(collection_id),
-        items=features
+        items=((item_uri(cell_id), "Cell {}".format(cell_id)) for cell_id in cell_ids),
+        prev_url=prev_url,
+        next_url=next_url,
     )
 
 
+def _collection_resolution(collection_id):
+    # the resolution of a Grid's Collection ID, e.g. 3, level3 or resolution-3, or None if it isn't one
+    match = re.search("[0-9]+$", collection_id)
+    return int(match.group()) if match is not None else None
+
+
 @app.route("/collections/<string:collection_id>/items/<string:item_id>")
 def item(collection_id, item_id):
     item_id = item_id.split("?")[0]
     if item_id == "Earth":
-        return EarthRenderer(request, item_id).render()
+        return conditional_render(EarthRenderer(request, item_id))
+    elif not is_zone_id(item_id) or len(item_id) - 1 != _collection_resolution(collection_id):
+        return render_api_error(
+            "Cell not found",
+            404,
+            "There is no Cell '{}' in Collection {}".format(item_id, collection_id)
+        )
     else:
-        return CellRenderer(request, item_id).render()
+        return conditional_render(CellRenderer(request, item_id))
 
 
 @app.route("/object")
@@ -141,7 +318,7 @@ def object():
     elif request.values.get("uri") == "https://w3id.org/dggs/tb16pix":
         return redirect(url_for("landing_page"))
     elif request.values.get("uri") == str(URI_BASE_ZONE.Earth):
-        return EarthRenderer(request, "Earth").render()
+        return conditional_render(EarthRenderer(request, "Earth"))
     elif request.values.get("uri") == URI_BASE_GRID:
         return redirect(url_for("collections"))
     elif request.values.get("uri").endswith("/cell/"):
@@ -153,7 +330,13 @@ def object():
         return redirect(url_for("collection", collection_id=resolution))
     elif request.values.get("uri").startswith(URI_BASE_ZONE):
         cell_id = request.values.get("uri").split("/")[-1].split("?")[0]
-        return ZoneRenderer(request, cell_id).render()
+        if not is_zone_id(cell_id):
+            return render_api_error(
+                "URI not known",
+                404,
+                "'{}' is not a TB16Pix Zone ID".format(cell_id)
+            )
+        return conditional_render(ZoneRenderer(request, cell_id))
     elif request.values.get("uri").startswith(URI_BASE_CELL):
         zone_id = request.values.get("uri").split("/")[-1]
         resolution = "resolution-" + str(len(zone_id) - 1)
@@ -168,19 +351,432 @@ def object():
         )
 
 
+@app.route("/zones/lookup", methods=["POST"])
+def zones_lookup():
+    """Describes many Zones in one request: their parent, children, neighbours and default geometry
+
+    The Zone IDs are POSTed as a JSON list, NDJSON or one per line, and one JSON record per Zone is streamed
+    back as NDJSON as it is made. The fields query parameter, e.g. ?fields=parent,neighbours, limits what each
+    record contains.
+    """
+    fields = request.values.get("fields")
+    fields = ZONE_RECORD_FIELDS if fields is None else tuple(f.strip() for f in fields.split(","))
+    unknown = set(fields) - set(ZONE_RECORD_FIELDS)
+    if unknown:
+        return render_api_error(
+            "Invalid Zones lookup request",
+            400,
+            "Unknown fields: {}. Fields must be some of {}".format(", ".join(unknown), ", ".join(ZONE_RECORD_FIELDS)),
+            mediatype="application/json",
+        )
+    try:
+        zone_ids = request_ids(request, "zones")
+    except ValueError as e:
+        return render_api_error("Invalid Zones lookup request", 400, str(e), mediatype="application/json")
+
+    return Response(
+        stream_with_context(iter_ndjson(iter_zone_records(zone_ids, fields))),
+        mimetype=NDJSON,
+    )
+
+
+def _resolution_arg():
+    # the resolution query parameter of the point endpoints; raises ValueError if missing or invalid
+    resolution = request.values.get("resolution")
+    if resolution is None or not resolution.isdigit() or int(resolution) > MAX_RESOLUTION:
+        raise ValueError("You must supply a resolution, 0 - {}, with the parameter ?resolution=".format(MAX_RESOLUTION))
+    return int(resolution)
+
+
+@app.route("/zones/point")
+def zones_point():
+    """The Zone at a resolution that contains a point: /zones/point?lon=..&lat=..&resolution=.."""
+    try:
+        resolution = _resolution_arg()
+        lon = float(request.values.get("lon", ""))
+        lat = float(request.values.get("lat", ""))
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise ValueError
+    except ValueError as e:
+        return render_api_error(
+            "Invalid point lookup request",
+            400,
+            str(e) or "You must supply a point within -180,-90,180,90 with the parameters ?lon= and ?lat=",
+            mediatype="application/json",
+        )
+
+    def render():
+        zone_id = cell_id_from_point(lon, lat, resolution)
+        return jsonify({
+            "lon": lon,
+            "lat": lat,
+            "resolution": resolution,
+            "zone": zone_id,
+            "uri": str(URI_BASE_ZONE[zone_id]),
+            "cell": str(URI_BASE_CELL[zone_id]),
+        })
+
+    return conditional_view(render)
+
+
+@app.route("/zones/points", methods=["POST"])
+def zones_points():
+    """The Zones at a resolution that contain many points, e.g. /zones/points?resolution=10
+
+    The points are POSTed as CSV (lon and lat columns), GeoJSON or NDJSON and projected onto the grid a batch at a
+    time, and one record per point is streamed back as it is made: NDJSON or, if the request Accepts text/csv or
+    has ?_mediatype=text/csv, CSV.
+    """
+    try:
+        resolution = _resolution_arg()
+        points = request_points(request)
+    except ValueError as e:
+        return render_api_error("Invalid points lookup request", 400, str(e), mediatype="application/json")
+
+    mediatype = request.values.get("_mediatype") or request.accept_mimetypes.best_match([NDJSON, "text/csv"], NDJSON)
+    records = iter_point_records(points, resolution)
+    if mediatype == "text/csv":
+        rows = (
+            (r.get("id", ""), r.get("lon", ""), r.get("lat", ""), r.get("zone", ""), r.get("error", ""))
+            for r in records
+        )
+        return Response(
+            stream_with_context(iter_csv(rows, ("id", "lon", "lat", "zone", "error"))),
+            mimetype="text/csv",
+        )
+    return Response(stream_with_context(iter_ndjson(records)), mimetype=NDJSON)
+
+
+@app.route("/zones/cover", methods=["GET", "POST"])
+def zones_cover():
+    """The Zones at a resolution that cover a region: /zones/cover?resolution=..&bbox=.. or a GeoJSON Polygon,
+    MultiPolygon, Feature or FeatureCollection POSTed to /zones/cover?resolution=..
+
+    With ?compact=true, complete sets of 9 sibling Zones are replaced by their parent, repeatedly. The Zone IDs are
+    streamed back as NDJSON, one JSON string per line (which /zones/lookup accepts), or, if the request Accepts
+    application/json, as a JSON object.
+    """
+    try:
+        resolution = _resolution_arg()
+        if request.method == "POST":
+            body = request.get_json(silent=True, force=True)
+            if body is None:
+                raise ValueError("You must POST a GeoJSON Polygon, MultiPolygon, Feature or FeatureCollection")
+            region = region_from_geojson(body)
+        elif request.values.get("bbox") is not None:
+            region = region_from_bbox(parse_bbox(request.values.get("bbox")))
+        else:
+            raise ValueError("You must supply a region, with the parameter ?bbox= or a POSTed GeoJSON geometry")
+    except ValueError as e:
+        return render_api_error("Invalid cover request", 400, str(e), mediatype="application/json")
+    compact = request.values.get("compact", "false").lower() in ("true", "1", "yes")
+
+    def render():
+        zone_ids = iter_cover(region, resolution, compact)
+        mediatype = request.values.get("_mediatype") or request.accept_mimetypes.best_match(
+            [NDJSON, "application/json"], NDJSON
+        )
+        if mediatype == "application/json":
+            return jsonify({"resolution": resolution, "compact": compact, "zones": list(zone_ids)})
+        return Response(stream_with_context(iter_ndjson(zone_ids)), mimetype=NDJSON)
+
+    return conditional_view(render) if request.method == "GET" else render()
+
+
+def _hierarchy_response(top_id, zone_ids, predicate):
+    # the Zones of a walk of the hierarchy from top_id as NDJSON records or, if the request Accepts
+    # application/n-triples, as predicate triples from top_id, streamed in chunks as they're made
+    mediatype = request.values.get("_mediatype") or request.accept_mimetypes.best_match(
+        [NDJSON, "application/n-triples"], NDJSON
+    )
+    base = str(URI_BASE_ZONE)
+    if mediatype == "application/n-triples":
+        triples = ((base + top_id, predicate, base + zone_id) for zone_id in zone_ids)
+        return Response(
+            stream_with_context(iter_chunks(iter_ntriples(triples))), mimetype="application/n-triples"
+        )
+    records = (
+        {
+            "id": zone_id,
+            "uri": base + zone_id,
+            "resolution": len(zone_id) - 1 if zone_id != "Earth" else None,
+            "parent": (zone_id[:-1] or "Earth") if zone_id != "Earth" else None,
+        }
+        for zone_id in zone_ids
+    )
+    return Response(stream_with_context(iter_chunks(iter_ndjson(records))), mimetype=NDJSON)
+
+
+def _depth_arg(zone_id, default):
+    # the depth below a Zone of the ?depth= or ?resolution= parameter, or default if there is neither; raises
+    # ValueError if the Zone ID or the parameters are invalid
+    if not is_zone_id(zone_id):
+        raise ValueError("'{}' is not a TB16Pix Zone ID".format(zone_id))
+    top = -1 if zone_id == "Earth" else len(zone_id) - 1
+    depth = request.values.get("depth")
+    resolution = request.values.get("resolution")
+    if depth is not None and resolution is not None:
+        raise ValueError("You may supply either ?depth= or ?resolution=, not both")
+    if resolution is None and not depth:
+        return default
+    try:
+        depth = int(resolution) - top if resolution is not None else int(depth)
+    except ValueError:
+        depth = 0
+    if not 0 < depth <= MAX_RESOLUTION - top:
+        raise ValueError(
+            "The depth must be 1 - {0}, or the resolution {1} - {2}, below Zone {3}".format(
+                MAX_RESOLUTION - top, top + 1, MAX_RESOLUTION, zone_id
+            )
+        )
+    return depth
+
+
+@app.route("/zones/<string:zone_id>/descendants")
+def zones_descendants(zone_id):
+    """The descendants of a Zone, or of Earth, down to a depth below it, /zones/R08/descendants?depth=2, or to a
+    resolution, ?resolution=5 (the default is its children)
+
+    Each Zone comes before its children, as when sorting their IDs, or, with ?leaves=true, only the Zones at the
+    depth are returned. They are streamed as they are made, one NDJSON record per Zone or, if the request Accepts
+    application/n-triples, as geo:sfContains triples from the Zone.
+    """
+    try:
+        depth = _depth_arg(zone_id, 1)
+    except ValueError as e:
+        return render_api_error("Invalid descendants request", 400, str(e), mediatype="application/json")
+    leaves_only = request.values.get("leaves", "false").lower() in ("true", "1", "yes")
+
+    return conditional_view(
+        lambda: _hierarchy_response(zone_id, iter_descendants(zone_id, depth, leaves_only), str(GEO.sfContains))
+    )
+
+
+@app.route("/zones/<string:zone_id>/ancestors")
+def zones_ancestors(zone_id):
+    """The ancestors of a Zone, its parent first and Earth last, as NDJSON records or, if the request Accepts
+    application/n-triples, as geo:sfWithin triples from the Zone"""
+    if not is_zone_id(zone_id):
+        return render_api_error(
+            "Invalid ancestors request",
+            400,
+            "'{}' is not a TB16Pix Zone ID".format(zone_id),
+            mediatype="application/json",
+        )
+    return conditional_view(lambda: _hierarchy_response(zone_id, iter_ancestors(zone_id), str(GEO.sfWithin)))
+
+
+def _k_arg():
+    # the k query parameter of the rings endpoints; raises ValueError if missing or invalid
+    k = request.values.get("k")
+    if k is None or not k.isdigit() or int(k) > RINGS_MAX_K:
+        raise ValueError("You must supply the number of steps out, 0 - {}, with the parameter ?k=".format(RINGS_MAX_K))
+    return int(k)
+
+
+@app.route("/zones/<string:zone_id>/rings")
+def zones_rings(zone_id):
+    """The Zones around a Zone up to k steps, across the edges between Zones, from it, /zones/R08/rings?k=3, in
+    rings by their number of steps from it, the Zone itself first, as JSON, or, with ?disk=true, all of them sorted"""
+    try:
+        if zone_id == "Earth" or not is_zone_id(zone_id):
+            raise ValueError("'{}' is not a TB16Pix Zone ID".format(zone_id))
+        k = _k_arg()
+    except ValueError as e:
+        return render_api_error("Invalid rings request", 400, str(e), mediatype="application/json")
+    disk = request.values.get("disk", "false").lower() in ("true", "1", "yes")
+
+    return conditional_view(lambda: jsonify(dict(id=zone_id, **ring_record([zone_id], k, disk))))
+
+
+@app.route("/zones/rings", methods=["POST"])
+def zones_rings_batch():
+    """The rings around many Zones, /zones/rings?k=3, which are POSTed as to /zones/lookup
+
+    One record per Zone, as /zones/{id}/rings gives it, is streamed back as NDJSON. With ?merge=true, the Zones,
+    which must be of the same resolution, are taken as one set and one JSON object is returned, of the rings of
+    Zones by their number of steps from the nearest of them. ?disk=true gives all the Zones in the rings, sorted.
+    """
+    disk = request.values.get("disk", "false").lower() in ("true", "1", "yes")
+    merge = request.values.get("merge", "false").lower() in ("true", "1", "yes")
+    try:
+        k = _k_arg()
+        zone_ids = request_ids(request, "zones")
+        if merge:
+            zone_ids = list(zone_ids)
+            invalid = [zone_id for zone_id in zone_ids if zone_id == "Earth" or not is_zone_id(zone_id)]
+            if invalid:
+                raise ValueError("Not TB16Pix Zone IDs: {}".format(", ".join(invalid[:10])))
+            if not zone_ids:
+                raise ValueError("You must POST one or more Zone IDs")
+            return jsonify(ring_record(zone_ids, k, disk))
+    except ValueError as e:
+        return render_api_error("Invalid rings request", 400, str(e), mediatype="application/json")
+
+    return Response(stream_with_context(iter_ndjson(iter_ring_records(zone_ids, k, disk))), mimetype=NDJSON)
+
+
+@app.route("/zones/<string:zone_id>/attributes")
+def zones_attributes(zone_id):
+    """The area, in square metres, centroid and bounding box of a Zone's Cell, /zones/R08/attributes, as JSON, or
+    those of its descendants at a depth below it, ?depth=2, or at a resolution, ?resolution=5, streamed as NDJSON
+
+    Bounding boxes are (west, south, east, north), with west > east for Cells that cross the antimeridian. Coarse
+    Cells' attributes are read from the memory-mapped attribute tables, others are computed.
+    """
+    try:
+        depth = _depth_arg(zone_id, None)
+    except ValueError as e:
+        return render_api_error("Invalid attributes request", 400, str(e), mediatype="application/json")
+
+    def render():
+        if depth is not None:
+            records = iter_attributes(zone_id, depth)
+            return Response(stream_with_context(iter_chunks(iter_ndjson(records))), mimetype=NDJSON)
+        if zone_id == "Earth":
+            return jsonify({"id": zone_id, "area": 6 * cell_area(0), "centroid": None, "bbox": (-180, -90, 180, 90)})
+        return jsonify(dict(id=zone_id, **cell_attributes(zone_id)))
+
+    return conditional_view(render)
+
+
+@app.route("/zones/aggregate", methods=["POST"])
+def zones_aggregate():
+    """The count of points, and the count, sum, min, max and mean of any of their values, per Zone at a resolution,
+    e.g. /zones/aggregate?resolution=10&values=depth,temp, and, with ?rollup=8,6, per Zone at coarser ones too
+
+    The points are POSTed as CSV, with lon, lat and the value columns named in a header row, or as NDJSON, and are
+    binned a chunk at a time, so the request holds one row per Zone with points rather than the points. One record
+    per Zone, finest first and in Grid order, is streamed back as NDJSON or, if the request Accepts text/csv or has
+    ?_mediatype=text/csv, CSV. The X-Points and X-Invalid-Points headers count the points read.
+    """
+    values = [v.strip() for v in request.values.get("values", "").split(",") if v.strip()]
+    format = "ndjson" if request.mimetype in (NDJSON, "application/jsonl", "application/geo+json-seq") else "csv"
+    try:
+        resolution = _resolution_arg()
+        rollup = [r.strip() for r in request.values.get("rollup", "").split(",") if r.strip()]
+        if any(not r.isdigit() or int(r) > resolution for r in rollup):
+            raise ValueError("The ?rollup= resolutions must be 0 - {}".format(resolution))
+        tables = iter_point_tables(iter_line_blocks(request.stream), format, values)
+        aggregators = rollups(aggregate(tables, resolution, values), [int(r) for r in rollup])
+    except ValueError as e:
+        return render_api_error("Invalid aggregate request", 400, str(e), mediatype="application/json")
+
+    headers = {"X-Points": str(aggregators[0].points), "X-Invalid-Points": str(aggregators[0].invalid)}
+    mediatype = request.values.get("_mediatype") or request.accept_mimetypes.best_match([NDJSON, "text/csv"], NDJSON)
+    if mediatype == "text/csv":
+        lines = chain(iter_csv((), csv_header(values)), (line for a in aggregators for line in a.csv_lines()))
+        return Response(iter_chunks(lines), mimetype="text/csv", headers=headers)
+    lines = (line for a in aggregators for line in a.ndjson_lines())
+    return Response(iter_chunks(lines), mimetype=NDJSON, headers=headers)
+
+
+@app.route("/sparql", methods=["GET", "POST"])
+def sparql():
+    """A SPARQL endpoint over the static dataset graph and the computed triples of Earth and every Zone and Cell.
+
+    The query is sent as in the SPARQL 1.1 Protocol: ?query=, a POSTed form or a POSTed application/sparql-query
+    body. SELECT results are streamed as SPARQL Results JSON or, if the request Accepts text/csv, CSV, or are
+    returned as SPARQL Results XML; ASK results are JSON or XML and CONSTRUCT and DESCRIBE results any RDF format.
+    """
+    if request.method == "POST" and request.mimetype == SPARQL_QUERY:
+        text = request.get_data(as_text=True)
+    else:
+        text = request.values.get("query")
+    if not text:
+        return render_api_error(
+            "Invalid SPARQL request", 400, "You must supply a query, with ?query= or a POSTed query",
+            mediatype="application/json"
+        )
+
+    def render():
+        try:
+            result = sparql_query(text, GRAPH_STORE.graph)
+            if result.type in ("SELECT", "ASK"):
+                mediatypes = [SPARQL_RESULTS_JSON, "application/json", SPARQL_RESULTS_XML, "application/xml"]
+                if result.type == "SELECT":
+                    mediatypes.append("text/csv")
+                # a _mediatype this kind of result can't be given in, e.g. CSV for ASK, is negotiated instead
+                mediatype = request.values.get("_mediatype")
+                if mediatype not in mediatypes:
+                    mediatype = request.accept_mimetypes.best_match(mediatypes, SPARQL_RESULTS_JSON)
+                if mediatype == "text/csv":
+                    return Response(stream_with_context(started(iter_results_csv(result))), mimetype="text/csv")
+                elif mediatype in (SPARQL_RESULTS_XML, "application/xml"):
+                    return Response(result.serialize(format="xml"), mimetype=SPARQL_RESULTS_XML)
+                return Response(stream_with_context(started(iter_results_json(result))), mimetype=SPARQL_RESULTS_JSON)
+
+            # CONSTRUCT or DESCRIBE
+            mediatype = request.values.get("_mediatype")
+            if mediatype not in Renderer.RDF_SERIALIZER_TYPES_MAP:
+                mediatype = request.accept_mimetypes.best_match(list(Renderer.RDF_SERIALIZER_TYPES_MAP), "text/turtle")
+            return Response(
+                result.graph.serialize(format=Renderer.RDF_SERIALIZER_TYPES_MAP[mediatype]), mimetype=mediatype
+            )
+        except QueryTimeout as e:
+            return render_api_error("SPARQL query timeout", 503, str(e), mediatype="application/json")
+        except query_errors() as e:
+            return render_api_error("Invalid SPARQL query", 400, str(e), mediatype="application/json")
+
+    return conditional_view(render) if request.method == "GET" else render()
+
+
+@app.route("/status")
+def status():
+    """Reports the cost of the process-wide graph (its version, size and load time) and the response and
+    negotiation caches' counters"""
+    return jsonify({
+        "graph": GRAPH_STORE.stats(),
+        "geometry": geometry_stats(),
+        "attributes": attribute_stats(),
+        "response_cache": RESPONSE_CACHE_STORE.stats() if RESPONSE_CACHE_STORE is not None else None,
+        "sparql_client": SPARQL_CLIENT.stats() if SPARQL_CLIENT is not None else None,
+        "negotiation_cache": negotiate.cache_info()._asdict(),
+        "startup": STARTUP,
+    })
+
+
+def metrics():
+    """This process's request latency histograms, by route, mediatype and phase, and its caches' hit ratios, in the
+    Prometheus text format. Each worker process has its own, so scrape them all or add them up"""
+    caches = []
+    if RESPONSE_CACHE_STORE is not None:
+        stats = RESPONSE_CACHE_STORE.stats()
+        caches.append(("response", stats["hits"], stats["misses"]))
+    geometry = geometry_stats()
+    caches.append(("geometry", geometry["cache_hits"], geometry["cache_misses"]))
+    graph = GRAPH_STORE.stats()
+    if graph["snapshot"] is not None:
+        terms = graph["snapshot"]["term_cache"]
+        caches.append(("graph_terms", terms["hits"], terms["misses"]))
+    if SPARQL_CLIENT is not None and SPARQL_CLIENT.cache is not None:
+        caches.append(("sparql_client", SPARQL_CLIENT.cache.hits, SPARQL_CLIENT.cache.misses))
+    negotiation = negotiate.cache_info()
+    caches.append(("negotiation", negotiation.hits, negotiation.misses))
+    gauges = [
+        ("dggs_graph_triples", "Triples in the static dataset graph", graph["triples"]),
+        ("dggs_graph_load_seconds", "Time taken to load the static dataset graph", graph["load_seconds"]),
+        ("dggs_import_seconds", "Time taken to import the app", STARTUP["import_seconds"]),
+    ]
+    return Response(exposition(caches, gauges), mimetype="text/plain; version=0.0.4")
+
+
+if METRICS:
+    app.add_url_rule("/metrics", view_func=metrics)
+
+
+@lru_cache(maxsize=1)
+def _readme_html():
+    # README.md is read and converted once per process
+    with open(os.path.join(APP_DIR, "README.md")) as f:
+        return markdown_html(f.read(), ("tables",))
+
+
 @app.route("/about")
 def about():
-    import os
     # using basic Markdown method from http://flask.pocoo.org/snippets/19/
-    README_FILE = os.path.join(APP_DIR, "README.md")
-    with open(README_FILE) as f:
-        content = f.read()
-
     # make images come from web dir
-    content = content.replace(
-        "catprez/view/style/", request.url_root + "style/"
-    )
-    contents = Markup(markdown.markdown(content, extensions=['tables']))
+    contents = Markup(_readme_html().replace("catprez/view/style/", request.url_root + "style/"))
 
     return render_template(
         "about.html",
@@ -190,33 +786,12 @@ def about():
 
 
 def sparql_query2(query, format_mimetype="application/json"):
-    """ Make a SPARQL query"""
+    """ Make a SPARQL query to the upstream SPARQL_ENDPOINT, over pooled connections and with retries and a result
+    cache; see sparql_client.py"""
     logging.debug("sparql_query2: {}".format(query))
-    data = query
-
-    headers = {
-        "Content-Type": "application/sparql-query",
-        "Accept": format_mimetype,
-        "Accept-Encoding": "UTF-8",
-    }
-    if app.config.get("SPARQL_USERNAME") and app.config.get("SPARQL_PASSWORD"):
-        auth = (app.config.get("SPARQL_USERNAME"), app.config.get("SPARQL_PASSWORD"))
-    else:
-        auth = None
-
-    try:
-        logging.debug(
-            "endpoint={}\ndata={}\nheaders={}".format(
-                app.config.get("SPARQL_ENDPOINT"), data, headers
-            )
-        )
-        r = requests.post(
-            app.config.get("SPARQL_ENDPOINT"), auth=auth, data=data, headers=headers, timeout=60
-        )
-        logging.debug("response: {}".format(r.__dict__))
-        return r.content.decode("utf-8")
-    except Exception as e:
-        raise e
+    if SPARQL_CLIENT is None:
+        raise ValueError("No upstream SPARQL endpoint is configured: set SPARQL_ENDPOINT")
+    return SPARQL_CLIENT.query(query, format_mimetype)
 
 
 # TODO: use for all errors
@@ -241,7 +816,7 @@ def render_api_error(title, status, message, mediatype="text/html"):
 
 def render_invalid_object_class_response(uri):
     msg = """No valid *Object Class URI* found for object of URI <{}>.""".format(uri)
-    msg = Markup(markdown.markdown(msg))
+    msg = Markup(markdown_html(msg))
     return render_template(
         "error.html",
         title="Error - Object Class URI",
@@ -0,0 +1,268 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from flask import request
+from werkzeug.exceptions import HTTPException
+from config import *
+from app import app, render_api_error
+
+# An ASGI application serving the same Flask app, with the same routes and content negotiation, e.g.
+#
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+#
+# Cheap requests run in a pool of ASGI_THREADS threads in this process and are streamed back as they're made.
+# Requests to the CPU-heavy endpoints, ASGI_HEAVY_ENDPOINTS, run in a pool of ASGI_PROCESSES worker processes,
+# each with its own copy of the app, so they run in parallel, outside this process's GIL, and can't hold up the
+# cheap requests' threads. Each worker streams its response back over a pipe, a chunk at a time, so a slow client
+# holds up its worker rather than filling memory. Once ASGI_QUEUE_LIMIT heavy requests are running or waiting for
+# a worker, more are refused with a 503 and a Retry-After header until some have finished.
+
+_END = None  # a worker's response is complete
+_ABORT = False  # a worker's response failed after it was started
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ of an ASGI HTTP request scope, without its wsgi.input and wsgi.errors"""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": "HTTP/{}".format(scope.get("http_version", "1.1")),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else "HTTP_" + name
+        if key == "CONTENT_LENGTH":
+            continue  # the body has been read, so its length is known
+        value = value.decode("latin-1")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def wsgi_events(environ, body, wsgi_app=app):
+    """Runs a WSGI app on a request, yielding its response's (status, headers) and then its body's chunks"""
+    environ = dict(environ, **{"wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr})
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]]
+        return lambda data: None  # Flask never uses the write() callable
+
+    iterable = wsgi_app(environ, start_response)
+    try:
+        chunks = iter(iterable)
+        first = next(chunks, b"")  # a streamed response's first chunk, before which start_response may be called
+        yield tuple(started)
+        if first:
+            yield first
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+
+
+def _message(event):
+    if isinstance(event, tuple):
+        return {"type": "http.response.start", "status": event[0], "headers": event[1]}
+    return {"type": "http.response.body", "body": event, "more_body": True}
+
+
+def _worker_main(connection):
+    # a worker process: runs requests on its copy of the app and sends back their responses' events
+    while True:
+        try:
+            environ, body = connection.recv()
+        except EOFError:
+            return
+        try:
+            for event in wsgi_events(environ, body):
+                connection.send(event)
+            connection.send(_END)
+        except Exception:
+            logging.exception("Error in {}".format(environ.get("PATH_INFO")))
+            connection.send(_ABORT)
+
+
+class _Worker:
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join(5)
+        self.connection.close()
+
+
+def _overloaded(retry_after):
+    # the 503 response to a heavy request that was refused, in the request's context
+    mediatype = request.accept_mimetypes.best_match(["text/html", "application/json"], default="text/html")
+    response = app.make_response(render_api_error(
+        "Service busy",
+        503,
+        "Too many expensive requests are running. Please retry in {} seconds".format(retry_after),
+        mediatype=mediatype,
+    ))
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+class ASGIApp:
+    """The ASGI application: cheap requests run in a thread pool and heavy ones in a bounded process pool"""
+    def __init__(
+        self,
+        threads=ASGI_THREADS,
+        processes=ASGI_PROCESSES,
+        queue_limit=ASGI_QUEUE_LIMIT,
+        heavy_endpoints=ASGI_HEAVY_ENDPOINTS,
+        retry_after=ASGI_RETRY_AFTER,
+    ):
+        self.threads = threads
+        self.processes = processes
+        self.queue_limit = queue_limit
+        self.heavy_endpoints = set(heavy_endpoints)
+        self.retry_after = retry_after
+        self._context = multiprocessing.get_context("spawn")  # workers import the app afresh, with no threads
+        self._executor = None
+        self._pipes = None
+        self._idle = None
+        self._workers = []
+        self.pending = 0  # heavy requests running or waiting for a worker
+        self.rejected = 0
+
+    def _start(self):
+        if self._idle is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix="asgi")
+            self._pipes = ThreadPoolExecutor(self.processes, thread_name_prefix="asgi-pipe")
+            self._idle = asyncio.Queue()
+            for _ in range(self.processes):
+                worker = _Worker(self._context)
+                self._workers.append(worker)
+                self._idle.put_nowait(worker)
+
+    def _stop(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        for executor in (self._executor, self._pipes):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self._idle = self._executor = self._pipes = None
+
+    def stats(self):
+        return {
+            "threads": self.threads,
+            "processes": self.processes,
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        elif scope["type"] != "http":
+            raise ValueError("Only HTTP is supported, not {}".format(scope["type"]))
+        self._start()
+        body = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(body)
+        environ = wsgi_environ(scope, body)
+        if self._is_heavy(environ):
+            await self._in_process(environ, body, send)
+        else:
+            await self._in_thread(environ, body, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _is_heavy(self, environ):
+        try:
+            endpoint, _ = app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return False  # the app makes the 404, 405 or redirect
+        return endpoint in self.heavy_endpoints
+
+    async def _in_thread(self, environ, body, send, wsgi_app=app):
+        loop = asyncio.get_running_loop()
+
+        def run():
+            # each event is sent before the next is made, so a slow client slows the response down
+            for event in wsgi_events(environ, body, wsgi_app):
+                asyncio.run_coroutine_threadsafe(send(_message(event)), loop).result()
+            asyncio.run_coroutine_threadsafe(send({"type": "http.response.body", "body": b""}), loop).result()
+
+        await loop.run_in_executor(self._executor, run)
+
+    async def _in_process(self, environ, body, send):
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            with app.request_context(dict(environ, **{"wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr})):
+                response = _overloaded(self.retry_after)
+            return await self._in_thread(environ, b"", send, response)
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            worker = await self._idle.get()
+            try:
+                await loop.run_in_executor(self._pipes, worker.connection.send, (environ, body))
+                while True:
+                    event = await loop.run_in_executor(self._pipes, worker.connection.recv)
+                    if event is _END:
+                        await send({"type": "http.response.body", "body": b""})
+                        break
+                    elif event is _ABORT:
+                        raise RuntimeError("The response to {} failed".format(environ["PATH_INFO"]))
+                    await send(_message(event))
+            except BaseException:
+                # the worker may be part way through a response, or gone, so it's replaced
+                worker.stop()
+                worker = _Worker(self._context)
+                self._workers = [w for w in self._workers if w.process.is_alive()] + [worker]
+                raise
+            finally:
+                self._idle.put_nowait(worker)
+        finally:
+            self.pending -= 1
+
+
+application = ASGIApp()
+
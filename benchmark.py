@@ -0,0 +1,363 @@
+import argparse
+import gc
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib import metadata
+from urllib.parse import urlsplit
+
+# Benchmarks the API in-process with the Flask test client, so an upgrade of pyldapi, rdflib, rhealpixdggs etc.
+# that makes it slower shows up as a regression against a stored baseline:
+#
+#   python benchmark.py                         # compare with benchmark_baseline.json, exit 1 on a regression
+#   python benchmark.py --save-baseline         # store this run as the baseline
+#   python benchmark.py --only load --threads 16 --seconds 30
+#   python benchmark.py --only load --url http://localhost:5000   # load a running server instead
+#
+# There are three parts: "routes" times each route in each of its mediatypes, one request at a time; "micro"
+# times calculate_neighbours(), calculate_children() and get_collections(); and "load" sends the route requests
+# from many threads at once, in a fixed random order, and reports latency percentiles and throughput. Routes and
+# micro are run in several fresh processes and their medians taken, as one process can be much faster or slower
+# than the next. The response cache is off unless --response-cache is given, so responses are rendered each time.
+
+APP_DIR = os.path.dirname(os.path.realpath(__file__))
+BASELINE_FILE = os.path.join(APP_DIR, "benchmark_baseline.json")
+PARTS = ("routes", "micro", "load")
+PACKAGES = ("flask", "werkzeug", "pyldapi", "rdflib", "rhealpixdggs", "numpy", "Jinja2")
+
+_TB16PIX = "https://w3id.org/dggs/tb16pix/"
+HTML = "text/html"
+JSON = "application/json"
+JSON_LD = "application/ld+json"
+TURTLE = "text/turtle"
+N_TRIPLES = "application/n-triples"
+RDF = (HTML, JSON_LD, TURTLE, N_TRIPLES)
+
+# (name, path, mediatypes); the mediatype is asked for with an Accept header
+ROUTES = [
+    ("landing", "/", RDF),
+    ("collections", "/collections", RDF),
+    ("items", "/collections/2/items", (HTML, JSON)),
+    ("items-bbox", "/collections/6/items?bbox=110,-45,155,-10&limit=100", (JSON,)),
+    ("item", "/collections/2/items/R08", RDF),
+    ("object-earth", "/object?uri=" + _TB16PIX + "zone/Earth", RDF),
+    ("object-zone", "/object?uri=" + _TB16PIX + "zone/R08", RDF),
+    ("object-zone-fine", "/object?uri=" + _TB16PIX + "zone/R012345678", RDF),
+    ("object-cell", "/object?uri=" + _TB16PIX + "cell/R08", RDF),  # a redirect to the item, which is followed
+]
+
+
+def cases():
+    """The (name, path, mediatype) of every route benchmark"""
+    return [
+        ("{} {}".format(name, mediatype), path, mediatype)
+        for name, path, mediatypes in ROUTES
+        for mediatype in mediatypes
+    ]
+
+
+def _percentile(values, p):
+    # the nearest-rank percentile of sorted values
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+
+def _summary(seconds):
+    seconds = sorted(seconds)
+    return {
+        "n": len(seconds),
+        "p50_ms": round(_percentile(seconds, 50) * 1000, 4),
+        "p95_ms": round(_percentile(seconds, 95) * 1000, 4),
+        "p99_ms": round(_percentile(seconds, 99) * 1000, 4),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 4),
+    }
+
+
+def _get(client, path, mediatype):
+    response = client.get(path, headers={"Accept": mediatype}, follow_redirects=True)
+    if response.status_code != 200 or not response.content_type.startswith(mediatype):
+        raise RuntimeError("{} as {} gave {} {}".format(path, mediatype, response.status_code, response.content_type))
+    return response
+
+
+def bench_routes(client, requests=50, warmup=5):
+    """The latencies of each route and mediatype, one request at a time, after warming all of them up, so the
+    first ones don't pay for lazy imports and template compilation"""
+    for _ in range(warmup):
+        for _, path, mediatype in cases():
+            _get(client, path, mediatype)
+    results = {}
+    for name, path, mediatype in cases():
+        gc.collect()
+        seconds = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            _get(client, path, mediatype).get_data()
+            seconds.append(time.perf_counter() - started)
+        results[name] = _summary(seconds)
+    return results
+
+
+def bench_micro(repeats=7, number=2000):
+    """The time per call of the utility functions, the median of repeats runs of number calls"""
+    from utils import calculate_children, calculate_neighbours, get_collections
+
+    functions = [
+        ("calculate_neighbours", lambda: calculate_neighbours("R0123456")),
+        ("calculate_children", lambda: calculate_children("R0123456")),
+        ("get_collections", get_collections),
+    ]
+    results = {}
+    for name, function in functions:
+        function()
+        gc.collect()
+        runs = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(number):
+                function()
+            runs.append((time.perf_counter() - started) / number)
+        results[name] = {
+            "n": repeats * number,
+            "min_us": round(min(runs) * 1e6, 4),
+            "p50_us": round(statistics.median(runs) * 1e6, 4),
+        }
+    return results
+
+
+class _TestClient:
+    # GETs from the app in this process, in the load generator
+    def __init__(self, client):
+        self._client = client
+
+    def get(self, path, mediatype):
+        _get(self._client, path, mediatype).get_data()
+
+
+class _HTTPClient:
+    # GETs from a running server over one persistent connection, like the test client does from the app
+    def __init__(self, url):
+        url = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._connection = connection_class(url.hostname, url.port, timeout=60)
+        self._prefix = url.path.rstrip("/")
+
+    def get(self, path, mediatype):
+        target = self._prefix + path
+        while True:
+            self._connection.request("GET", target, headers={"Accept": mediatype})
+            response = self._connection.getresponse()
+            response.read()
+            if response.status in (301, 302, 303, 307, 308):
+                location = urlsplit(response.getheader("Location"))
+                target = location.path + ("?" + location.query if location.query else "")
+                continue
+            if response.status != 200:
+                raise RuntimeError("{} as {} gave {}".format(path, mediatype, response.status))
+            return
+
+
+def bench_load(make_client, threads=8, seconds=10.0, seed=0):
+    """The latency percentiles and throughput of the route requests sent from many threads at once for a number
+    of seconds. Each thread sends every request in its own fixed random order, over and over"""
+    latencies = [[] for _ in range(threads)]
+    errors = [0] * threads
+    barrier = threading.Barrier(threads + 1)
+    all_cases = cases()
+
+    def run(n):
+        client = make_client()
+        order = list(all_cases)
+        random.Random(seed + n).shuffle(order)
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        i = 0
+        while time.perf_counter() < deadline:
+            _, path, mediatype = order[i % len(order)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                client.get(path, mediatype)
+            except (RuntimeError, OSError, http.client.HTTPException):
+                errors[n] += 1
+                continue
+            latencies[n].append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=run, args=(n,), daemon=True) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    seconds_all = [s for thread in latencies for s in thread]
+    result = _summary(seconds_all) if seconds_all else {"n": 0}
+    result.update({
+        "threads": threads,
+        "seconds": round(elapsed, 3),
+        "errors": sum(errors),
+        "requests_per_second": round(len(seconds_all) / elapsed, 2),
+    })
+    return result
+
+
+def run_processes(processes, parts, requests, response_cache):
+    """The medians of the routes and micro benchmarks run in a number of fresh processes, as a process's speed
+    varies with its hash seed and memory layout"""
+    runs = []
+    for _ in range(processes):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "result.json")
+            subprocess.run([
+                sys.executable, os.path.realpath(__file__), "--worker", "--only", ",".join(parts),
+                "--requests", str(requests), "--response-cache", response_cache, "--json", path,
+            ], check=True)
+            with open(path) as f:
+                runs.append(json.load(f))
+    return {
+        part: {
+            name: {key: round(statistics.median(run[part][name][key] for run in runs), 4) for key in summary}
+            for name, summary in runs[0][part].items()
+        }
+        for part in parts
+    }
+
+
+def environment():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def compare(result, baseline, threshold):
+    """The regressions of a result against a baseline: route median, micro fastest and load median and p95
+    latencies more than threshold, a fraction, slower, or throughput less than 1 / (1 + threshold) of the baseline's"""
+    regressions = []
+
+    def check(name, current, base, higher_is_worse=True):
+        if current is None or not base:
+            return
+        ratio = current / base if higher_is_worse else base / max(current, 1e-12)
+        if ratio > 1 + threshold:
+            regressions.append("{}: {} vs baseline {} ({:+.0%})".format(name, current, base, ratio - 1))
+
+    for part, key in (("routes", "p50_ms"), ("micro", "min_us")):
+        for name, summary in result.get(part, {}).items():
+            check("{}/{} {}".format(part, name, key), summary[key], baseline.get(part, {}).get(name, {}).get(key))
+    if "load" in result and "load" in baseline and result["load"].get("target") == baseline["load"].get("target"):
+        # p99 is reported but too noisy over a short run to fail on
+        for key in ("p50_ms", "p95_ms"):
+            check("load {}".format(key), result["load"].get(key), baseline["load"].get(key))
+        check(
+            "load requests_per_second", result["load"]["requests_per_second"],
+            baseline["load"]["requests_per_second"], higher_is_worse=False
+        )
+        if result["load"]["errors"]:
+            regressions.append("load: {} errors".format(result["load"]["errors"]))
+    return regressions
+
+
+def _print(result):
+    for name, summary in result.get("routes", {}).items():
+        print("{:<46} p50 {:>9.3f} ms  p95 {:>9.3f} ms".format(name, summary["p50_ms"], summary["p95_ms"]))
+    for name, summary in result.get("micro", {}).items():
+        print("{:<46} {:>13.3f} us/call (min {:.3f})".format(name, summary["p50_us"], summary["min_us"]))
+    if "load" in result:
+        load = result["load"]
+        print("load ({}, {} threads, {}s): {} requests/s, {} errors".format(
+            load["target"], load["threads"], load["seconds"], load["requests_per_second"], load["errors"]
+        ))
+        if load["n"]:
+            print("  p50 {} ms  p95 {} ms  p99 {} ms".format(load["p50_ms"], load["p95_ms"], load["p99_ms"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the routes and utilities and compares with a baseline")
+    parser.add_argument("--only", default=",".join(PARTS), help="the parts to run, of: routes,micro,load")
+    parser.add_argument("--requests", type=int, default=50, help="requests timed per route and mediatype")
+    parser.add_argument("--processes", type=int, default=5, help="fresh processes to time the routes and micro in")
+    parser.add_argument("--threads", type=int, default=8, help="load generator threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="load generator duration")
+    parser.add_argument("--url", help="load a running server at this URL rather than the app in this process")
+    parser.add_argument("--response-cache", default="none", help="the RESPONSE_CACHE to use: none, memory or disk")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="the baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="the slowdown, as a fraction, that fails")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    parts = [p for p in args.only.split(",") if p]
+    if not set(parts) <= set(PARTS):
+        parser.error("--only takes parts of: {}".format(",".join(PARTS)))
+
+    os.environ["RESPONSE_CACHE"] = args.response_cache  # read when the app is imported
+    sys.path.insert(0, APP_DIR)
+    if args.worker:
+        # one of run_processes()' processes
+        from app import app
+
+        result = {}
+        if "routes" in parts:
+            result["routes"] = bench_routes(app.test_client(), args.requests)
+        if "micro" in parts:
+            result["micro"] = bench_micro()
+        with open(args.json, "w") as f:
+            json.dump(result, f)
+        sys.exit(0)
+
+    result = {"environment": environment(), "response_cache": args.response_cache, "processes": args.processes}
+    timed = [p for p in parts if p != "load"]
+    if timed:
+        result.update(run_processes(args.processes, timed, args.requests, args.response_cache))
+    if "load" in parts:
+        if args.url:
+            result["load"] = bench_load(lambda: _HTTPClient(args.url), args.threads, args.seconds)
+        else:
+            from app import app
+
+            result["load"] = bench_load(lambda: _TestClient(app.test_client()), args.threads, args.seconds)
+        result["load"]["target"] = args.url or "test client"
+    _print(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print("Saved the baseline to {}".format(args.baseline))
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("packages") != result["environment"]["packages"]:
+            print("The package versions differ from the baseline's")
+        for key in ("python", "machine", "cpus"):
+            if baseline.get("environment", {}).get(key) != result["environment"][key]:
+                print("The baseline was made with a different {}, so timings may not be comparable".format(key))
+        regressions = compare(result, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions of more than {:.0%} against {}".format(args.threshold, args.baseline))
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import request, make_response, Response
+from config import CACHE_HOURS, CACHE_VERSION, RESPONSE_CACHE, RESPONSE_CACHE_BYTES, RESPONSE_CACHE_FILE
+from metrics import phase
+from utils import GRAPH_STORE
+
+# Every resource this API delivers is determined by the dataset version and the request, so responses can carry
+# strong ETags and long Cache-Control lifetimes, and conditional requests can be answered with a 304 before any
+# model is built.
+
+
+def make_etag(*parts):
+    """A strong ETag for a representation of a resource: a hash of the dataset version and the given parts, e.g.
+    the resource URI, profile, mediatype and language"""
+    h = hashlib.sha1()
+    for part in (GRAPH_STORE.version, CACHE_VERSION) + parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def last_modified():
+    """When the dataset was last changed: the newest modification time of its data/*.ttl sources"""
+    return GRAPH_STORE.modified
+
+
+def cache_headers(etag, vary="Accept, Accept-Profile, Accept-Language"):
+    return {
+        "ETag": '"{}"'.format(etag),
+        "Last-Modified": last_modified().strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "Cache-Control": "public, max-age={}".format(int(CACHE_HOURS * 3600)),
+        "Vary": vary,
+    }
+
+
+def is_not_modified(etag):
+    """True if the current request's If-None-Match or, failing that, If-Modified-Since is satisfied"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag) or request.if_none_match.star_tag
+    if request.if_modified_since is not None:
+        return last_modified().replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+class MemoryResponseCache:
+    """A per-process LRU cache of rendered responses, limited to max_bytes of response bodies"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, body, headers)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                self._clear(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                self._clear(version)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (version, body, headers)
+            self._bytes += len(body)
+            self.stores += 1
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def _clear(self, version):
+        # the dataset has changed, so nothing cached is valid any more
+        self._entries.clear()
+        self._bytes = 0
+        self._version = version
+
+    def stats(self):
+        return {
+            "store": "memory",
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class DiskResponseCache:
+    """An LRU cache of rendered responses in an SQLite file, shared by all the worker processes on a host
+
+    Entries are evicted, least recently used first, to keep the total size of the response bodies under max_bytes.
+    Entries of other dataset versions are deleted when a new version is first seen. Any SQLite error is logged and
+    treated as a cache miss so the cache can never fail a request.
+    """
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            body BLOB NOT NULL,
+            headers TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+        CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+        INSERT OR IGNORE INTO totals VALUES (0, 0);
+    """
+    # a hit only rewrites its access time if it's older than this, to limit writes to a shared file
+    _TOUCH_SECONDS = 10.0
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._version = None
+        self.hits = self.misses = self.stores = self.evictions = self.errors = 0
+
+    def _connection(self):
+        # one connection per thread, and new ones after a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _check_version(self, conn, version):
+        if version != self._version:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM responses WHERE version != ?", (version,))
+            conn.execute("UPDATE totals SET bytes = (SELECT COALESCE(SUM(size), 0) FROM responses)")
+            conn.execute("COMMIT")
+            self._version = version
+
+    def _rollback(self):
+        # ends a transaction an error interrupted, so the connection doesn't keep holding the write lock
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn.in_transaction:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+
+    def get(self, key, version):
+        try:
+            conn = self._connection()
+            self._check_version(conn, version)
+            row = conn.execute(
+                "SELECT body, headers, accessed FROM responses WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[2] > self._TOUCH_SECONDS:
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return bytes(row[0]), json.loads(row[1])
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning("Response cache read failed: {}".format(e))
+            self._rollback()
+            return None
+
+    def put(self, key, version, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        try:
+            conn = self._connection()
+            self._check_version(conn, version)
+            conn.execute("BEGIN IMMEDIATE")
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, version, sqlite3.Binary(body), json.dumps(headers), len(body), time.time()),
+            )
+            conn.execute("UPDATE totals SET bytes = bytes + ?", (len(body) - (old[0] if old else 0),))
+            total = conn.execute("SELECT bytes FROM totals").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+                ).fetchall()
+                if not oldest:
+                    break
+                for evicted_key, size in oldest:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (evicted_key,))
+                    total -= size
+                    self.evictions += 1
+                    if total <= self.max_bytes:
+                        break
+                conn.execute("UPDATE totals SET bytes = ?", (total,))
+            conn.execute("COMMIT")
+            self.stores += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning("Response cache write failed: {}".format(e))
+            self._rollback()
+
+    def stats(self):
+        stats = {
+            "store": "disk",
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "max_bytes": self.max_bytes,
+        }
+        try:
+            conn = self._connection()
+            stats["entries"] = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats["bytes"] = conn.execute("SELECT bytes FROM totals").fetchone()[0]
+        except sqlite3.Error:
+            pass
+        return stats
+
+
+def make_response_cache(kind=RESPONSE_CACHE):
+    """The response cache configured by RESPONSE_CACHE: 'disk' (shared by all workers), 'memory' (per worker) or
+    'none'"""
+    if kind == "disk":
+        return DiskResponseCache(RESPONSE_CACHE_FILE, RESPONSE_CACHE_BYTES)
+    elif kind == "memory":
+        return MemoryResponseCache(RESPONSE_CACHE_BYTES)
+    return None
+
+
+RESPONSE_CACHE_STORE = make_response_cache()
+
+# headers that are recalculated for every response so are not cached
+_UNCACHED_HEADERS = {"content-length", "etag", "last-modified", "cache-control", "vary", "date", "set-cookie"}
+
+
+def cache_key(*parts):
+    """The response cache key of a representation of a resource: a hash of the given parts, e.g. the full request
+    path and the negotiated profile, mediatype and language. The dataset version is kept with each entry"""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def conditional(etag, render, key, vary="Accept, Accept-Profile, Accept-Language"):
+    """Returns a 304 if the request's validators match etag, else the response of render() with cache headers
+
+    Rendered responses are kept in the response cache under key, from cache_key(), so they are rendered once per
+    dataset version, not once per request.
+    """
+    headers = cache_headers(etag, vary)
+    if request.method in ("GET", "HEAD") and is_not_modified(etag):
+        return Response(status=304, headers=headers)
+
+    cache = RESPONSE_CACHE_STORE
+    version = GRAPH_STORE.version
+    if cache is not None:
+        with phase("cache"):
+            cached = cache.get(key, version)
+        if cached is not None:
+            body, cached_headers = cached
+            response = Response(body, headers=cached_headers)
+            for k, v in headers.items():
+                response.headers[k] = v
+            return response
+
+    with phase("render"):
+        response = render()
+    if not isinstance(response, Response):
+        # a str or (body, status) or (body, headers) tuple from a view
+        response = make_response(response)
+    if response.status_code == 200:
+        if cache is not None and not response.is_streamed:
+            cache.put(
+                key,
+                version,
+                response.get_data(),
+                [(k, v) for k, v in response.headers.items() if k.lower() not in _UNCACHED_HEADERS],
+            )
+        for k, v in headers.items():
+            response.headers[k] = v
+    return response
+
+
+def conditional_render(renderer):
+    """Renders a pyLDAPI Renderer, or returns a 304, with the ETag and response cache key made from the full request
+    path, which has any page or per_page arguments, and its negotiated profile, mediatype and language. Negotiation
+    happens when the Renderer is made, before its model is built."""
+    if renderer.vf_error is not None:
+        return renderer.render()
+    negotiated = (request.full_path, renderer.instance_uri, renderer.profile, renderer.mediatype, renderer.language)
+    etag = make_etag(request.host_url, *negotiated)
+    return conditional(etag, renderer.render, cache_key(request.host_url, *negotiated))
+
+
+def conditional_view(render):
+    """Renders a view, or returns a 304, with the ETag keyed by the full request path and its Accept header"""
+    parts = (request.host_url, request.full_path, request.headers.get("Accept", ""))
+    return conditional(make_etag(*parts), render, cache_key(*parts), vary="Accept")
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures cold starts, as an autoscaled worker has them: the time to import the app and the latency of the first
+# requests to it, each in a fresh Python process, and which modules take longest to import:
+#
+#   python coldstart.py --runs 5 --max-import-seconds 1.5
+#
+# It exits with status 1 if the median import time is over --max-import-seconds, so it can be used as a check.
+
+APP_DIR = os.path.dirname(os.path.realpath(__file__))
+PATHS = [
+    "/",
+    "/about",
+    "/collections",
+    "/collections/2/items",
+    "/object?uri=https://w3id.org/dggs/tb16pix/zone/R08",
+]
+
+# run in each fresh process: prints the import time and the first and second request latencies as JSON
+_PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+client = app.app.test_client()
+first, second = {}, {}
+for path in PATHS:
+    for latencies in (first, second):
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        latencies[path] = (status, time.perf_counter() - started)
+print(json.dumps({"import_seconds": imported, "first": first, "second": second}))
+"""
+
+
+def _importtimes(stderr):
+    # the cumulative import times, in seconds, of the modules in -X importtime output
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def run_once(paths=PATHS):
+    """The import time, first and second request latencies and module import times of one fresh process"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "PATHS = {!r}\n{}".format(paths, _PROBE)],
+        cwd=APP_DIR,
+        env=dict(os.environ, PYTHONPATH=APP_DIR),
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["modules"] = _importtimes(process.stderr)
+    return result
+
+
+def report(runs=3, paths=PATHS, top=10):
+    """The medians of the measurements of a number of runs"""
+    results = [run_once(paths) for _ in range(runs)]
+    modules = {m for r in results for m in r["modules"]}
+    module_times = {m: statistics.median(r["modules"].get(m, 0.0) for r in results) for m in modules}
+    return {
+        "runs": runs,
+        "import_seconds": round(statistics.median(r["import_seconds"] for r in results), 6),
+        "first_request_seconds": {
+            p: round(statistics.median(r["first"][p][1] for r in results), 6) for p in paths
+        },
+        "second_request_seconds": {
+            p: round(statistics.median(r["second"][p][1] for r in results), 6) for p in paths
+        },
+        "statuses": {p: results[0]["first"][p][0] for p in paths},
+        "slowest_imports": [[m, round(t, 6)] for m, t in sorted(module_times.items(), key=lambda i: -i[1])[:top]],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports the app's cold start import time and first requests")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="fresh processes to measure, default 3")
+    parser.add_argument("--top", type=int, default=10, help="slowest imported modules to report, default 10")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-import-seconds", type=float, help="exit with status 1 if the import takes longer")
+    args = parser.parse_args()
+
+    result = report(max(1, args.runs), top=args.top)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("import: {:.3f}s (median of {} runs)".format(result["import_seconds"], result["runs"]))
+        print("{:<55} {:>6} {:>10} {:>10}".format("path", "status", "first", "second"))
+        for path in PATHS:
+            print("{:<55} {:>6} {:>9.3f}s {:>9.3f}s".format(
+                path, result["statuses"][path], result["first_request_seconds"][path],
+                result["second_request_seconds"][path]
+            ))
+        print("slowest imports:")
+        for module, seconds in result["slowest_imports"]:
+            print("  {:<53} {:>9.3f}s".format(module, seconds))
+    if args.max_import_seconds is not None and result["import_seconds"] > args.max_import_seconds:
+        print("import took longer than {}s".format(args.max_import_seconds), file=sys.stderr)
+        sys.exit(1)
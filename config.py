@@ -1,6 +1,5 @@
 import os
 from rdflib import Namespace
-from rhealpixdggs.dggs import *
 from rhealpixdggs.ellipsoids import *
 
 APP_DIR = os.environ.get("APP_DIR", os.path.dirname(os.path.realpath(__file__)))
@@ -9,10 +8,53 @@ STATIC_DIR = os.environ.get("STATIC_DIR", os.path.join(APP_DIR, "view", "style")
 LOGFILE = os.environ.get("LOGFILE", os.path.join(APP_DIR, "catprez.log"))
 DEBUG = os.environ.get("DEBUG", True)
 PORT = os.environ.get("PORT", 5000)
-CACHE_HOURS = os.environ.get("CACHE_HOURS", 1)
-CACHE_FILE = os.environ.get("CACHE_DIR", os.path.join(APP_DIR, "cache", "DATA.pickle"))
+CACHE_HOURS = float(os.environ.get("CACHE_HOURS", 1))
+CACHE_VERSION = os.environ.get("CACHE_VERSION", "")  # change to invalidate HTTP caches when the code changes
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "memory")  # 'disk' (shared by workers), 'memory' or 'none'
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+RESPONSE_CACHE_FILE = os.environ.get("RESPONSE_CACHE_FILE", os.path.join(APP_DIR, "cache", "responses.sqlite"))
 LOCAL_URIS = os.environ.get("LOCAL_URIS", True)
-PICKLED_G_FILE = os.path.join(APP_DIR, "data", "DATA.pickle")
+# the memory-mapped snapshot of the data/*.ttl sources, shared by all worker processes
+GRAPH_SNAPSHOT_FILE = os.environ.get("GRAPH_SNAPSHOT_FILE", os.path.join(APP_DIR, "cache", "graph-v1.snapshot"))
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(APP_DIR, "data"))
+GRAPH_CHECK_SECONDS = float(os.environ.get("GRAPH_CHECK_SECONDS", 5))
+ITEMS_LIMIT = int(os.environ.get("ITEMS_LIMIT", 100))
+ITEMS_MAX_LIMIT = int(os.environ.get("ITEMS_MAX_LIMIT", 10000))
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 1000))
+GEOMETRY_FILE = os.environ.get("GEOMETRY_FILE", os.path.join(APP_DIR, "cache", "cell-geometry-v2.npy"))
+GEOMETRY_TABLE_RESOLUTION = int(os.environ.get("GEOMETRY_TABLE_RESOLUTION", 5))  # Cells up to this are in the file
+GEOMETRY_CACHE_SIZE = int(os.environ.get("GEOMETRY_CACHE_SIZE", 65536))  # finer Cells' geometries kept in memory
+ATTRIBUTES_DIR = os.environ.get("ATTRIBUTES_DIR", os.path.join(APP_DIR, "cache", "cell-attributes-v1"))
+ATTRIBUTE_TABLE_RESOLUTION = int(os.environ.get("ATTRIBUTE_TABLE_RESOLUTION", 5))  # Cells up to this are in tables
+SPARQL_TIMEOUT = float(os.environ.get("SPARQL_TIMEOUT", 30))  # seconds a /sparql query may run for, 0 for no limit
+SPARQL_ENDPOINT = os.environ.get("SPARQL_ENDPOINT")  # an upstream SPARQL endpoint, for sparql_query2()
+SPARQL_USERNAME = os.environ.get("SPARQL_USERNAME")
+SPARQL_PASSWORD = os.environ.get("SPARQL_PASSWORD")
+SPARQL_CLIENT_TIMEOUT = float(os.environ.get("SPARQL_CLIENT_TIMEOUT", 60))  # seconds per attempt
+SPARQL_CLIENT_RETRIES = int(os.environ.get("SPARQL_CLIENT_RETRIES", 3))
+SPARQL_CLIENT_POOL_SIZE = int(os.environ.get("SPARQL_CLIENT_POOL_SIZE", 8))  # persistent connections per process
+SPARQL_CLIENT_CACHE_SIZE = int(os.environ.get("SPARQL_CLIENT_CACHE_SIZE", 256))  # results kept, 0 for no cache
+SPARQL_CLIENT_CACHE_SECONDS = float(os.environ.get("SPARQL_CLIENT_CACHE_SECONDS", 300))
+SPARQL_CLIENT_CONCURRENCY = int(os.environ.get("SPARQL_CLIENT_CONCURRENCY", 8))  # queries sent at once by query_many
+AGGREGATE_CHUNK_SIZE = int(os.environ.get("AGGREGATE_CHUNK_SIZE", 65536))  # points parsed and binned together
+RINGS_MAX_K = int(os.environ.get("RINGS_MAX_K", 100))  # the most steps out /zones/.../rings expands
+NEGOTIATION_CACHE_SIZE = int(os.environ.get("NEGOTIATION_CACHE_SIZE", 1024))  # distinct conneg requests kept
+# per-request phase timings in Server-Timing headers and Prometheus metrics at /metrics; "0" turns them off
+METRICS = os.environ.get("METRICS", "1") != "0"
+# large HTML pages (items, members and alternate profiles) are streamed as they are rendered; "0" renders them whole
+STREAM_TEMPLATES = os.environ.get("STREAM_TEMPLATES", "1") != "0"
+# compiled templates are kept here, so new worker processes needn't compile them; "" for no cache
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR", os.path.join(APP_DIR, "cache", "templates"))
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 16))  # threads for cheap requests in asgi.py
+ASGI_PROCESSES = int(os.environ.get("ASGI_PROCESSES", os.cpu_count() or 1))  # worker processes for heavy requests
+ASGI_QUEUE_LIMIT = int(os.environ.get("ASGI_QUEUE_LIMIT", 32))  # heavy requests running or waiting, before 503s
+ASGI_RETRY_AFTER = int(os.environ.get("ASGI_RETRY_AFTER", 5))  # seconds, in the 503s' Retry-After header
+# the app's endpoints whose requests asgi.py runs in its worker processes
+ASGI_HEAVY_ENDPOINTS = os.environ.get(
+    "ASGI_HEAVY_ENDPOINTS",
+    "items,zones_lookup,zones_points,zones_cover,zones_aggregate,zones_descendants,zones_rings_batch,sparql",
+)
+ASGI_HEAVY_ENDPOINTS = [e.strip() for e in ASGI_HEAVY_ENDPOINTS.split(",") if e.strip()]
 
 # rdflib
 DGGSP = Namespace("https://w3id.org/dggs/abstract")
@@ -24,4 +66,15 @@ URI_BASE_GRID = Namespace("https://w3id.org/dggs/tb16pix/grid/")
 
 # rHealPix
 WGS84_TB16 = Ellipsoid(a=6378137.0, b=6356752.314140356, e=0.0578063088401, f=0.003352810681182, lon_0=-131.25)
-TB16Pix = RHEALPixDGGS(ellipsoid=WGS84_TB16, north_square=0, south_square=0, N_side=3)
+TB16PIX_OPTIONS = {"north_square": 0, "south_square": 0, "N_side": 3}
+
+
+def __getattr__(name):
+    # rhealpixdggs.dggs imports SciPy, which takes most of the start-up time, so TB16Pix is only made when it is
+    # first used; grid.tb16pix has the parameters the grid computations need without it
+    if name == "TB16Pix":
+        from rhealpixdggs.dggs import RHEALPixDGGS
+
+        globals()["TB16Pix"] = RHEALPixDGGS(ellipsoid=WGS84_TB16, **TB16PIX_OPTIONS)
+        return globals()["TB16Pix"]
+    raise AttributeError("module 'config' has no attribute '{}'".format(name))
@@ -0,0 +1,9 @@
+from .cells import *
+from .neighbours import *
+from .zoneid import *
+from .points import *
+from .cover import *
+from .geometry import *
+from .hierarchy import *
+from .attributes import *
+from .rings import *
@@ -0,0 +1,239 @@
+import logging
+import os
+import threading
+from math import pi
+import numpy as np
+from config import ATTRIBUTES_DIR, ATTRIBUTE_TABLE_RESOLUTION
+from .cells import CELLS0, NUM_CHILDREN, index_from_cell_id, num_cells
+from .geometry import _DECIMALS, _clamp, _compute_points, _planar_squares
+from .points import lonlat_from_xy
+from .tb16pix import TB16PIX_PLANE
+from .zoneid import pack_grid_index, unpack_array
+
+__all__ = [
+    "ATTRIBUTE_COLUMNS",
+    "cell_area",
+    "cell_attributes",
+    "grid_attributes",
+    "iter_attributes",
+    "attribute_table",
+    "attribute_tables",
+    "build_attribute_tables",
+    "attribute_stats",
+]
+
+# The attributes of Cells that are looked up for them, rather than their whole geometry: their centroid, the
+# nucleus that grid.geometry gives, and their lon/lat bounding box, as grid.cells.cell_lonlat_bbox() gives it, with
+# west > east for the Cells that cross the antimeridian. TB16Pix is equal-area, so every Cell at a resolution has
+# the same area, cell_area(resolution), rather than a column of its own.
+#
+# The attributes of every Cell at resolutions 0 - ATTRIBUTE_TABLE_RESOLUTION are kept in columnar tables that are
+# built once and memory-mapped, so all worker processes share one copy in the page cache, and a lookup reads only
+# the columns it needs. Each resolution's table is a directory, ATTRIBUTES_DIR/<resolution>/, of one .npy file per
+# column, a float64 array with a row per Cell in Grid order, which is the order of their packed IDs. Finer Cells'
+# attributes are computed when needed.
+
+ATTRIBUTE_COLUMNS = ("centroid_lon", "centroid_lat", "west", "south", "east", "north")
+_POLAR = [CELLS0.index("N"), CELLS0.index("S")]
+_SAMPLES = 4  # boundary points per edge of the polar Cells, whose edges are curved in lon/lat
+
+
+def cell_area(resolution):
+    """The area, in square metres, of every Cell at a resolution, on the ellipsoid"""
+    return 8 / (3 * pi) * TB16PIX_PLANE.cell_width(resolution) ** 2
+
+
+def _lon_bounds(lons):
+    # the west and east bounds of rows of a Cell's longitudes, which are contiguous, so if the largest gap between
+    # them is not the one that wraps around the globe, the Cell crosses the antimeridian and is bounded by that gap
+    lons = np.sort(lons, axis=1)
+    gaps = np.diff(lons, axis=1)
+    i = np.argmax(gaps, axis=1)
+    rows = np.arange(len(lons))
+    crosses = gaps[rows, i] > 360 - (lons[:, -1] - lons[:, 0])
+    return np.where(crosses, lons[rows, i + 1], lons[:, 0]), np.where(crosses, lons[rows, i], lons[:, -1])
+
+
+def _boundary(index, resolution):
+    # the lon/lat of _SAMPLES points on each edge of the planar squares of the Cells at the given indices
+    x, y, w = _planar_squares(index, resolution)
+    step = np.arange(_SAMPLES - 1) * w / (_SAMPLES - 1)
+    x, y, n = x[:, None], y[:, None], len(step)
+    xs = np.hstack([x + step, np.repeat(x + w, n, axis=1), x + w - step, np.repeat(x, n, axis=1)])
+    ys = np.hstack([np.repeat(y, n, axis=1), y - step, np.repeat(y - w, n, axis=1), y - w + step])
+    return lonlat_from_xy(*_clamp(index, resolution, xs, ys))
+
+
+def _compute_columns(index, resolution):
+    # the attribute columns of the Cells at the given indices of the Grid at a resolution
+    index = np.asarray(index, dtype=np.int64)
+    points = _compute_points(index, resolution)
+    lons, lats = points[:, :4, 0], points[:, :4, 1]
+    west, east = _lon_bounds(lons)
+    south, north = lats.min(axis=1), lats.max(axis=1)
+
+    base, rest = np.divmod(index, 9 ** resolution)
+    polar = np.isin(base, _POLAR)
+    if polar.any():
+        sampled_lons, sampled_lats = _boundary(index[polar], resolution)
+        west[polar], east[polar] = _lon_bounds(sampled_lons)
+        south[polar], north[polar] = sampled_lats.min(axis=1), sampled_lats.max(axis=1)
+        # the Cells containing the poles are the centre Cells of N and S, all the way down, and span all longitudes
+        cap = polar & (rest == 4 * (9 ** resolution - 1) // 8)
+        west[cap], east[cap] = -180.0, 180.0
+        north[cap & (base == _POLAR[0])] = 90.0
+        south[cap & (base == _POLAR[1])] = -90.0
+        south[cap & (base == _POLAR[0])] = lats[cap & (base == _POLAR[0])].min(axis=1)
+        north[cap & (base == _POLAR[1])] = lats[cap & (base == _POLAR[1])].max(axis=1)
+    return points[:, 4, 0], points[:, 4, 1], west, south, east, north
+
+
+def _column_path(directory, resolution, column):
+    return os.path.join(directory, str(resolution), column + ".npy")
+
+
+def _build_table(directory, resolution, batch_size):
+    os.makedirs(os.path.join(directory, str(resolution)), exist_ok=True)
+    rows = num_cells(resolution)
+    temps = ["{}.{}.tmp".format(_column_path(directory, resolution, c), os.getpid()) for c in ATTRIBUTE_COLUMNS]
+    columns = [np.lib.format.open_memmap(t, mode="w+", dtype=np.float64, shape=(rows,)) for t in temps]
+    for start in range(0, rows, batch_size):
+        index = np.arange(start, min(start + batch_size, rows))
+        for column, values in zip(columns, _compute_columns(index, resolution)):
+            column[start:start + len(index)] = values
+    for column in columns:
+        column.flush()
+    del columns
+    for temp, c in zip(temps, ATTRIBUTE_COLUMNS):
+        os.replace(temp, _column_path(directory, resolution, c))  # atomic, so no process sees a partial column
+
+
+def build_attribute_tables(directory=ATTRIBUTES_DIR, resolution=ATTRIBUTE_TABLE_RESOLUTION, batch_size=65536):
+    """Computes the attribute columns of every Cell at resolutions 0 - resolution into new files under directory"""
+    for r in range(resolution + 1):
+        _build_table(directory, r, batch_size)
+
+
+def _load_table(resolution):
+    # the memory-mapped columns of a resolution's table, or None if any of them is missing or invalid
+    table = {}
+    for c in ATTRIBUTE_COLUMNS:
+        try:
+            column = np.load(_column_path(ATTRIBUTES_DIR, resolution, c), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if column.shape != (num_cells(resolution),) or column.dtype != np.float64:
+            return None
+        table[c] = column
+    return table
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def attribute_table(resolution):
+    """The memory-mapped attribute columns of the Cells at a resolution, a dict of arrays in Grid order, which are
+    built first if there is no valid table in ATTRIBUTES_DIR, or None if the resolution is finer than
+    ATTRIBUTE_TABLE_RESOLUTION"""
+    if resolution > ATTRIBUTE_TABLE_RESOLUTION:
+        return None
+    table = _tables.get(resolution)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(resolution)
+            if table is None:
+                table = _load_table(resolution)
+                if table is None:
+                    logging.info("Building the Cell attribute table {}".format(
+                        os.path.join(ATTRIBUTES_DIR, str(resolution))
+                    ))
+                    _build_table(ATTRIBUTES_DIR, resolution, 65536)
+                    table = _load_table(resolution)
+                _tables[resolution] = table
+    return table
+
+
+def attribute_tables():
+    """Maps the attribute tables of all of resolutions 0 - ATTRIBUTE_TABLE_RESOLUTION, building any that are missing"""
+    return [attribute_table(r) for r in range(ATTRIBUTE_TABLE_RESOLUTION + 1)]
+
+
+def grid_attributes(index, resolution, columns=ATTRIBUTE_COLUMNS):
+    """The given attribute columns of the Cells at the given indices of the Grid at a resolution, as a dict of
+    arrays. Those of coarse Cells are read from their table, others are computed"""
+    index = np.asarray(index, dtype=np.int64)
+    table = attribute_table(resolution)
+    if table is not None:
+        return {c: table[c][index] for c in columns}
+    return {c: values for c, values in zip(ATTRIBUTE_COLUMNS, _compute_columns(index, resolution)) if c in columns}
+
+
+def cell_attributes(cell_id):
+    """A Cell's area, in square metres, its centroid, (lon, lat), and its bounding box, (west, south, east, north)"""
+    values = grid_attributes([index_from_cell_id(cell_id)], len(cell_id) - 1)
+    lon, lat, west, south, east, north = (round(float(values[c][0]), _DECIMALS) for c in ATTRIBUTE_COLUMNS)
+    return {
+        "area": cell_area(len(cell_id) - 1),
+        "centroid": (lon, lat),
+        "bbox": (west, south, east, north),
+    }
+
+
+def iter_attributes(zone_id, depth, batch_size=4096):
+    """Yields the attributes, as cell_attributes() gives them with the Cell's "id", of the descendants of a Zone,
+    or of "Earth", depth levels below it, in Grid order. Coarse Cells' attributes are read a slice of each column at
+    a time"""
+    if zone_id == "Earth":
+        for base in CELLS0:
+            yield from iter_attributes(base, depth - 1, batch_size)
+        return
+    resolution = len(zone_id) - 1 + depth
+    area = cell_area(resolution)
+    count = NUM_CHILDREN ** depth
+    start = index_from_cell_id(zone_id) * count
+    table = attribute_table(resolution)
+    for first in range(start, start + count, batch_size):
+        index = np.arange(first, min(first + batch_size, start + count), dtype=np.int64)
+        if table is not None:
+            columns = [table[c][index[0]:index[-1] + 1] for c in ATTRIBUTE_COLUMNS]
+        else:
+            columns = _compute_columns(index, resolution)
+        ids = unpack_array(pack_grid_index(index, resolution)).tolist()
+        rows = np.round(np.column_stack(columns), _DECIMALS).tolist()
+        for cell_id, (lon, lat, west, south, east, north) in zip(ids, rows):
+            yield {"id": cell_id, "area": area, "centroid": (lon, lat), "bbox": (west, south, east, north)}
+
+
+def attribute_stats():
+    """The attribute tables' directory, the resolutions mapped so far and their size"""
+    return {
+        "directory": ATTRIBUTES_DIR,
+        "table_resolution": ATTRIBUTE_TABLE_RESOLUTION,
+        "resolutions": sorted(_tables),
+        "table_bytes": sum(int(column.nbytes) for table in _tables.values() for column in table.values()),
+    }
+
+
+if __name__ == "__main__":
+    # precomputes the attribute tables, e.g. for finer resolutions than the app builds by default, before deploying:
+    #
+    #   python -m grid.attributes --resolution 7
+    #
+    # and then run the app with ATTRIBUTE_TABLE_RESOLUTION=7 to map them
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Writes the attribute tables of the Cells at resolutions 0 - k")
+    parser.add_argument(
+        "-r", "--resolution", type=int, default=ATTRIBUTE_TABLE_RESOLUTION,
+        help="the finest resolution, k (default {})".format(ATTRIBUTE_TABLE_RESOLUTION)
+    )
+    parser.add_argument(
+        "-o", "--output", default=ATTRIBUTES_DIR, help="the directory (default {})".format(ATTRIBUTES_DIR)
+    )
+    args = parser.parse_args()
+    for r in range(args.resolution + 1):
+        started = time.time()
+        _build_table(args.output, r, 65536)
+        print("resolution {}: {} Cells in {:.1f}s".format(r, num_cells(r), time.time() - started))
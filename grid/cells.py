@@ -0,0 +1,239 @@
+import re
+from functools import lru_cache
+from itertools import islice
+
+__all__ = [
+    "CELLS0",
+    "NUM_CHILDREN",
+    "num_cells",
+    "suid_from_cell_id",
+    "cell_id_from_index",
+    "index_from_cell_id",
+    "iter_cell_ids",
+    "parse_bbox",
+    "cell_lonlat_bbox",
+    "iter_cell_ids_in_region",
+    "iter_cell_ids_in_bbox",
+    "page_cell_ids",
+]
+
+CELLS0 = ["N", "O", "P", "Q", "R", "S"]
+NUM_CHILDREN = 9  # TB16Pix has N_side=3, so each Cell has 3 x 3 children
+_CELL_ID = re.compile("[NOPQRS][0-8]*")
+
+
+def num_cells(resolution):
+    """The number of Cells in the Grid at the given resolution"""
+    return len(CELLS0) * NUM_CHILDREN ** resolution
+
+
+def suid_from_cell_id(cell_id):
+    """'R0837' -> ['R', 0, 8, 3, 7], the form rhealpixdggs uses"""
+    return [cell_id[0]] + [int(x) for x in cell_id[1:]]
+
+
+def cell_id_from_index(index, resolution):
+    """The ID of the index-th Cell of a Grid, in the order TB16Pix.grid(resolution) yields them, without
+    generating the Cells before it"""
+    base, rest = divmod(index, NUM_CHILDREN ** resolution)
+    digits = []
+    for _ in range(resolution):
+        rest, d = divmod(rest, NUM_CHILDREN)
+        digits.append(str(d))
+    return CELLS0[base] + "".join(reversed(digits))
+
+
+def index_from_cell_id(cell_id):
+    """The inverse of cell_id_from_index(). Raises ValueError if cell_id isn't a TB16Pix Cell ID"""
+    if _CELL_ID.fullmatch(cell_id) is None:
+        raise ValueError("'{}' is not a TB16Pix Cell ID".format(cell_id))
+    index = CELLS0.index(cell_id[0])
+    for d in cell_id[1:]:
+        index = index * NUM_CHILDREN + int(d)
+    return index
+
+
+def iter_cell_ids(resolution, start=0, stop=None):
+    """Yields the IDs of the Cells of a Grid from index start up to, but not including, index stop"""
+    stop = num_cells(resolution) if stop is None else min(stop, num_cells(resolution))
+    for index in range(start, stop):
+        yield cell_id_from_index(index, resolution)
+
+
+def parse_bbox(bbox):
+    """Parses an OGC API bbox parameter, 'minLon,minLat,maxLon,maxLat', into a tuple of floats
+
+    As per OGC API - Features, minLon may be greater than maxLon for a bbox that crosses the antimeridian.
+    Raises ValueError for a malformed bbox.
+    """
+    parts = [float(x) for x in bbox.split(",")]
+    if len(parts) != 4:
+        raise ValueError("A bbox must have 4 numbers: minLon,minLat,maxLon,maxLat")
+    west, south, east, north = parts
+    if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("A bbox must be within -180,-90,180,90 and have minLat <= maxLat")
+    return west, south, east, north
+
+
+def _lon_intervals(west, east):
+    if west <= east:
+        return [(west, east)]
+    else:  # crosses the antimeridian
+        return [(west, 180.0), (-180.0, east)]
+
+
+@lru_cache(maxsize=65536)
+def cell_lonlat_bbox(cell_id):
+    """The longitude/latitude bounding box of a Cell as (west, south, east, north)
+
+    west > east for a Cell that crosses the antimeridian. Equatorial Cells are exact lon/lat rectangles; the bounds
+    of polar Cells are taken from their sampled boundary, and Cells containing a pole span all longitudes.
+    """
+    # rhealpixdggs.dggs is slow to import, so it's only imported when a bbox is first needed
+    from config import TB16Pix
+    from rhealpixdggs.dggs import Cell
+
+    c = Cell(TB16Pix, suid_from_cell_id(cell_id))
+    if c.ellipsoidal_shape() == "cap":
+        lats = [p[1] for p in c.vertices(plane=False)]
+        if c.region() == "north_polar":
+            return -180.0, float(min(lats)), 180.0, 90.0
+        else:
+            return -180.0, -90.0, 180.0, float(max(lats))
+
+    points = c.boundary(n=4, plane=False) if c.region() != "equatorial" else c.vertices(plane=False)
+    lons = sorted(float(p[0]) for p in points)
+    lats = [float(p[1]) for p in points]
+    # the Cell's longitudes are contiguous, so if the largest gap between them is not the one that wraps around
+    # the globe, the Cell crosses the antimeridian and is bounded by that gap
+    gap, i = max((lons[i + 1] - lons[i], i) for i in range(len(lons) - 1))
+    if gap > 360 - (lons[-1] - lons[0]):
+        return lons[i + 1], min(lats), lons[i], max(lats)
+    return lons[0], min(lats), lons[-1], max(lats)
+
+
+def _relate(cell_bbox, bbox):
+    """'outside', 'inside' or 'overlaps': the relation of a Cell's bounding box to a query bbox"""
+    c_west, c_south, c_east, c_north = cell_bbox
+    west, south, east, north = bbox
+    if c_north < south or c_south > north:
+        return "outside"
+    cell_lons = _lon_intervals(c_west, c_east)
+    bbox_lons = _lon_intervals(west, east)
+    if not any(a0 <= b1 and b0 <= a1 for a0, a1 in cell_lons for b0, b1 in bbox_lons):
+        return "outside"
+    if south <= c_south and c_north <= north and \
+            all(any(b0 <= a0 and a1 <= b1 for b0, b1 in bbox_lons) for a0, a1 in cell_lons):
+        return "inside"
+    return "overlaps"
+
+
+def iter_cell_ids_in_region(resolution, relate, offset=0, after=None, reverse=False, compact=False):
+    """Yields, in Grid order, the IDs of the Cells at a resolution that are inside or overlap a region
+
+    relate(cell_id) says whether a Cell is 'outside', 'inside' or 'overlaps' the region. The Grid hierarchy is
+    descended from the base Cells: subtrees outside the region are pruned, subtrees wholly inside it are not
+    tested further, and subtrees wholly inside it and before the requested page are skipped by counting, so the
+    work done depends on the region's boundary, not its area. Cells up to and including the Cell after are
+    skipped (or down to and including it, when reverse is True) which allows cursor-based paging at a cost that
+    doesn't depend on how far into the results the page is.
+
+    If compact is True, subtrees wholly inside the region are yielded as the ID of their root, at whatever
+    resolution that is, rather than as all of their Cells at resolution. offset and after don't apply then.
+    """
+    skip = [offset]
+    cursor = after
+
+    def passed(prefix, leaf):
+        # True if the whole subtree at prefix is at or before the cursor, in the direction of the walk
+        c = cursor[:len(prefix)]
+        if leaf:
+            return prefix >= c if reverse else prefix <= c
+        return prefix > c if reverse else prefix < c
+
+    def descend(prefix, inside):
+        level = len(prefix) - 1
+        if cursor is not None and passed(prefix, level == resolution):
+            return
+        if not inside:
+            relation = relate(prefix)
+            if relation == "outside":
+                return
+            inside = relation == "inside"
+            if inside and compact:
+                yield prefix
+                return
+        if level == resolution:
+            if skip[0] > 0:
+                skip[0] -= 1
+            else:
+                yield prefix
+            return
+        if inside and skip[0] > 0 and (cursor is None or not cursor.startswith(prefix)):
+            size = NUM_CHILDREN ** (resolution - level)
+            if skip[0] >= size:
+                skip[0] -= size
+                return
+        digits = range(NUM_CHILDREN - 1, -1, -1) if reverse else range(NUM_CHILDREN)
+        for d in digits:
+            yield from descend(prefix + str(d), inside)
+
+    for c in (reversed(CELLS0) if reverse else CELLS0):
+        yield from descend(c, False)
+
+
+def iter_cell_ids_in_bbox(resolution, bbox, offset=0, after=None, reverse=False):
+    """Yields, in Grid order, the IDs of the Cells at a resolution whose bounding boxes intersect bbox, as
+    iter_cell_ids_in_region() does"""
+    return iter_cell_ids_in_region(
+        resolution, lambda cell_id: _relate(cell_lonlat_bbox(cell_id), bbox), offset, after, reverse
+    )
+
+
+def _check_cell_id(cell_id, resolution):
+    if re.fullmatch("[NOPQRS][0-8]{{{}}}".format(resolution), cell_id) is None:
+        raise ValueError("'{}' is not the ID of a Cell at resolution {}".format(cell_id, resolution))
+
+
+def page_cell_ids(resolution, limit, offset=0, bbox=None, after=None, before=None):
+    """One page of the Cell IDs of a Grid, optionally only those intersecting bbox
+
+    Pages start at offset, or just after the Cell after, or end just before the Cell before. Returns
+    (cell_ids, prev, next) where prev and next are the paging query args of the adjacent pages, or None if there
+    is no such page. Without a bbox, pages are computed directly from Cell indices; with one, the next and prev
+    pages are addressed by cursor so that following them costs the same wherever the page is.
+    """
+    for cursor in (after, before):
+        if cursor is not None:
+            _check_cell_id(cursor, resolution)
+
+    if bbox is None:
+        total = num_cells(resolution)
+        if after is not None:
+            start = index_from_cell_id(after) + 1
+            stop = start + limit
+        elif before is not None:
+            stop = index_from_cell_id(before)
+            start = max(0, stop - limit)
+        else:
+            start = offset
+            stop = start + limit
+        stop = min(stop, total)
+        cell_ids = list(iter_cell_ids(resolution, start, stop))
+        prev = {"offset": max(0, start - limit)} if 0 < start <= total else None
+        next = {"offset": stop} if stop < total else None
+        return cell_ids, prev, next
+
+    if before is not None:
+        cell_ids = list(islice(iter_cell_ids_in_bbox(resolution, bbox, after=before, reverse=True), limit + 1))
+        more = len(cell_ids) > limit
+        cell_ids = list(reversed(cell_ids[:limit]))
+        prev = {"before": cell_ids[0]} if more else None
+        next = {"after": cell_ids[-1]} if cell_ids else None
+    else:
+        cell_ids = list(islice(iter_cell_ids_in_bbox(resolution, bbox, offset=offset, after=after), limit + 1))
+        more = len(cell_ids) > limit
+        cell_ids = cell_ids[:limit]
+        next = {"after": cell_ids[-1]} if more else None
+        prev = {"before": cell_ids[0]} if cell_ids and (offset > 0 or after is not None) else None
+    return cell_ids, prev, next
@@ -0,0 +1,293 @@
+from functools import lru_cache
+import numpy as np
+from .cells import NUM_CHILDREN, iter_cell_ids_in_region
+from .points import lonlat_from_xy
+from .tb16pix import TB16PIX_PLANE
+
+__all__ = [
+    "Region",
+    "region_from_bbox",
+    "region_from_geojson",
+    "cell_lonlat_outline",
+    "iter_cover",
+    "compact_cell_ids",
+]
+
+# Covers of regions - lon/lat polygons - by the Cells of a Grid. Cells are related to a region by their outlines
+# in lon/lat: equatorial Cells are exact lon/lat rectangles, and the curved edges of polar Cells are sampled.
+
+_SAMPLES = 9  # points along each edge of a polar Cell's outline
+
+
+def _planar_square(cell_id):
+    # the upper left vertex and width of a Cell in the rHEALPix plane, from its ID
+    w = TB16PIX_PLANE.cell_width(0)
+    x, y = TB16PIX_PLANE.ul_vertex[cell_id[0]]
+    for d in cell_id[1:]:
+        w /= 3
+        row, col = divmod(int(d), 3)
+        x += col * w
+        y -= row * w
+    return x, y, w
+
+
+def _contains_pole(x, y, w):
+    # whether a polar square contains the north or south pole, which are the centres of the polar base Cells
+    R = TB16PIX_PLANE.ellipsoid.R_A
+    squares = ((TB16PIX_PLANE.north_square, R * np.pi / 2), (TB16PIX_PLANE.south_square, -R * np.pi / 2))
+    for square, pole_y in squares:
+        pole_x = R * (-3 * np.pi / 4 + square * np.pi / 2)
+        if x < pole_x < x + w and y - w < pole_y < y:
+            return 90.0 if pole_y > 0 else -90.0
+    return None
+
+
+def _outlines(cell_ids):
+    # the lon/lat outlines of Cells that are all polar or all equatorial, projected together
+    squares = [_planar_square(cell_id) for cell_id in cell_ids]
+    R = TB16PIX_PLANE.ellipsoid.R_A
+    polar = squares[0][1] > R * np.pi / 4 or squares[0][1] - squares[0][2] < -R * np.pi / 4
+    n = _SAMPLES if polar else 2
+    steps = np.linspace(0, 1, n)[:-1]
+    ones = np.ones(n - 1)
+    # the boundary of a unit square, clockwise from its upper left vertex
+    unit_x = np.concatenate([steps, ones, 1 - steps, 0 * ones])
+    unit_y = np.concatenate([0 * ones, -steps, -ones, -1 + steps])
+    x, y, w = (np.array(v)[:, None] for v in zip(*squares))
+    lons, lats = lonlat_from_xy(x + w * unit_x, y + w * unit_y)
+
+    outlines = []
+    for (x, y, w), lon, lat in zip(squares, lons, lats):
+        pole = _contains_pole(x, y, w) if polar else None
+        if pole is not None:
+            order = np.argsort(lon)
+            lon, lat = lon[order], lat[order]
+            # the latitude where the outline crosses the antimeridian
+            span = lon[0] + 360 - lon[-1]
+            edge = lat[-1] + (lat[0] - lat[-1]) * ((180 - lon[-1]) / span if span > 0 else 0)
+            lon = np.concatenate([[-180], lon, [180, 180, -180]])
+            lat = np.concatenate([[edge], lat, [edge, pole, pole]])
+        elif lon.max() - lon.min() > 180:
+            lon = np.where(lon < 0, lon + 360, lon)
+        outline = np.column_stack([lon, lat])
+        outline.setflags(write=False)
+        outlines.append(outline)
+    return outlines
+
+
+@lru_cache(maxsize=2048)
+def _child_outlines(cell_id):
+    return _outlines([cell_id + str(d) for d in range(NUM_CHILDREN)])
+
+
+@lru_cache(maxsize=None)
+def _base_outline(cell_id):
+    return _outlines([cell_id])[0]
+
+
+def cell_lonlat_outline(cell_id):
+    """The outline of a Cell in lon/lat as a (k, 2) array, not closed
+
+    The outlines of Cells that cross the antimeridian have longitudes over 180 rather than wrapping around, and
+    those of the Cells containing the poles run along the antimeridian and the pole, so that every outline is a
+    simple lon/lat polygon. Outlines are made, and cached, for all 9 children of a Cell at once, as a descent
+    through the Grid relates them in turn.
+    """
+    if len(cell_id) == 1:
+        return _base_outline(cell_id)
+    return _child_outlines(cell_id[:-1])[int(cell_id[-1])]
+
+
+def _points_in_ring(points, ring):
+    # even-odd ray casting of many points against one ring
+    px, py = points[:, 0], points[:, 1]
+    inside = np.zeros(len(points), dtype=bool)
+    ax, ay = ring[:, 0], ring[:, 1]
+    bx, by = np.roll(ax, -1), np.roll(ay, -1)
+    for i in range(len(ring)):
+        crosses = (ay[i] > py) != (by[i] > py)
+        if crosses.any():
+            x = ax[i] + (py - ay[i]) * (bx[i] - ax[i]) / np.where(crosses, by[i] - ay[i], 1)
+            inside ^= crosses & (px < x)
+    return inside
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _segments_intersect(p, q, edges):
+    # whether any segment p[i] -> q[i] intersects or touches any of edges, an (E, 4) array of ax, ay, bx, by
+    px, py, qx, qy = p[:, 0, None], p[:, 1, None], q[:, 0, None], q[:, 1, None]
+    ax, ay, bx, by = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+    d1 = _orientation(ax, ay, bx, by, px, py)
+    d2 = _orientation(ax, ay, bx, by, qx, qy)
+    d3 = _orientation(px, py, qx, qy, ax, ay)
+    d4 = _orientation(px, py, qx, qy, bx, by)
+    overlap = (np.minimum(px, qx) <= np.maximum(ax, bx)) & (np.minimum(ax, bx) <= np.maximum(px, qx)) & \
+        (np.minimum(py, qy) <= np.maximum(ay, by)) & (np.minimum(ay, by) <= np.maximum(py, qy))
+    return bool((overlap & (d1 * d2 <= 0) & (d3 * d4 <= 0)).any())
+
+
+class Region:
+    """An area of the Earth: a union of lon/lat polygons, each a list of rings - an exterior and any holes - of
+    (lon, lat) positions. Polygons are planar in lon/lat and must not cross the antimeridian (split them there,
+    as GeoJSON does)."""
+    def __init__(self, polygons):
+        edges = []
+        owners = []
+        vertices = []
+        for i, polygon in enumerate(polygons):
+            for ring in polygon:
+                try:
+                    ring = np.asarray(ring, dtype=np.float64)
+                except (TypeError, ValueError):
+                    raise ValueError("Polygon rings must be lists of at least 3 [lon, lat] positions")
+                if ring.ndim != 2 or ring.shape[1] < 2 or len(ring) < 3:
+                    raise ValueError("Polygon rings must be lists of at least 3 [lon, lat] positions")
+                ring = ring[:, :2]
+                if (np.abs(ring[:, 0]) > 180).any() or (np.abs(ring[:, 1]) > 90).any() or \
+                        not np.isfinite(ring).all():
+                    raise ValueError("Polygon positions must be within -180,-90,180,90")
+                if not (ring[0] == ring[-1]).all():
+                    ring = np.vstack([ring, ring[:1]])
+                edges.append(np.hstack([ring[:-1], ring[1:]]))
+                owners.append(np.full(len(ring) - 1, i))
+                vertices.append(ring[:-1])
+        if not edges:
+            raise ValueError("A region must have at least one polygon")
+        self.num_polygons = len(polygons)
+        self._edges = np.concatenate(edges)
+        self._owners = np.concatenate(owners)
+        self._vertices = np.concatenate(vertices)
+        self._edge_bounds = np.column_stack([
+            np.minimum(self._edges[:, 0], self._edges[:, 2]),
+            np.minimum(self._edges[:, 1], self._edges[:, 3]),
+            np.maximum(self._edges[:, 0], self._edges[:, 2]),
+            np.maximum(self._edges[:, 1], self._edges[:, 3]),
+        ])
+        self.bbox = (
+            float(self._vertices[:, 0].min()),
+            float(self._vertices[:, 1].min()),
+            float(self._vertices[:, 0].max()),
+            float(self._vertices[:, 1].max()),
+        )
+
+    def contains_point(self, lon, lat):
+        """Whether the point is inside the region"""
+        if lon > 180:
+            lon -= 360
+        ax, ay, bx, by = self._edges.T
+        crosses = (ay > lat) != (by > lat)
+        x = ax + (lat - ay) * (bx - ax) / np.where(crosses, by - ay, 1)
+        counts = np.bincount(self._owners[crosses & (lon < x)], minlength=self.num_polygons)
+        return bool((counts % 2 == 1).any())
+
+    def _near(self, west, south, east, north):
+        # the edges and vertices of the region within a box, moved east by 360 for a box east of the antimeridian
+        shift = 360.0 if west >= 180 else 0.0
+        west, east = west - shift, east - shift
+        b = self._edge_bounds
+        near = (b[:, 0] <= east) & (b[:, 2] >= west) & (b[:, 1] <= north) & (b[:, 3] >= south)
+        v = self._vertices
+        in_box = (v[:, 0] >= west) & (v[:, 0] <= east) & (v[:, 1] >= south) & (v[:, 1] <= north)
+        edges, vertices = self._edges[near], v[in_box]
+        if shift:
+            edges = edges + [shift, 0, shift, 0]
+            vertices = vertices + [shift, 0]
+        return edges, vertices
+
+    def relate(self, cell_id):
+        """'outside', 'inside' or 'overlaps': the relation of a Cell to the region"""
+        outline = cell_lonlat_outline(cell_id)
+        west, south = outline.min(axis=0)
+        east, north = outline.max(axis=0)
+        if north < self.bbox[1] or south > self.bbox[3]:
+            return "outside"
+        # the parts of the outline either side of the antimeridian, if it crosses it
+        parts = [(west, east)] if east <= 180 else [(west, 180.0), (180.0, east)]
+        near = [self._near(part_west, south, part_east, north) for part_west, part_east in parts]
+        edges = np.concatenate([e for e, _ in near])
+        vertices = np.concatenate([v for _, v in near])
+        if len(edges) and _segments_intersect(outline, np.roll(outline, -1, axis=0), edges):
+            return "overlaps"
+        if len(vertices) and _points_in_ring(vertices, outline).any():
+            # a polygon, or a hole in one, is inside the Cell
+            return "overlaps"
+        return "inside" if self.contains_point(*outline[0]) else "outside"
+
+
+def region_from_bbox(bbox):
+    """The Region of a (west, south, east, north) bbox, as from parse_bbox(); west > east crosses the
+    antimeridian"""
+    west, south, east, north = bbox
+    lons = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    return Region([[[(w, south), (e, south), (e, north), (w, north)]] for w, e in lons])
+
+
+def region_from_geojson(obj):
+    """The Region of a GeoJSON Polygon or MultiPolygon, or of a Feature or FeatureCollection of them. Raises
+    ValueError for anything else"""
+    return Region(list(_geojson_polygons(obj)))
+
+
+def _geojson_polygons(obj):
+    kind = obj.get("type") if isinstance(obj, dict) else None
+    if kind == "FeatureCollection":
+        for feature in obj.get("features") or []:
+            yield from _geojson_polygons(feature)
+    elif kind == "Feature":
+        yield from _geojson_polygons(obj.get("geometry"))
+    elif kind == "GeometryCollection":
+        for geometry in obj.get("geometries") or []:
+            yield from _geojson_polygons(geometry)
+    elif kind == "Polygon":
+        yield obj.get("coordinates") or []
+    elif kind == "MultiPolygon":
+        yield from obj.get("coordinates") or []
+    else:
+        raise ValueError("A region must be a GeoJSON Polygon or MultiPolygon, or a Feature or FeatureCollection "
+                         "of them")
+
+
+def _continues(previous, cell_id):
+    # whether cell_id is the next sibling of previous, or its first descendant at some resolution, so the two
+    # might be part of the same complete set of siblings
+    if len(previous) < 2 or previous[-1] == "8":
+        return False
+    following = previous[:-1] + str(int(previous[-1]) + 1)
+    return cell_id.startswith(following) and cell_id[len(following):].strip("0") == ""
+
+
+def compact_cell_ids(cell_ids):
+    """Yields cell_ids with every complete set of 9 sibling Cells replaced by their parent, repeatedly, so a
+    cover is given by the fewest Cells of mixed resolutions
+
+    cell_ids must be in Grid order with no Cell given along with one of its ancestors, as iter_cover() yields
+    them. They are consumed as they are yielded, holding back at most 8 Cells per resolution.
+    """
+    run = []  # consecutive Cells that, with those still to come, might complete sets of siblings
+    for cell_id in cell_ids:
+        if run and not _continues(run[-1], cell_id):
+            yield from run
+            run = []
+        run.append(cell_id)
+        while len(run) >= NUM_CHILDREN and len(run[-1]) > 1 and run[-1][-1] == "8":
+            parent = run[-1][:-1]
+            if run[-NUM_CHILDREN:] != [parent + str(d) for d in range(NUM_CHILDREN)]:
+                break
+            del run[-NUM_CHILDREN:]
+            run.append(parent)
+    yield from run
+
+
+def iter_cover(region, resolution, compact=False):
+    """Yields, in Grid order, the IDs of the Cells at a resolution that cover a Region: those inside or
+    overlapping it
+
+    Only the Cells on the region's boundary are related to it, so the work done depends on the length of its
+    boundary, not its area. If compact is True, complete sets of 9 sibling Cells are given as their parent,
+    repeatedly, so the cover has Cells of mixed resolutions.
+    """
+    cell_ids = iter_cell_ids_in_region(resolution, region.relate, compact=compact)
+    return compact_cell_ids(cell_ids) if compact else cell_ids
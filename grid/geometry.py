@@ -0,0 +1,252 @@
+import logging
+import os
+import threading
+from functools import lru_cache
+import numpy as np
+from config import GEOMETRY_FILE, GEOMETRY_TABLE_RESOLUTION, GEOMETRY_CACHE_SIZE
+from .cells import index_from_cell_id, num_cells
+from .points import lonlat_from_xy
+from .tb16pix import TB16PIX_PLANE
+
+__all__ = [
+    "cell_points",
+    "grid_points",
+    "cell_geojson",
+    "cell_geojsons",
+    "cell_centroid",
+    "cell_centroids",
+    "cell_wkt",
+    "point_wkt",
+    "geojson_wkt",
+    "geometry_table",
+    "build_geometry_table",
+    "geometry_stats",
+]
+
+# The lon/lat geometry of Cells: their four vertices, as rhealpixdggs' Cell.vertices(plane=False) gives them, and
+# their nucleus, the projection of the centre of the planar Cell, which is used as their centroid. These are
+# computed for many Cells at once by projecting their planar squares with grid.points.lonlat_from_xy().
+#
+# The points of every Cell at resolutions 0 - GEOMETRY_TABLE_RESOLUTION are kept in a table file, GEOMETRY_FILE,
+# that is built once and memory-mapped, so all worker processes share one copy in the page cache. The table is
+# an array of shape (cells, 5, 2): for each Cell, in order of resolution and then Grid order, the lon/lat of its
+# upper left, upper right, lower right and lower left planar vertices and its nucleus. Finer Cells' points are
+# computed when needed and their GeoJSON geometries kept in an LRU cache of GEOMETRY_CACHE_SIZE.
+
+_UL = np.array([TB16PIX_PLANE.ul_vertex[b] for b in "NOPQRS"])
+_POINTS = 5
+_DECIMALS = 9  # lon/lat are rounded to 0.1 mm or less
+
+
+def _offset(resolution):
+    # the table row of the first Cell at a resolution
+    return sum(num_cells(r) for r in range(resolution))
+
+
+def _planar_squares(index, resolution):
+    # the upper left vertices and width of the Cells at the given indices of the Grid at a resolution
+    index = np.asarray(index, dtype=np.int64)
+    base, rest = np.divmod(index, 9 ** resolution)
+    row = np.zeros_like(index)
+    col = np.zeros_like(index)
+    for i in range(resolution - 1, -1, -1):
+        row, col = row * 3 + rest // 9 ** i % 9 // 3, col * 3 + rest // 9 ** i % 3
+    w = TB16PIX_PLANE.cell_width(resolution)
+    return _UL[base, 0] + col * w, _UL[base, 1] - row * w, w
+
+
+def _clamp(index, resolution, xs, ys):
+    # points on the edges of a base Cell's square can be rounded to just outside it, where they would be projected
+    # as if they were in the polar triangles, so they are clamped to the square
+    ul = _UL[np.asarray(index, dtype=np.int64) // 9 ** resolution]
+    w = TB16PIX_PLANE.cell_width(0)
+    return np.clip(xs, ul[:, :1], ul[:, :1] + w), np.clip(ys, ul[:, 1:] - w, ul[:, 1:])
+
+
+def _compute_points(index, resolution):
+    # the (n, 5, 2) table rows of the Cells at the given indices of the Grid at a resolution
+    x, y, w = _planar_squares(index, resolution)
+    xs = np.column_stack([x, x + w, x + w, x, x + w / 2])
+    ys = np.column_stack([y, y, y - w, y - w, y - w / 2])
+    lon, lat = lonlat_from_xy(*_clamp(index, resolution, xs, ys))
+    return np.stack([lon, lat], axis=-1)
+
+
+def build_geometry_table(path=GEOMETRY_FILE, resolution=GEOMETRY_TABLE_RESOLUTION, batch_size=65536):
+    """Computes the points of every Cell at resolutions 0 - resolution into a new table file at path"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = _offset(resolution + 1)
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    table = np.lib.format.open_memmap(temp, mode="w+", dtype=np.float64, shape=(rows, _POINTS, 2))
+    for r in range(resolution + 1):
+        offset = _offset(r)
+        for start in range(0, num_cells(r), batch_size):
+            index = np.arange(start, min(start + batch_size, num_cells(r)))
+            table[offset + start:offset + start + len(index)] = _compute_points(index, r)
+    table.flush()
+    del table
+    os.replace(temp, path)  # atomic, so other processes never see a partial table
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def geometry_table():
+    """The memory-mapped table of the points of the Cells at resolutions 0 - GEOMETRY_TABLE_RESOLUTION, which is
+    built first if there is no valid one in GEOMETRY_FILE"""
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                shape = (_offset(GEOMETRY_TABLE_RESOLUTION + 1), _POINTS, 2)
+                table = None
+                try:
+                    table = np.load(GEOMETRY_FILE, mmap_mode="r")
+                except (OSError, ValueError):
+                    pass
+                if table is None or table.shape != shape or table.dtype != np.float64:
+                    logging.info("Building the Cell geometry table {}".format(GEOMETRY_FILE))
+                    build_geometry_table()
+                    table = np.load(GEOMETRY_FILE, mmap_mode="r")
+                _table = table
+    return _table
+
+
+def grid_points(index, resolution):
+    """The points, as cell_points() gives them, of the Cells at the given indices of the Grid at a resolution"""
+    index = np.asarray(index, dtype=np.int64)
+    if resolution <= GEOMETRY_TABLE_RESOLUTION:
+        return geometry_table()[_offset(resolution) + index]
+    return _compute_points(index, resolution)
+
+
+def cell_points(cell_ids):
+    """The lon/lat of the upper left, upper right, lower right and lower left vertices and the nucleus of each of
+    the Cells, as an (n, 5, 2) array. The points of coarse Cells come from the table, others are computed"""
+    points = np.empty((len(cell_ids), _POINTS, 2))
+    by_resolution = {}
+    for i, cell_id in enumerate(cell_ids):
+        by_resolution.setdefault(len(cell_id) - 1, []).append(i)
+    for resolution, rows in by_resolution.items():
+        index = np.array([index_from_cell_id(cell_ids[i]) for i in rows], dtype=np.int64)
+        points[rows] = grid_points(index, resolution)
+    return points
+
+
+def _is_cap(cell_id):
+    # the polar Cells containing a pole are the centre Cells of N and S, all the way down
+    return cell_id[0] in "NS" and cell_id[1:].strip("4") == ""
+
+
+def _counterclockwise(ring):
+    area = sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(ring, ring[1:] + ring[:1]))
+    return ring if area > 0 else list(reversed(ring))
+
+
+def _clip(ring, east):
+    # the part of a ring west (or east) of lon 180, by Sutherland-Hodgman clipping
+    def keep(p):
+        return p[0] >= 180 if east else p[0] <= 180
+
+    result = []
+    for a, b in zip(ring, ring[1:] + ring[:1]):
+        if keep(a):
+            result.append(a)
+        if keep(a) != keep(b):
+            t = (180 - a[0]) / (b[0] - a[0])
+            result.append((180.0, a[1] + t * (b[1] - a[1])))
+    return result
+
+
+def _closed(ring):
+    return [[float(lon), float(lat)] for lon, lat in ring + ring[:1]]
+
+
+def _geometry(cell_id, points):
+    vertices = [(round(float(lon), _DECIMALS), round(float(lat), _DECIMALS)) for lon, lat in points[:4]]
+    if _is_cap(cell_id):
+        # a cap around the pole, bounded by the antimeridian and the pole in lon/lat
+        pole = 90.0 if cell_id[0] == "N" else -90.0
+        vertices.sort()
+        (west, west_lat), (east, east_lat) = vertices[0], vertices[-1]
+        edge = east_lat + (west_lat - east_lat) * (180 - east) / (west + 360 - east)
+        ring = [(-180.0, edge)] + vertices + [(180.0, edge), (180.0, pole), (-180.0, pole)]
+        return {"type": "Polygon", "coordinates": [_closed(_counterclockwise(ring))]}
+
+    lons = [lon for lon, _ in vertices]
+    if max(lons) - min(lons) > 180:
+        ring = [(lon + 360 if lon < 0 else lon, lat) for lon, lat in vertices]
+        if max(lon for lon, _ in ring) <= 180:
+            return {"type": "Polygon", "coordinates": [_closed(_counterclockwise(ring))]}
+        # split at the antimeridian, as RFC 7946 recommends
+        west = _clip(ring, east=False)
+        east = [(lon - 360, lat) for lon, lat in _clip(ring, east=True)]
+        return {
+            "type": "MultiPolygon",
+            "coordinates": [[_closed(_counterclockwise(part))] for part in (west, east)],
+        }
+    return {"type": "Polygon", "coordinates": [_closed(_counterclockwise(vertices))]}
+
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def cell_geojson(cell_id):
+    """The GeoJSON geometry of a Cell: a Polygon, or a MultiPolygon split at the antimeridian. Cached"""
+    return _geometry(cell_id, cell_points([cell_id])[0])
+
+
+def cell_geojsons(cell_ids, points=None):
+    """The GeoJSON geometries of many Cells, with all their points looked up or computed together, unless they are
+    given, as cell_points() gives them"""
+    if points is None:
+        points = cell_points(cell_ids)
+    return [_geometry(cell_id, p) for cell_id, p in zip(cell_ids, points)]
+
+
+def cell_centroid(cell_id):
+    """The (lon, lat) of a Cell's nucleus, the projection of the centre of its planar square"""
+    lon, lat = cell_points([cell_id])[0][4]
+    return round(float(lon), _DECIMALS), round(float(lat), _DECIMALS)
+
+
+def cell_centroids(points):
+    """The (lon, lat) of the nuclei of many Cells, from their points as cell_points() gives them"""
+    return [(round(float(lon), _DECIMALS), round(float(lat), _DECIMALS)) for lon, lat in points[:, 4]]
+
+
+def _wkt_ring(ring):
+    return "({})".format(", ".join("{} {}".format(lon, lat) for lon, lat in ring))
+
+
+def geojson_wkt(geometry):
+    """The WKT of a GeoJSON Point, Polygon or MultiPolygon"""
+    if geometry["type"] == "Point":
+        return "POINT ({} {})".format(*geometry["coordinates"])
+    elif geometry["type"] == "Polygon":
+        return "POLYGON ({})".format(", ".join(_wkt_ring(ring) for ring in geometry["coordinates"]))
+    return "MULTIPOLYGON ({})".format(", ".join(
+        "({})".format(", ".join(_wkt_ring(ring) for ring in polygon)) for polygon in geometry["coordinates"]
+    ))
+
+
+def cell_wkt(cell_id):
+    """The WKT of a Cell's geometry"""
+    return geojson_wkt(cell_geojson(cell_id))
+
+
+def point_wkt(lon, lat):
+    return "POINT ({} {})".format(lon, lat)
+
+
+def geometry_stats():
+    """The geometry table's file and size and the finer Cells' geometry cache's counters"""
+    info = cell_geojson.cache_info()
+    return {
+        "table": GEOMETRY_FILE if _table is not None else None,
+        "table_resolution": GEOMETRY_TABLE_RESOLUTION,
+        "table_bytes": int(_table.nbytes) if _table is not None else 0,
+        "cache_hits": info.hits,
+        "cache_misses": info.misses,
+        "cache_size": info.currsize,
+        "cache_max_size": info.maxsize,
+    }
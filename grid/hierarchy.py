@@ -0,0 +1,58 @@
+import numpy as np
+from .cells import CELLS0, NUM_CHILDREN, index_from_cell_id
+from .zoneid import MAX_RESOLUTION, pack_grid_index, unpack_array
+
+__all__ = [
+    "iter_descendants",
+    "iter_ancestors",
+]
+
+# Walks of the Zone hierarchy. A Zone's descendants at any resolution are a contiguous range of that resolution's
+# Grid, so they are made from their Grid indices a batch at a time, without holding the subtree in memory, and the
+# Zones between it and them are yielded as their first descendants are reached.
+
+_BATCH = 4096
+
+
+def _descendants_at(zone_id, depth):
+    # the IDs of a Zone's descendants depth levels below it, in Grid order
+    resolution = len(zone_id) - 1 + depth
+    count = NUM_CHILDREN ** depth
+    start = index_from_cell_id(zone_id) * count
+    for first in range(start, start + count, _BATCH):
+        index = np.arange(first, min(first + _BATCH, start + count), dtype=np.int64)
+        yield from unpack_array(pack_grid_index(index, resolution)).tolist()
+
+
+def iter_descendants(zone_id, depth, leaves_only=False):
+    """Yields the IDs of the descendants of a Zone, or of "Earth", down to depth levels below it, each Zone before
+    its children, in the same order as sorting their IDs, or, with leaves_only, just those depth levels below it.
+    Memory use doesn't grow with the number of descendants. Raises ValueError if that is finer than MAX_RESOLUTION"""
+    if depth < 0 or (zone_id != "Earth" and len(zone_id) - 1 + depth > MAX_RESOLUTION) or depth > MAX_RESOLUTION + 1:
+        raise ValueError("Zones have descendants down to resolution {} only".format(MAX_RESOLUTION))
+    if depth == 0:
+        return
+    if zone_id == "Earth":
+        for base in CELLS0:
+            if depth == 1 or not leaves_only:
+                yield base
+            yield from iter_descendants(base, depth - 1, leaves_only)
+        return
+
+    top = len(zone_id) + 1
+    for leaf in _descendants_at(zone_id, depth):
+        if not leaves_only:
+            # a Zone's first descendant is the one whose remaining digits are all 0, so the Zones between zone_id
+            # and a leaf that start with it come just before it
+            for length in range(max(top, len(leaf.rstrip("0"))), len(leaf)):
+                yield leaf[:length]
+        yield leaf
+
+
+def iter_ancestors(zone_id):
+    """Yields the IDs of the ancestors of a Zone, its parent first and Earth last. Earth has none"""
+    if zone_id == "Earth":
+        return
+    for length in range(len(zone_id) - 1, 0, -1):
+        yield zone_id[:length]
+    yield "Earth"
@@ -0,0 +1,174 @@
+import numpy as np
+
+__all__ = [
+    "DIRECTIONS",
+    "neighbour",
+    "neighbours",
+    "neighbours_batch",
+]
+
+# The (planar) directions of a Cell's edge neighbours, in the order calculate_neighbours() returns them
+DIRECTIONS = ("down", "left", "right", "up")
+
+# The tables below reproduce rhealpixdggs' Cell.neighbor() for the TB16Pix configuration in config.py
+# (N_side=3, north_square=0, south_square=0) so that neighbours are found from a Cell's ID alone.
+#
+# Digits are laid out in a base Cell as
+#   0 1 2
+#   3 4 5
+#   6 7 8
+# and the six base Cells are folded into a cube as
+#   N
+#   O P Q R
+#   S
+
+# the base Cell across each edge of each base Cell
+_BASE_NEIGHBOURS = {
+    "N": {"down": "O", "right": "P", "up": "Q", "left": "R"},
+    "O": {"down": "S", "right": "P", "up": "N", "left": "R"},
+    "P": {"down": "S", "right": "Q", "up": "N", "left": "O"},
+    "Q": {"down": "S", "right": "R", "up": "N", "left": "P"},
+    "R": {"down": "S", "right": "O", "up": "N", "left": "Q"},
+    "S": {"down": "Q", "right": "P", "up": "O", "left": "R"},
+}
+
+# the digits on each edge of a Cell: a step in that direction from one of them leaves the parent Cell
+_BORDERS = {"down": "678", "left": "036", "right": "258", "up": "012"}
+
+# the digit one step in each direction, wrapping around to the opposite edge of the parent Cell
+_DIGIT_NEIGHBOURS = {
+    "down": "345678012",
+    "left": "201534867",
+    "right": "120453786",
+    "up": "678012345",
+}
+
+# quarter turns anticlockwise of the neighbour's base Cell needed when stepping between a polar and an
+# equatorial base Cell, as on the folded cube their grids are rotated relative to each other
+_ROTATIONS = {
+    ("S", "R"): 1, ("P", "S"): 1, ("N", "P"): 1, ("R", "N"): 1,
+    ("S", "Q"): 2, ("Q", "S"): 2, ("N", "Q"): 2, ("Q", "N"): 2,
+    ("S", "P"): 3, ("R", "S"): 3, ("N", "R"): 3, ("P", "N"): 3,
+}
+
+# digit d rotated by q quarter turns anticlockwise is _ROTATED_DIGITS[q][d]
+_ROTATED_DIGITS = ("012345678", "258147036", "876543210", "630741852")
+
+_DIGIT_TRANSLATIONS = {d: str.maketrans("012345678", v) for d, v in _DIGIT_NEIGHBOURS.items()}
+_ROTATE_TRANSLATIONS = [str.maketrans("012345678", v) for v in _ROTATED_DIGITS]
+
+
+_DIRECTION_TABLES = [(d, _BORDERS[d], _DIGIT_TRANSLATIONS[d]) for d in DIRECTIONS]
+
+
+def _step(base, digits, direction, border, translation):
+    # the trailing digits on the edge being crossed, and the first digit before them, all step across it
+    kept = digits.rstrip(border)
+    if kept:
+        return base + kept[:-1] + digits[len(kept) - 1:].translate(translation)
+
+    # every digit is on the edge, so the neighbour is in the adjacent base Cell
+    neighbour_base = _BASE_NEIGHBOURS[base][direction]
+    neighbour_digits = digits.translate(translation)
+    quarter_turns = _ROTATIONS.get((base, neighbour_base))
+    if quarter_turns:
+        neighbour_digits = neighbour_digits.translate(_ROTATE_TRANSLATIONS[quarter_turns])
+    return neighbour_base + neighbour_digits
+
+
+def neighbour(zone_id, direction):
+    """The ID of the Zone across the given edge ('down', 'left', 'right' or 'up') of a Zone"""
+    return _step(zone_id[0], zone_id[1:], direction, _BORDERS[direction], _DIGIT_TRANSLATIONS[direction])
+
+
+def neighbours(zone_id):
+    """[(direction, neighbour ID), ...] for the four edge neighbours of a Zone, in DIRECTIONS order"""
+    base, digits = zone_id[0], zone_id[1:]
+    result = []
+    for d, border, translation in _DIRECTION_TABLES:
+        kept = digits.rstrip(border)
+        if kept:  # the common case, inlined from _step()
+            result.append((d, base + kept[:-1] + digits[len(kept) - 1:].translate(translation)))
+        else:
+            result.append((d, _step(base, digits, d, border, translation)))
+    return result
+
+
+# array forms of the tables above, for neighbours_batch()
+_BASES = "NOPQRS"
+_BASE_CODES = np.frombuffer(_BASES.encode(), dtype=np.uint8)
+_BASE_INDEX = np.zeros(128, dtype=np.int64)
+_BASE_INDEX[_BASE_CODES] = np.arange(len(_BASES))
+_ARRAY_BASE_NEIGHBOURS = {
+    d: np.array([_BASES.index(_BASE_NEIGHBOURS[b][d]) for b in _BASES]) for d in DIRECTIONS
+}
+_ARRAY_BORDERS = {d: np.array([str(n) in v for n in range(9)]) for d, v in _BORDERS.items()}
+_ARRAY_DIGIT_NEIGHBOURS = {d: np.array([int(n) for n in v], dtype=np.uint8) for d, v in _DIGIT_NEIGHBOURS.items()}
+_ARRAY_ROTATIONS = np.zeros((len(_BASES), len(_BASES)), dtype=np.int64)
+for (_a, _b), _q in _ROTATIONS.items():
+    _ARRAY_ROTATIONS[_BASES.index(_a), _BASES.index(_b)] = _q
+_ARRAY_ROTATED_DIGITS = np.array([[int(n) for n in v] for v in _ROTATED_DIGITS], dtype=np.uint8)
+
+
+def _neighbours_of_arrays(bases, digits, direction):
+    """Vectorised neighbour(): bases is an (n,) array of base Cell indices and digits an (n, resolution) array"""
+    carrying = np.ones(len(bases), dtype=bool)
+    neighbour_digits = digits.copy()
+    table = _ARRAY_DIGIT_NEIGHBOURS[direction]
+    border = _ARRAY_BORDERS[direction]
+    for col in range(digits.shape[1] - 1, -1, -1):
+        column = digits[:, col]
+        neighbour_digits[:, col] = np.where(carrying, table[column], column)
+        carrying &= border[column]
+    neighbour_bases = np.where(carrying, _ARRAY_BASE_NEIGHBOURS[direction][bases], bases)
+    quarter_turns = _ARRAY_ROTATIONS[bases, neighbour_bases]
+    neighbour_digits = _ARRAY_ROTATED_DIGITS[quarter_turns[:, None], neighbour_digits]
+    return neighbour_bases, neighbour_digits
+
+
+def neighbours_batch(zone_ids):
+    """The neighbours of many Zones at once
+
+    zone_ids is a sequence or array of Zone IDs, which may be of mixed resolution. Returns an (n, 4) array of
+    neighbour IDs with columns in DIRECTIONS order.
+    """
+    ids = np.asarray(zone_ids, dtype=str).ravel()
+    lengths = np.char.str_len(ids)
+    result = np.empty((len(ids), len(DIRECTIONS)), dtype=ids.dtype)
+    for length in np.unique(lengths):
+        rows = np.nonzero(lengths == length)[0]
+        chars = np.frombuffer(ids[rows].astype("S{}".format(length)).tobytes(), dtype=np.uint8)
+        chars = chars.reshape(len(rows), length)
+        bases = _BASE_INDEX[chars[:, 0]]
+        digits = chars[:, 1:] - ord("0")
+        for col, direction in enumerate(DIRECTIONS):
+            neighbour_bases, neighbour_digits = _neighbours_of_arrays(bases, digits, direction)
+            out = np.empty_like(chars)
+            out[:, 0] = _BASE_CODES[neighbour_bases]
+            out[:, 1:] = neighbour_digits + ord("0")
+            result[rows, col] = out.view("S{}".format(length)).ravel().astype(ids.dtype)
+    return result
+
+
+if __name__ == "__main__":
+    # a timing comparison with rhealpixdggs' Cell.neighbors(); tests/test_neighbours.py checks they agree
+    import time
+    from config import TB16Pix
+    from rhealpixdggs.dggs import Cell
+    from grid.cells import iter_cell_ids, suid_from_cell_id
+
+    ids = list(iter_cell_ids(4))
+    start = time.perf_counter()
+    for zone_id in ids[:2000]:
+        Cell(TB16Pix, suid_from_cell_id(zone_id)).neighbors()
+    rhealpix_us = (time.perf_counter() - start) / 2000 * 1e6
+    start = time.perf_counter()
+    for zone_id in ids:
+        neighbours(zone_id)
+    table_us = (time.perf_counter() - start) / len(ids) * 1e6
+    start = time.perf_counter()
+    neighbours_batch(ids)
+    batch_us = (time.perf_counter() - start) / len(ids) * 1e6
+    print("per Zone: rhealpixdggs {:.2f}us, neighbours() {:.2f}us, neighbours_batch() {:.2f}us".format(
+        rhealpix_us, table_us, batch_us
+    ))
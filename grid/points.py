@@ -0,0 +1,255 @@
+import numpy as np
+from .tb16pix import TB16PIX_PLANE
+from .zoneid import MAX_RESOLUTION, pack_grid_index
+
+__all__ = [
+    "rhealpix_xy",
+    "lonlat_from_xy",
+    "cell_indices_from_points",
+    "cell_ids_from_points",
+    "cell_id_from_point",
+    "packed_ids_from_points",
+]
+
+# A vectorised version of TB16Pix.cell_from_point(resolution, (lon, lat), plane=False): the rHEALPix projection
+# of arrays of lon/lat points and the assignment of the projected points to Cells, done with NumPy array
+# operations rather than a Proj call and a Cell object per point. Each step follows rhealpixdggs' own (scalar)
+# arithmetic, including its degree/radian round trips, so points on Cell edges land in the same Cells.
+
+_ELLIPSOID = TB16PIX_PLANE.ellipsoid
+_R_A = TB16PIX_PLANE.ellipsoid.R_A
+_BASE_CODES = np.frombuffer("NOPQRS".encode(), dtype=np.uint8)
+# the upper left vertex of each base Cell, in base Cell order
+_UL = np.array([TB16PIX_PLANE.ul_vertex[b] for b in "NOPQRS"])
+
+
+def _wrap_longitude(lam):
+    # rhealpixdggs.utils.wrap_longitude(lam, radians=True): into -pi <= lam < pi
+    wrapped = lam - 2 * np.pi * np.floor(lam / (2 * np.pi))
+    wrapped = np.where(wrapped >= np.pi, wrapped - 2 * np.pi, wrapped)
+    return np.where((lam < -np.pi) | (lam >= np.pi), wrapped, lam)
+
+
+def _wrap_latitude(phi):
+    # rhealpixdggs.utils.wrap_latitude(phi, radians=True)
+    phi = _wrap_longitude(phi)
+    return np.where(np.abs(phi) <= np.pi / 2, phi, phi - np.sign(phi) * np.pi)
+
+
+def _auth_lat(phi, e):
+    # rhealpixdggs.utils.auth_lat(phi, e, radians=True)
+    if e == 0:
+        return phi
+    sin_phi = np.sin(phi)
+    q = ((1 - e ** 2) * sin_phi) / (1 - (e * sin_phi) ** 2) - (1 - e ** 2) / (2.0 * e) * np.log(
+        (1 - e * sin_phi) / (1 + e * sin_phi)
+    )
+    qp = 1 - (1 - e ** 2) / (2.0 * e) * np.log((1.0 - e) / (1.0 + e))
+    ratio = q / qp
+    ratio = np.where(np.abs(ratio) > 1, np.sign(ratio), ratio)
+    return np.arcsin(ratio)
+
+
+def _healpix_sphere(lam, phi):
+    # rhealpixdggs.pj_healpix.healpix_sphere()
+    phi0 = np.arcsin(2.0 / 3)
+    equatorial = np.abs(phi) <= phi0
+    sigma = np.sqrt(3 * (1 - np.abs(np.sin(phi))))
+    cap_number = np.minimum(np.floor(2 * lam / np.pi + 2), 3)
+    lamc = -3 * np.pi / 4 + (np.pi / 2) * cap_number
+    x = np.where(equatorial, lam, lamc + (lam - lamc) * sigma)
+    y = np.where(equatorial, 3 * np.pi / 8 * np.sin(phi), np.sign(phi) * np.pi / 4 * (2 - sigma))
+    return x, y
+
+
+def _combine_triangles(x, y, north_square, south_square):
+    # rhealpixdggs.pj_rhealpix.combine_triangles(): rotates the polar triangles of the HEALPix projection
+    # about their tips into the north and south polar squares
+    north = y > np.pi / 4
+    south = y < -np.pi / 4
+    triangle = np.select([x < -np.pi / 2, x < 0, x < np.pi / 2], [0, 1, 2], 3)
+    quarter_turns = np.where(north, triangle - north_square, south_square - triangle) % 4
+    dx = x - (-3 * np.pi / 4 + triangle * np.pi / 2)
+    dy = y - np.sign(y) * np.pi / 2
+    # rotating (dx, dy) anticlockwise by 0, 1, 2 or 3 quarter turns
+    rx = np.choose(quarter_turns, [dx, -dy, -dx, dy])
+    ry = np.choose(quarter_turns, [dy, dx, -dy, -dx])
+    square = np.where(north, north_square, south_square)
+    polar_x = rx + (-3 * np.pi / 4 + square * np.pi / 2)
+    polar_y = ry + np.where(north, np.pi / 2, -np.pi / 2)
+    polar = north | south
+    return np.where(polar, polar_x, x), np.where(polar, polar_y, y)
+
+
+def rhealpix_xy(lon, lat):
+    """The TB16Pix rHEALPix projection, TB16Pix.rhealpix(lon, lat), of arrays of longitudes and latitudes in
+    degrees. Returns arrays of x and y in metres"""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    # projection_wrapper.Proj moves (lon_0, lat_0) to (0, 0), wrapping in degrees ...
+    lam = np.rad2deg(_wrap_longitude(np.deg2rad(lon - _ELLIPSOID.lon_0)))
+    phi = np.rad2deg(_wrap_latitude(np.deg2rad(lat - _ELLIPSOID.lat_0)))
+    # ... then pj_rhealpix works in radians on the authalic sphere, scaled up by R_A
+    lam, phi = np.deg2rad(lam), np.deg2rad(phi)
+    x, y = _healpix_sphere(lam, _auth_lat(phi, _ELLIPSOID.e))
+    x, y = _combine_triangles(x, y, TB16PIX_PLANE.north_square, TB16PIX_PLANE.south_square)
+    return _R_A * x, _R_A * y
+
+
+def _combine_triangles_inverse(x, y, north_square, south_square):
+    # rhealpixdggs.pj_rhealpix.combine_triangles(inverse=True): moves points of the polar squares back into the
+    # polar triangles of the HEALPix projection
+    eps = 1e-15
+    north = y > np.pi / 4
+    south = y < -np.pi / 4
+    ns, ss = north_square, south_square
+    l1 = x - (-3 * np.pi / 4 + (ns - 1) * np.pi / 2)
+    l2 = -x + (-3 * np.pi / 4 + (ns + 1) * np.pi / 2)
+    north_triangle = np.select(
+        [(y < l1 - eps) & (y >= l2 - eps), (y >= l1 - eps) & (y > l2 + eps), (y > l1 + eps) & (y <= l2 + eps)],
+        [(ns + 1) % 4, (ns + 2) % 4, (ns + 3) % 4],
+        ns,
+    )
+    l1 = x - (-3 * np.pi / 4 + (ss + 1) * np.pi / 2)
+    l2 = -x + (-3 * np.pi / 4 + (ss - 1) * np.pi / 2)
+    south_triangle = np.select(
+        [(y <= l1 + eps) & (y > l2 + eps), (y < l1 - eps) & (y <= l2 + eps), (y >= l1 - eps) & (y < l2 - eps)],
+        [(ss + 1) % 4, (ss + 2) % 4, (ss + 3) % 4],
+        ss,
+    )
+    triangle = np.where(north, north_triangle, south_triangle)
+    square = np.where(north, ns, ss)
+    quarter_turns = np.where(north, square - triangle, triangle - square) % 4
+    dx = x - (-3 * np.pi / 4 + square * np.pi / 2)
+    dy = y - np.where(north, np.pi / 2, -np.pi / 2)
+    rx = np.choose(quarter_turns, [dx, -dy, -dx, dy])
+    ry = np.choose(quarter_turns, [dy, dx, -dy, -dx])
+    polar_x = rx + (-3 * np.pi / 4 + triangle * np.pi / 2)
+    polar_y = ry + np.sign(y) * np.pi / 2
+    polar = north | south
+    return np.where(polar, polar_x, x), np.where(polar, polar_y, y)
+
+
+def _healpix_sphere_inverse(x, y):
+    # rhealpixdggs.pj_healpix.healpix_sphere_inverse()
+    equatorial = np.abs(y) <= np.pi / 4
+    pole = np.abs(y) >= np.pi / 2
+    cap_number = np.minimum(np.floor(2 * x / np.pi + 2), 3)
+    xc = -3 * np.pi / 4 + (np.pi / 2) * cap_number
+    tau = 2 - 4 * np.abs(y) / np.pi
+    with np.errstate(divide="ignore", invalid="ignore"):
+        polar_lam = np.clip(xc + (x - xc) / tau, -np.pi, np.pi)
+        polar_phi = np.sign(y) * np.arcsin(1 - tau ** 2 / 3)
+        equatorial_phi = np.arcsin(np.clip(8 * y / (3 * np.pi), -1, 1))
+    lam = np.where(equatorial, x, np.where(pole, -np.pi, polar_lam))
+    phi = np.where(equatorial, equatorial_phi, np.where(pole, np.sign(y) * np.pi / 2, polar_phi))
+    return lam, phi
+
+
+def _auth_lat_inverse(beta, e):
+    # rhealpixdggs.utils.auth_lat(beta, e, radians=True, inverse=True)
+    return (
+        beta
+        + (e ** 2 / 3.0 + 31 * e ** 4 / 180.0 + 517 * e ** 6 / 5040.0) * np.sin(2 * beta)
+        + (23 * e ** 4 / 360.0 + 251 * e ** 6 / 3780.0) * np.sin(4 * beta)
+        + (761 * e ** 6 / 45360.0) * np.sin(6 * beta)
+    )
+
+
+def lonlat_from_xy(x, y):
+    """The inverse of rhealpix_xy(): the longitudes and latitudes, in degrees, of arrays of projected x and y in
+    metres, as TB16Pix.rhealpix(x, y, inverse=True) gives them"""
+    x = np.asarray(x, dtype=np.float64) / _R_A
+    y = np.asarray(y, dtype=np.float64) / _R_A
+    x, y = _combine_triangles_inverse(x, y, TB16PIX_PLANE.north_square, TB16PIX_PLANE.south_square)
+    lam, beta = _healpix_sphere_inverse(x, y)
+    lam = np.rad2deg(lam)
+    phi = np.rad2deg(_auth_lat_inverse(beta, _ELLIPSOID.e))
+    lon = np.rad2deg(_wrap_longitude(np.deg2rad(lam + _ELLIPSOID.lon_0)))
+    lat = np.rad2deg(_wrap_latitude(np.deg2rad(phi + _ELLIPSOID.lat_0)))
+    return lon, lat
+
+
+def _base_cells(x, y):
+    # the index in "NOPQRS" of the base Cell of each projected point, or -1 if it's off the grid, as decided in
+    # RHEALPixDGGS.cell_from_point()
+    R = _R_A
+    pi = np.pi
+    ns = TB16PIX_PLANE.north_square
+    ss = TB16PIX_PLANE.south_square
+    equatorial = (y >= -R * pi / 4) & (y <= R * pi / 4)
+    return np.select(
+        [
+            (y > R * pi / 4) & (y < R * 3 * pi / 4) & (x > R * (-pi + ns * (pi / 2))) &
+            (x < R * (-pi / 2 + ns * (pi / 2))),
+            (y > -R * 3 * pi / 4) & (y < -R * pi / 4) & (x > R * (-pi + ss * (pi / 2))) &
+            (x < R * (-pi / 2 + ss * (pi / 2))),
+            equatorial & (x >= -R * pi) & (x < -R * pi / 2),
+            equatorial & (x >= -R * pi / 2) & (x < 0),
+            equatorial & (x >= 0) & (x < R * pi / 2),
+            equatorial & (x >= R * pi / 2) & (x < R * pi),
+        ],
+        [0, 5, 1, 2, 3, 4],
+        -1,
+    )
+
+
+def cell_indices_from_points(lon, lat, resolution):
+    """The indices, in the Grid at the given resolution (as in grid.cells.cell_id_from_index()), of the Cells
+    containing each lon/lat point, in degrees. Points that aren't on the grid, such as NaNs, get -1"""
+    if not 0 <= resolution <= MAX_RESOLUTION:
+        raise ValueError("The resolution must be between 0 and {}".format(MAX_RESOLUTION))
+    x, y = rhealpix_xy(lon, lat)
+    x, y = np.atleast_1d(x), np.atleast_1d(y)
+    bases = _base_cells(x, y)
+    on_grid = bases >= 0
+    if resolution == 0:
+        return np.where(on_grid, bases, -1)
+
+    # the distances of each point from its base Cell's upper left vertex, as fractions of the base Cell's width
+    w = TB16PIX_PLANE.cell_width(0)
+    ul = _UL[np.where(on_grid, bases, 0)]
+    smidgen = 0.5 * TB16PIX_PLANE.cell_width(TB16PIX_PLANE.max_resolution) / w
+    dx = np.abs(x - ul[:, 0]) / w
+    dy = np.abs(y - ul[:, 1]) / w
+    dx = np.where(dx == 1, dx - smidgen, dx)
+    dy = np.where(dy == 1, dy - smidgen, dy)
+
+    # the row and column of the Cell in its base Cell, whose base 3 digits interleave into its suid digits
+    n = TB16PIX_PLANE.N_side
+    rows = np.where(on_grid, dy * n ** resolution, 0).astype(np.int64)
+    cols = np.where(on_grid, dx * n ** resolution, 0).astype(np.int64)
+    index = np.where(on_grid, bases, 0).astype(np.int64)
+    for i in range(resolution - 1, -1, -1):
+        place = n ** i
+        index = index * 9 + (rows // place % n) * n + cols // place % n
+    return np.where(on_grid, index, -1)
+
+
+def cell_ids_from_points(lon, lat, resolution):
+    """The IDs of the Cells at the given resolution containing each lon/lat point, in degrees, as an array of
+    str. Points that aren't on the grid get ''"""
+    index = cell_indices_from_points(lon, lat, resolution)
+    on_grid = index >= 0
+    index = np.where(on_grid, index, 0)
+    chars = np.empty((len(index), resolution + 1), dtype=np.uint8)
+    for i in range(resolution, 0, -1):
+        index, digit = np.divmod(index, 9)
+        chars[:, i] = digit + ord("0")
+    chars[:, 0] = _BASE_CODES[index]
+    ids = chars.view("S{}".format(resolution + 1)).ravel().astype("<U{}".format(resolution + 1))
+    ids[~on_grid] = ""
+    return ids
+
+
+def cell_id_from_point(lon, lat, resolution):
+    """The ID of the Cell at the given resolution containing the point lon, lat, in degrees, or None"""
+    cell_id = str(cell_ids_from_points([lon], [lat], resolution)[0])
+    return cell_id or None
+
+
+def packed_ids_from_points(lon, lat, resolution):
+    """The packed IDs (see grid.zoneid) of the Cells at the given resolution containing each lon/lat point, in
+    degrees. Points that aren't on the grid get -1"""
+    index = cell_indices_from_points(lon, lat, resolution)
+    return np.where(index >= 0, pack_grid_index(np.maximum(index, 0), resolution), -1)
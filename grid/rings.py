@@ -0,0 +1,117 @@
+import numpy as np
+from .cells import index_from_cell_id
+from .neighbours import DIRECTIONS, _ARRAY_BASE_NEIGHBOURS, _ARRAY_ROTATIONS
+from .zoneid import pack_grid_index, unpack_array
+
+__all__ = [
+    "iter_rings",
+    "k_rings",
+]
+
+# k-rings: the Zones at each number of steps, 0 - k, across the edges between Zones from a Zone, or from the
+# nearest of a set of Zones, found by a breadth-first expansion over the neighbour relation that
+# calculate_neighbours() gives, including its steps between the polar and equatorial base Cells.
+#
+# Each ring is expanded from the last one a whole ring at a time, as arrays of the Zones' (base Cell, row, column)
+# in their base Cells, in which the steps between Zones in the same base Cell are a row or column up or down; the
+# few that cross into another base Cell are turned as grid.neighbours' tables turn them. As every Zone is a
+# neighbour of its neighbours, the neighbours of the ring at distance d are all in the rings at d - 1, d and d + 1,
+# so those two rings are the only visited set needed: memory use grows with the size of a ring, not of the disk.
+
+# the (row, column) step in each of DIRECTIONS
+_STEPS = {"down": (1, 0), "left": (0, -1), "right": (0, 1), "up": (-1, 0)}
+
+
+def _keys(index, resolution):
+    # Grid indices -> base * side ** 2 + row * side + column, with side = 3 ** resolution
+    base, rest = np.divmod(np.asarray(index, dtype=np.int64), 9 ** resolution)
+    row = np.zeros_like(rest)
+    col = np.zeros_like(rest)
+    for i in range(resolution - 1, -1, -1):
+        digit = rest // 9 ** i % 9
+        row, col = row * 3 + digit // 3, col * 3 + digit % 3
+    return (base * 3 ** resolution + row) * 3 ** resolution + col
+
+
+def _grid_index(keys, resolution):
+    # the inverse of _keys()
+    side = 3 ** resolution
+    base, rest = np.divmod(keys, side * side)
+    row, col = np.divmod(rest, side)
+    index = base
+    for i in range(resolution - 1, -1, -1):
+        index = index * 9 + row // 3 ** i % 3 * 3 + col // 3 ** i % 3
+    return index
+
+
+def _neighbour_keys(keys, resolution):
+    # the keys of the neighbours of Zones, in any order, with repeats
+    side = 3 ** resolution
+    base, rest = np.divmod(keys, side * side)
+    row, col = np.divmod(rest, side)
+    result = []
+    for direction in DIRECTIONS:
+        row_step, col_step = _STEPS[direction]
+        to_row, to_col = row + row_step, col + col_step
+        inside = (to_row >= 0) & (to_row < side) & (to_col >= 0) & (to_col < side)
+        result.append((base * side + to_row)[inside] * side + to_col[inside])
+        if not inside.all():
+            # into the next base Cell, at the opposite edge, turned as grid.neighbours turns its digits
+            crossing = ~inside
+            from_base = base[crossing]
+            to_base = _ARRAY_BASE_NEIGHBOURS[direction][from_base]
+            to_row, to_col = to_row[crossing] % side, to_col[crossing] % side
+            quarter_turns = _ARRAY_ROTATIONS[from_base, to_base]
+            for _ in range(3):
+                turning = quarter_turns > 0
+                to_row, to_col = np.where(turning, to_col, to_row), np.where(turning, side - 1 - to_row, to_col)
+                quarter_turns = quarter_turns - 1
+            result.append((to_base * side + to_row) * side + to_col)
+    return np.concatenate(result)
+
+
+def _without(a, b):
+    # the elements of sorted array a that aren't in sorted array b
+    if not len(b):
+        return a
+    at = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[at] != a]
+
+
+def _iter_ring_keys(zone_ids, k):
+    # the rings of iter_rings(), as sorted arrays of keys, and the resolution
+    resolution = len(zone_ids[0]) - 1
+    if any(len(zone_id) - 1 != resolution for zone_id in zone_ids):
+        raise ValueError("The Zones must all be of the same resolution")
+    ring = np.unique(_keys([index_from_cell_id(zone_id) for zone_id in zone_ids], resolution))
+    previous = ring[:0]
+    for _ in range(k + 1):
+        yield ring
+        candidates = np.unique(_neighbour_keys(ring, resolution))
+        previous, ring = ring, _without(_without(candidates, ring), previous)
+        if not len(ring):
+            return
+
+
+def iter_rings(zone_ids, k):
+    """Yields the rings around one or more Zones of the same resolution as sorted arrays of Grid indices: first
+    the Zones themselves, then the Zones one step from the nearest of them, and so on up to k steps, stopping
+    early if the whole Grid is reached. Raises ValueError if the Zones are not all of the same resolution"""
+    if zone_ids:
+        resolution = len(zone_ids[0]) - 1
+        for ring in _iter_ring_keys(zone_ids, k):
+            yield np.sort(_grid_index(ring, resolution))
+
+
+def k_rings(zone_ids, k):
+    """The IDs of the Zones in each ring around one or more Zones of the same resolution, as iter_rings() gives
+    them, as a list of lists; the k-disk is their union"""
+    if not zone_ids:
+        return []
+    resolution = len(zone_ids[0]) - 1
+    rings = list(_iter_ring_keys(zone_ids, k))
+    # the Zone IDs of all the rings are made together
+    index = _grid_index(np.concatenate(rings), resolution)
+    bounds = np.cumsum([len(ring) for ring in rings])[:-1]
+    ids = unpack_array(pack_grid_index(index, resolution))
+    return [np.sort(ring_ids).tolist() for ring_ids in np.split(ids, bounds)]
@@ -0,0 +1,39 @@
+from math import ceil, log, pi
+from config import WGS84_TB16, TB16PIX_OPTIONS
+
+__all__ = [
+    "TB16PIX_PLANE",
+]
+
+
+class PlanarTB16Pix:
+    """The parameters of TB16Pix's planar grid that the vectorised computations in this package use: the values of
+    the same attributes of rhealpixdggs' RHEALPixDGGS, made without importing rhealpixdggs.dggs, which imports
+    SciPy and takes most of the app's start-up time"""
+    cells0 = ["N", "O", "P", "Q", "R", "S"]
+
+    def __init__(self, ellipsoid, N_side=3, north_square=0, south_square=0, max_areal_resolution=1):
+        self.ellipsoid = ellipsoid
+        self.N_side = N_side
+        self.north_square = north_square % 4
+        self.south_square = south_square % 4
+        self.max_resolution = int(
+            ceil(log(ellipsoid.R_A ** 2 * (2 * pi / 3) / max_areal_resolution) / (2 * log(N_side)))
+        )
+        ul_vertex = {  # for radius 1
+            "N": (-pi + self.north_square * pi / 2, 3 * pi / 4),
+            "O": (-pi, pi / 4),
+            "P": (-pi / 2, pi / 4),
+            "Q": (0, pi / 4),
+            "R": (pi / 2, pi / 4),
+            "S": (-pi + self.south_square * pi / 2, -pi / 4),
+        }
+        self.ul_vertex = {k: (ellipsoid.R_A * x, ellipsoid.R_A * y) for k, (x, y) in ul_vertex.items()}
+
+    def cell_width(self, resolution):
+        """The width of a planar Cell at a resolution"""
+        return self.ellipsoid.R_A * (pi / 2) * self.N_side ** (-resolution)
+
+
+TB16PIX_PLANE = PlanarTB16Pix(WGS84_TB16, **TB16PIX_OPTIONS)
+
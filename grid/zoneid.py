@@ -0,0 +1,144 @@
+import numpy as np
+
+__all__ = [
+    "MAX_RESOLUTION",
+    "pack",
+    "unpack",
+    "pack_array",
+    "unpack_array",
+    "resolution_of",
+    "parent_of",
+    "ancestor_of",
+    "children_of",
+    "grid_index_of",
+    "pack_grid_index",
+]
+
+# Packed Zone IDs are 64-bit integers holding a Zone's base Cell and digits as one left-aligned base-9 number,
+# shifted up 4 bits to hold its resolution:
+#
+#   packed = (base * 9**15 + d1 * 9**14 + ... + dr * 9**(15 - r)) << 4 | r
+#
+# for Zone <base><d1>...<dr>, with base 0 - 5 for N - S. The largest value is under 2**55, so packed IDs are
+# stored as np.int64. Sorting packed IDs puts Zones in the same order as sorting their string IDs: Grid order
+# within a resolution and each Zone directly before its descendants. A Zone's index in TB16Pix.grid(r) is its
+# base-9 number divided by 9**(15 - r).
+
+MAX_RESOLUTION = 15
+_BASES = "NOPQRS"
+_RESOLUTION_BITS = 4
+_RESOLUTION_MASK = (1 << _RESOLUTION_BITS) - 1
+_PLACES = np.array([9 ** (MAX_RESOLUTION - i) for i in range(MAX_RESOLUTION + 1)], dtype=np.int64)
+
+_BASE_INDEX = np.full(128, -1, dtype=np.int64)
+_BASE_INDEX[np.frombuffer(_BASES.encode(), dtype=np.uint8)] = np.arange(len(_BASES))
+_BASE_CODES = np.frombuffer(_BASES.encode(), dtype=np.uint8)
+
+
+def pack(zone_id):
+    """'R0837' -> its packed 64-bit integer form"""
+    if not 1 <= len(zone_id) <= MAX_RESOLUTION + 1 or zone_id[0] not in _BASES:
+        raise ValueError("'{}' is not a TB16Pix Zone ID".format(zone_id))
+    number = _BASES.index(zone_id[0])
+    for d in zone_id[1:]:
+        if d not in "012345678":
+            raise ValueError("'{}' is not a TB16Pix Zone ID".format(zone_id))
+        number = number * 9 + int(d)
+    resolution = len(zone_id) - 1
+    number *= 9 ** (MAX_RESOLUTION - resolution)
+    return number << _RESOLUTION_BITS | resolution
+
+
+def unpack(packed):
+    """The inverse of pack()"""
+    packed = int(packed)
+    resolution = packed & _RESOLUTION_MASK
+    number = (packed >> _RESOLUTION_BITS) // 9 ** (MAX_RESOLUTION - resolution)
+    digits = []
+    for _ in range(resolution):
+        number, d = divmod(number, 9)
+        digits.append(str(d))
+    return _BASES[number] + "".join(reversed(digits))
+
+
+def pack_array(zone_ids):
+    """Packs a sequence or array of Zone IDs, of any mix of resolutions, into an np.int64 array"""
+    ids = np.asarray(zone_ids, dtype=str).ravel()
+    lengths = np.char.str_len(ids)
+    if len(ids) and (lengths.min() < 1 or lengths.max() > MAX_RESOLUTION + 1):
+        raise ValueError("Zone IDs must have 1 - {} characters".format(MAX_RESOLUTION + 1))
+    packed = np.empty(len(ids), dtype=np.int64)
+    for length in np.unique(lengths):
+        rows = np.nonzero(lengths == length)[0]
+        chars = np.frombuffer(ids[rows].astype("S{}".format(length)).tobytes(), dtype=np.uint8)
+        chars = chars.reshape(len(rows), length).astype(np.int64)
+        bases = _BASE_INDEX[chars[:, 0]]
+        digits = chars[:, 1:] - ord("0")
+        if (bases < 0).any() or ((digits < 0) | (digits > 8)).any():
+            raise ValueError("Not all of the values are TB16Pix Zone IDs")
+        resolution = length - 1
+        number = bases * _PLACES[0] + digits @ _PLACES[1:length]
+        packed[rows] = number << _RESOLUTION_BITS | resolution
+    return packed
+
+
+def unpack_array(packed):
+    """The inverse of pack_array(): an array of Zone ID strings"""
+    packed = np.asarray(packed, dtype=np.int64).ravel()
+    resolutions = packed & _RESOLUTION_MASK
+    numbers = packed >> _RESOLUTION_BITS
+    result = np.empty(len(packed), dtype="<U{}".format(MAX_RESOLUTION + 1))
+    for resolution in np.unique(resolutions):
+        rows = np.nonzero(resolutions == resolution)[0]
+        chars = np.empty((len(rows), resolution + 1), dtype=np.uint8)
+        chars[:, 0] = _BASE_CODES[numbers[rows] // _PLACES[0]]
+        for i in range(1, resolution + 1):
+            chars[:, i] = numbers[rows] // _PLACES[i] % 9 + ord("0")
+        result[rows] = chars.view("S{}".format(resolution + 1)).ravel().astype(result.dtype)
+    return result
+
+
+def resolution_of(packed):
+    """The resolution of packed Zone IDs; works on ints or arrays"""
+    return np.asarray(packed, dtype=np.int64) & _RESOLUTION_MASK
+
+
+def grid_index_of(packed):
+    """The index of packed Zone IDs in the Grids of their resolutions, as in grid.cells.cell_id_from_index()"""
+    packed = np.asarray(packed, dtype=np.int64)
+    return (packed >> _RESOLUTION_BITS) // _PLACES[packed & _RESOLUTION_MASK]
+
+
+def pack_grid_index(index, resolution):
+    """Packed Zone IDs from their indices in the Grid at a resolution; the inverse of grid_index_of()"""
+    index = np.asarray(index, dtype=np.int64)
+    return (index * _PLACES[resolution]) << _RESOLUTION_BITS | resolution
+
+
+def ancestor_of(packed, resolution):
+    """The ancestors, at a coarser resolution, of packed Zone IDs. Raises ValueError if any are coarser already"""
+    packed = np.asarray(packed, dtype=np.int64)
+    if (packed & _RESOLUTION_MASK < resolution).any():
+        raise ValueError("Zones can't have ancestors at a finer resolution than their own")
+    number = (packed >> _RESOLUTION_BITS) // _PLACES[resolution] * _PLACES[resolution]
+    return number << _RESOLUTION_BITS | resolution
+
+
+def parent_of(packed):
+    """The parents of packed Zone IDs. Raises ValueError for base Cells, whose parent is Earth"""
+    packed = np.asarray(packed, dtype=np.int64)
+    resolutions = packed & _RESOLUTION_MASK
+    if (resolutions == 0).any():
+        raise ValueError("The parent of a resolution 0 Zone is Earth, which has no packed ID")
+    number = (packed >> _RESOLUTION_BITS) // _PLACES[resolutions - 1] * _PLACES[resolutions - 1]
+    return number << _RESOLUTION_BITS | (resolutions - 1)
+
+
+def children_of(packed):
+    """The 9 children of packed Zone IDs, with shape packed.shape + (9,), in Grid order"""
+    packed = np.asarray(packed, dtype=np.int64)
+    resolutions = packed & _RESOLUTION_MASK
+    if (resolutions >= MAX_RESOLUTION).any():
+        raise ValueError("Zones at resolution {} have no children".format(MAX_RESOLUTION))
+    number = (packed >> _RESOLUTION_BITS)[..., None] + np.arange(9) * _PLACES[resolutions + 1][..., None]
+    return number << _RESOLUTION_BITS | (resolutions + 1)[..., None]
@@ -0,0 +1,137 @@
+import argparse
+import glob
+import gzip
+import logging
+import os
+import time
+from collections import namedtuple
+from multiprocessing import Pool
+from config import *
+from grid import MAX_RESOLUTION, NUM_CHILDREN, cell_id_from_index, geometry_table, num_cells
+from model.rdf import earth_triples, grid_triples, iter_ntriples
+
+# Writes the DGGS profile RDF of Earth and of every Zone and Cell at resolutions 0 - k to N-Triples files, the
+# same triples the API delivers for each of them, e.g. for loading into a triplestore:
+#
+#   python materialise.py dump/ --resolution 6 --gzip --workers 8
+#
+# Each Grid is split into chunks, the subtrees of the Zones chunk_depth levels up, which are written by a pool of
+# worker processes in batches of batch_size Zones, so memory use doesn't grow with the size of the Grid. The files
+# are laid out deterministically as <output>/<resolution>/<chunk Zone ID>.nt[.gz], e.g. dump/7/R08.nt.gz for the
+# Zones and Cells in R08 at resolution 7, and have the same content however many workers write them. A chunk is
+# written to a temporary file that is renamed when it is complete, so a run that is stopped can be resumed by
+# running it again: chunks whose files exist are skipped.
+
+_Earth = namedtuple("_Earth", ["uri"])
+
+
+def _open(path, compress):
+    # gzip files get no name or time in their headers, so the same content always makes the same bytes
+    raw = open(path, "wb")
+    return gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0, compresslevel=6) if compress else raw, raw
+
+
+def write_chunk(task):
+    """Writes the N-Triples of one chunk of a Grid to its file, via a temporary file. Returns the file's path and
+    the numbers of Zones and triples in it"""
+    path, resolution, start, stop, compress, batch_size = task
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    triples = 0
+    out, raw = _open(temp, compress)
+    try:
+        for begin in range(start, stop, batch_size):
+            lines = list(iter_ntriples(grid_triples(resolution, begin, min(begin + batch_size, stop))))
+            triples += len(lines)
+            out.write("".join(lines).encode("utf-8"))
+    finally:
+        out.close()
+        raw.close()
+    os.replace(temp, path)
+    return path, stop - start, triples
+
+
+def chunk_tasks(output, resolution, chunk_depth, compress, batch_size):
+    """The (path, resolution, start, stop, compress, batch_size) chunks of the Grid at a resolution, in order"""
+    chunk_resolution = max(0, resolution - chunk_depth)
+    size = NUM_CHILDREN ** (resolution - chunk_resolution)
+    suffix = ".nt.gz" if compress else ".nt"
+    for n in range(num_cells(chunk_resolution)):
+        path = os.path.join(output, str(resolution), cell_id_from_index(n, chunk_resolution) + suffix)
+        yield path, resolution, n * size, (n + 1) * size, compress, batch_size
+
+
+def _worker_init():
+    # each worker maps the geometry table for itself; it was built, if need be, before the pool was started
+    geometry_table()
+
+
+def materialise(output, resolution, workers=None, compress=False, chunk_depth=5, batch_size=BULK_BATCH_SIZE):
+    """Writes Earth and the Grids at resolutions 0 - resolution under output, skipping chunks that are already
+    written. Returns the numbers of chunks written and skipped"""
+    suffix = ".nt.gz" if compress else ".nt"
+    for r in range(resolution + 1):
+        os.makedirs(os.path.join(output, str(r)), exist_ok=True)
+        for temp in glob.glob(os.path.join(output, str(r), "*.tmp")):
+            os.remove(temp)  # left by an interrupted run
+
+    written = skipped = 0
+    earth = os.path.join(output, "earth" + suffix)
+    if not os.path.exists(earth):
+        out, raw = _open(earth + ".tmp", compress)
+        out.write("".join(iter_ntriples(earth_triples(_Earth(URI_BASE_ZONE["Earth"])))).encode("utf-8"))
+        out.close()
+        raw.close()
+        os.replace(earth + ".tmp", earth)
+
+    tasks = []
+    for r in range(resolution + 1):
+        for task in chunk_tasks(output, r, chunk_depth, compress, batch_size):
+            if os.path.exists(task[0]):
+                skipped += 1
+            else:
+                tasks.append(task)
+
+    geometry_table()
+    started = time.time()
+    zones = triples = 0
+    with Pool(workers, initializer=_worker_init) as pool:
+        for path, n_zones, n_triples in pool.imap_unordered(write_chunk, tasks):
+            written += 1
+            zones += n_zones
+            triples += n_triples
+            logging.info("{} ({} Zones, {} triples) {}/{}, {:.0f} Zones/s".format(
+                path, n_zones, n_triples, written, len(tasks), zones / max(time.time() - started, 1e-9)
+            ))
+    logging.info("Wrote {} chunks ({} Zones, {} triples), skipped {} already written".format(
+        written, zones, triples, skipped
+    ))
+    return written, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Writes the RDF of Earth and every TB16Pix Zone and Cell at resolutions 0 - k to N-Triples files"
+    )
+    parser.add_argument("output", help="the directory to write to; an interrupted run there is resumed")
+    parser.add_argument("-r", "--resolution", type=int, required=True, help="the finest resolution, k")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes, default: one per CPU")
+    parser.add_argument("-z", "--gzip", action="store_true", help="gzip the files")
+    parser.add_argument(
+        "--chunk-depth", type=int, default=5,
+        help="each file holds the subtree of a Zone this many levels up, up to 9^depth Zones (default 5)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BULK_BATCH_SIZE, help="Zones computed together by a worker"
+    )
+    args = parser.parse_args()
+    if not 0 <= args.resolution <= MAX_RESOLUTION:
+        parser.error("resolution must be 0 - {}".format(MAX_RESOLUTION))
+    if args.chunk_depth < 0 or args.batch_size < 1:
+        parser.error("chunk depth must be 0 or more and batch size 1 or more")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        datefmt="%Y-%m-%d %H:%M:%S",
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+    materialise(args.output, args.resolution, args.workers, args.gzip, args.chunk_depth, args.batch_size)
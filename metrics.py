@@ -0,0 +1,182 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from config import METRICS
+
+# Request instrumentation: the time each request spends in each phase of its handling, e.g. content negotiation,
+# building the model, making its triples, serializing them and rendering templates, is sent back in a
+# Server-Timing header and, with the request's total time, kept in Prometheus histograms for /metrics.
+#
+# Phases are timed with phase() blocks and timed() functions, and summed per request. With METRICS off, timed()
+# returns functions as they are, phase() does nothing and no request hooks or /metrics route are added.
+
+# seconds, finer than Prometheus' defaults as most requests take a few milliseconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_phases = ContextVar("phases", default=None)  # the current request's {phase: seconds}, if it is being timed
+_started = ContextVar("started", default=None)
+_template_started = ContextVar("template_started", default=None)
+
+
+class Histograms:
+    """Prometheus histograms of a metric, one per set of label values"""
+    def __init__(self, name, help, labels, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, values, seconds):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def lines(self):
+        yield "# HELP {} {}".format(self.name, self.help)
+        yield "# TYPE {} histogram".format(self.name)
+        with self._lock:
+            series = {values: list(counts) for values, counts in self._series.items()}
+        for values, counts in sorted(series.items()):
+            labels = ",".join('{}="{}"'.format(k, _escape(v)) for k, v in zip(self.labels, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield '{}_bucket{{{}{}le="{}"}} {}'.format(
+                    self.name, labels, "," if labels else "", "+Inf" if bound == float("inf") else bound, cumulative
+                )
+            yield "{}_count{{{}}} {}".format(self.name, labels, cumulative)
+            yield "{}_sum{{{}}} {}".format(self.name, labels, round(counts[-1], 9))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histograms(
+    "dggs_request_duration_seconds",
+    "Time to make each response, until it is returned to the server, by route and mediatype",
+    ("route", "mediatype", "status"),
+)
+PHASE_SECONDS = Histograms(
+    "dggs_request_phase_duration_seconds", "Time spent in each phase of handling a request, per request", ("phase",)
+)
+
+
+class _Phase:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def record(name, seconds):
+    """Adds seconds to a phase of the current request, if it's being timed"""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+def phase(name):
+    """A context manager that adds the time spent in it to a phase of the current request"""
+    return _Phase(name) if METRICS else _NO_PHASE
+
+
+def timed(name):
+    """A decorator that adds the time spent in a function to a phase of the current request"""
+    def decorator(function):
+        if not METRICS:
+            return function
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def start_request():
+    """Starts timing a request and its phases"""
+    _phases.set({})
+    _started.set(time.perf_counter())
+
+
+def end_request(route, mediatype, status):
+    """Records a request's total time and phases and returns its Server-Timing header"""
+    seconds = time.perf_counter() - _started.get()
+    phases = _phases.get() or {}
+    _phases.set(None)
+    REQUEST_SECONDS.observe((route, mediatype, str(status)), seconds)
+    for name, phase_seconds in phases.items():
+        PHASE_SECONDS.observe((name,), phase_seconds)
+    timings = ["{};dur={:.3f}".format(name, phase_seconds * 1000) for name, phase_seconds in phases.items()]
+    timings.append("total;dur={:.3f}".format(seconds * 1000))
+    return ", ".join(timings)
+
+
+def instrument_templates(app):
+    """Times the rendering of an app's templates as the "template" phase, with Flask's signals, if blinker is
+    installed"""
+    from flask import signals
+
+    if not signals.signals_available:
+        return
+
+    def started(sender, template, context, **extra):
+        _template_started.set(time.perf_counter())
+
+    def rendered(sender, template, context, **extra):
+        if _template_started.get() is not None:
+            record("template", time.perf_counter() - _template_started.get())
+            _template_started.set(None)
+
+    signals.before_render_template.connect(started, app, weak=False)
+    signals.template_rendered.connect(rendered, app, weak=False)
+
+
+def exposition(caches=(), gauges=()):
+    """The Prometheus text exposition of the request histograms and of the given caches' (name, hits, misses) and
+    (name, help, value) gauges"""
+    lines = list(REQUEST_SECONDS.lines()) + list(PHASE_SECONDS.lines())
+    caches = list(caches)
+    for metric, help, index in (
+        ("dggs_cache_hits_total", "Cache hits", 1),
+        ("dggs_cache_misses_total", "Cache misses", 2),
+    ):
+        lines += ["# HELP {} {}".format(metric, help), "# TYPE {} counter".format(metric)]
+        lines += ['{}{{cache="{}"}} {}'.format(metric, cache[0], cache[index]) for cache in caches]
+    lines += ["# HELP dggs_cache_hit_ratio Cache hits / lookups", "# TYPE dggs_cache_hit_ratio gauge"]
+    lines += [
+        'dggs_cache_hit_ratio{{cache="{}"}} {}'.format(name, round(hits / (hits + misses), 6) if hits + misses else 0)
+        for name, hits, misses in caches
+    ]
+    for name, help, value in gauges:
+        lines += ["# HELP {} {}".format(name, help), "# TYPE {} gauge".format(name), "{} {}".format(name, value)]
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,5 @@
+from .renderers import *
 from .zone import *
 from .earth import *
 from .cell import *
-from .dataset import *
\ No newline at end of file
+from .dataset import *
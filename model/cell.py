@@ -1,11 +1,15 @@
-from flask import Response, render_template
-from rdflib import Graph, URIRef, Literal
-from rdflib.namespace import DCTERMS, RDF, RDFS
+from flask import Response, render_template, jsonify
 from .profiles import *
+from .renderers import ProfileRenderer
+from .rdf import cell_triples, rdf_response
 from config import *
+from metrics import timed
+from grid.attributes import cell_attributes
+from grid.geometry import cell_geojson, geojson_wkt
 
 
 class Cell:
+    @timed("model")
     def __init__(
         self,
         cell_id
@@ -15,13 +19,27 @@ class Cell:
         self.isPartOf = URI_BASE_GRID[str(len(cell_id) - 1)], "Grid {}".format(str(len(cell_id) - 1))
         self.asDGGS = "<https://w3id.org/dggs/tb16pix> {}".format(cell_id)
         self.isGeometryOf = URI_BASE_ZONE[cell_id], "Zone {}".format(cell_id)
+        self.geometry = cell_geojson(cell_id)
+        self.wkt = geojson_wkt(self.geometry)
+        attributes = cell_attributes(cell_id)
+        self.centroid = attributes["centroid"]
+        self.area = attributes["area"]
+        self.bbox = attributes["bbox"]
 
 
-class CellRenderer(Renderer):
+class CellRenderer(ProfileRenderer):
+    @timed("conneg")
     def __init__(self, request, cell_id):
-        self.zone = Cell(cell_id)
-        self.profiles = {"dggs": profile_dggs}
-        super().__init__(request, self.zone.uri, self.profiles, "dggs")
+        self.cell_id = cell_id
+        self._zone = None
+        super().__init__(request, URI_BASE_CELL[cell_id], DGGS_PROFILES, "dggs")
+
+    @property
+    def zone(self):
+        # the Cell is only made when it is rendered, so conditional requests can be answered without it
+        if self._zone is None:
+            self._zone = Cell(self.cell_id)
+        return self._zone
 
     def render(self):
         # try returning alt profile
@@ -31,35 +49,31 @@ class CellRenderer(Renderer):
         elif self.profile == "dggs":
             if self.mediatype in Renderer.RDF_SERIALIZER_TYPES_MAP:
                 return self._render_dggs_rdf()
+            elif self.mediatype == "application/geo+json":
+                return self._render_dggs_geojson()
             else:
                 return self._render_dggs_html()
 
     def _render_dggs_rdf(self):
-        item_graph = Graph()
-        item_graph.bind("dggs", DGGS)
-        GEO = Namespace("http://www.opengis.net/ont/geosparql#")
-        item_graph.bind("geo", GEO)
-        GEOX = Namespace("https://linked.data.gov.au/def/geox#")
-        item_graph.bind("geox", GEOX)
-        item_uri = URIRef(self.zone.uri)
-        item_id = self.zone.uri.split("/")[-1]
-        item_graph.add((item_uri, RDF.type, DGGS.Cell))
-        item_graph.add((item_uri, RDFS.label, Literal("Cell {}".format(item_id))))
-        item_graph.add((
-            item_uri,
-            GEOX.asDGGS,
-            Literal("<https://w3id.org/dggs/tb16pix> {}".format(item_id), datatype=GEOX.dggsLiteral)
-        ))
-
-        item_graph.add((item_uri, DCTERMS.isPartOf, URIRef(self.zone.isPartOf[0])))
-
-        item_graph.add((item_uri, GEOX.isGeometryOf, URIRef(self.zone.isGeometryOf[0])))
+        return rdf_response(cell_triples(self.zone), self.mediatype)
 
-        # serialise in the appropriate RDF format
-        if self.mediatype in ["application/rdf+json", "application/json"]:
-            return Response(item_graph.serialize(format="json-ld"), mimetype=self.mediatype)
-        else:
-            return Response(item_graph.serialize(format=self.mediatype), mimetype=self.mediatype)
+    def _render_dggs_geojson(self):
+        response = jsonify({
+            "type": "Feature",
+            "id": self.cell_id,
+            "bbox": self.zone.bbox,
+            "geometry": self.zone.geometry,
+            "properties": {
+                "label": self.zone.label,
+                "uri": str(self.zone.uri),
+                "centroid": self.zone.centroid,
+                "area": self.zone.area,
+                "isGeometryOf": str(self.zone.isGeometryOf[0]),
+            },
+        })
+        response.mimetype = self.mediatype
+        response.headers.extend(self.headers)
+        return response
 
     def _render_dggs_html(self):
         _template_context = {
@@ -67,7 +81,11 @@ class CellRenderer(Renderer):
             "label": self.zone.label,
             "isPartOf": self.zone.isPartOf,
             "asDGGS": self.zone.asDGGS,
-            "isGeometryOf": self.zone.isGeometryOf
+            "isGeometryOf": self.zone.isGeometryOf,
+            "wkt": self.zone.wkt,
+            "centroid": self.zone.centroid,
+            "area": self.zone.area,
+            "bbox": self.zone.bbox,
         }
 
         return Response(
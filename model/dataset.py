@@ -1,12 +1,14 @@
 from flask import Response, render_template
-from rdflib import Graph, URIRef, Literal, RDF, RDFS, BNode
 from .profiles import *
+from .renderers import ProfileRenderer
+from .rdf import dataset_triples, rdf_response
 from config import *
-from utils import calculate_neighbours, get_collections
-import markdown
+from metrics import timed
+from utils import get_collections, markdown_html
 
 
 class Dataset:
+    @timed("model")
     def __init__(
         self,
     ):
@@ -22,15 +24,18 @@ This API and the data within it have been created for the OGC's Testbed 16 which
         ]
 
 
-class DatasetRenderer(Renderer):
+class DatasetRenderer(ProfileRenderer):
+    @timed("conneg")
     def __init__(self, request):
-        self.dataset = Dataset()
-        self.profiles = {
-            "dcat": profile_dcat,
-            "dggs": profile_dggs,
-        }
+        self._dataset = None
+        super().__init__(request, "https://w3id.org/dggs/tb16pix", DATASET_PROFILES, "dcat")
 
-        super().__init__(request, self.dataset.uri, self.profiles, "dcat")
+    @property
+    def dataset(self):
+        # the Dataset is only made when it is rendered, so conditional requests can be answered without it
+        if self._dataset is None:
+            self._dataset = Dataset()
+        return self._dataset
 
     def render(self):
         # try returning alt profile
@@ -44,32 +49,13 @@ class DatasetRenderer(Renderer):
                 return self._render_dcat_html()
 
     def _render_dcat_rdf(self):
-        item_graph = Graph()
-        item_graph.bind("dggs", DGGS)
-        item_uri = URIRef(self.dataset.uri)
-        item_id = self.dataset.uri.split("/")[-1]
-        item_graph.add((item_uri, RDF.type, DGGS.Zone))
-        item_graph.add((item_uri, RDFS.label, Literal("Zone {}".format(item_id))))
-
-        for neighbour in calculate_neighbours(item_id):
-            direction_uri = URIRef(URI_BASE_DATASET[neighbour[0].title()])
-            neighbour_uri = URIRef(URI_BASE_ZONE[neighbour[1]])
-            bn = BNode()
-            item_graph.add((bn, DGGS.neighbour, neighbour_uri))
-            item_graph.add((bn, DGGS.direction, direction_uri))
-            item_graph.add((item_uri, DGGS.directionalisedNeighbour, bn))
-
-        # serialise in the appropriate RDF format
-        if self.mediatype in ["application/rdf+json", "application/json"]:
-            return Response(item_graph.serialize(format="json-ld"), mimetype=self.mediatype)
-        else:
-            return Response(item_graph.serialize(format=self.mediatype), mimetype=self.mediatype)
+        return rdf_response(dataset_triples(self.dataset), self.mediatype)
 
     def _render_dcat_html(self):
         _template_context = {
             "uri": self.dataset.uri,
             "label": self.dataset.label,
-            "description": markdown.markdown(self.dataset.description),
+            "description": markdown_html(self.dataset.description),
             "parts": self.dataset.parts,
             "distributions": self.dataset.distributions,
         }
@@ -1,11 +1,14 @@
-from flask import Response, render_template
-from rdflib import Graph, URIRef, Literal, RDF, RDFS, BNode
+from flask import Response, render_template, jsonify
 from .profiles import *
+from .renderers import ProfileRenderer
+from .rdf import earth_triples, rdf_response
 from config import *
+from metrics import timed
 from utils import calculate_neighbours, calculate_children, calculate_parent
 
 
 class Earth:
+    @timed("model")
     def __init__(
         self,
         zone_id
@@ -17,11 +20,19 @@ class Earth:
         self.children = calculate_children(zone_id)
 
 
-class EarthRenderer(Renderer):
+class EarthRenderer(ProfileRenderer):
+    @timed("conneg")
     def __init__(self, request, zone_id):
-        self.zone = Earth(zone_id)
-        self.profiles = {"dggs": profile_dggs}
-        super().__init__(request, self.zone.uri, self.profiles, "dggs")
+        self.zone_id = zone_id
+        self._zone = None
+        super().__init__(request, URI_BASE_ZONE[zone_id], DGGS_PROFILES, "dggs")
+
+    @property
+    def zone(self):
+        # the Earth is only made when it is rendered, so conditional requests can be answered without it
+        if self._zone is None:
+            self._zone = Earth(self.zone_id)
+        return self._zone
 
     def render(self):
         # try returning alt profile
@@ -31,30 +42,27 @@ class EarthRenderer(Renderer):
         elif self.profile == "dggs":
             if self.mediatype in Renderer.RDF_SERIALIZER_TYPES_MAP:
                 return self._render_dggs_rdf()
+            elif self.mediatype == "application/geo+json":
+                return self._render_dggs_geojson()
             else:
                 return self._render_dggs_html()
 
     def _render_dggs_rdf(self):
-        item_graph = Graph()
-        item_graph.bind("dggs", DGGS)
-        GEO = Namespace("http://www.opengis.net/ont/geosparql#")
-        item_graph.bind("geo", GEO)
-        GEOX = Namespace("https://linked.data.gov.au/def/geox#")
-        item_uri = URIRef(self.zone.uri)
-        item_id = self.zone.uri.split("/")[-1]
-        item_graph.add((item_uri, RDF.type, DGGS.Zone))
-        item_graph.add((item_uri, RDFS.label, Literal("Zone {}".format(item_id))))
-
-        for c in ["N", "O", "P", "Q", "R", "S"]:
-            item_graph.add((item_uri, GEO.sfContains, URIRef(URI_BASE_ZONE + c)))
-
-        item_graph.add((item_uri, GEO.hasDefaultGeometry, URIRef(URI_BASE_CELL[item_id])))
+        return rdf_response(earth_triples(self.zone), self.mediatype)
 
-        # serialise in the appropriate RDF format
-        if self.mediatype in ["application/rdf+json", "application/json"]:
-            return Response(item_graph.serialize(format="json-ld"), mimetype=self.mediatype)
-        else:
-            return Response(item_graph.serialize(format=self.mediatype), mimetype=self.mediatype)
+    def _render_dggs_geojson(self):
+        response = jsonify({
+            "type": "Feature",
+            "id": self.zone_id,
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[-180, -90], [180, -90], [180, 90], [-180, 90], [-180, -90]]],
+            },
+            "properties": {"label": self.zone.label, "uri": str(self.zone.uri)},
+        })
+        response.mimetype = self.mediatype
+        response.headers.extend(self.headers)
+        return response
 
     def _render_dggs_html(self):
         _template_context = {
@@ -19,8 +19,33 @@ profile_dggs = Profile(
     str(DGGSP),
     label="DGGS Profile",
     comment="A Semantic Web profile of the DGGS Abstract Specification",
-    mediatypes=["text/html", "application/json"] + Renderer.RDF_MEDIA_TYPES,
+    mediatypes=["text/html", "application/json", "application/geo+json"] + Renderer.RDF_MEDIA_TYPES,
     default_mediatype="text/html",
     languages=["en"],  # default 'en' only for now
     default_language="en",
-)
\ No newline at end of file
+)
+# the profile pyldapi adds to every Renderer's profiles, as it adds it
+profile_alt = Profile(
+    "http://www.w3.org/ns/dx/conneg/altr",
+    "Alternate Representations",
+    "The representation of the resource that lists all other representations (profiles and Media Types)",
+    ["text/html", "application/json"] + Renderer.RDF_MEDIA_TYPES,
+    "text/html",
+    languages=["en"],
+)
+
+
+class Profiles(dict):
+    """The profiles of a kind of resource, by token, with the alternate representations profile. Each is made once
+    and shared by all of its Renderers. It hashes and compares by identity, so what is worked out from it can be
+    cached"""
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+
+    def __init__(self, profiles):
+        super().__init__(profiles, alt=profile_alt)
+
+
+DGGS_PROFILES = Profiles({"dggs": profile_dggs})
+DATASET_PROFILES = Profiles({"dcat": profile_dcat, "dggs": profile_dggs})
@@ -0,0 +1,360 @@
+import json
+from collections import namedtuple
+from functools import lru_cache
+from flask import Response
+from pyldapi import Renderer
+from rdflib import Graph, URIRef, Literal as RDFLiteral, BNode as RDFBNode
+from rdflib.namespace import DCAT, DCTERMS, RDF, RDFS, XSD
+import numpy as np
+from config import *
+from metrics import phase
+from grid import (
+    DIRECTIONS,
+    cell_centroids,
+    cell_geojsons,
+    geojson_wkt,
+    grid_points,
+    neighbours_batch,
+    pack_grid_index,
+    point_wkt,
+    unpack_array,
+)
+
+# The RDF shapes of Zones, Cells, Earth and the Dataset are fixed, so rather than building an rdflib Graph per
+# response and running rdflib's generic serializers, the triples are made as plain tuples and written straight
+# out as Turtle, N-Triples or JSON-LD. IRIs are str, literals are Lit and blank nodes are BNodeId.
+
+Lit = namedtuple("Lit", ["value", "datatype"])
+Lit.__new__.__defaults__ = (None,)
+
+
+class BNodeId(str):
+    pass
+
+
+GEO = Namespace("http://www.opengis.net/ont/geosparql#")
+GEOX = Namespace("https://linked.data.gov.au/def/geox#")
+
+PREFIXES = [
+    ("rdf", str(RDF)),
+    ("rdfs", str(RDFS)),
+    ("xsd", str(XSD)),
+    ("dcat", str(DCAT)),
+    ("dcterms", str(DCTERMS)),
+    ("dggs", str(DGGS)),
+    ("geo", str(GEO)),
+    ("geox", str(GEOX)),
+    ("altr", "http://www.w3.org/ns/dx/conneg/altr#"),
+    ("prof", "http://www.w3.org/ns/dx/prof/"),
+]
+
+_RDF_TYPE = str(RDF.type)
+# the IRIs used for every Zone and Cell, so they aren't looked up in their Namespaces for every triple
+_LABEL = str(RDFS.label)
+_ZONE = str(DGGS.Zone)
+_CELL = str(DGGS.Cell)
+_NEIGHBOUR = str(DGGS.neighbour)
+_DIRECTION = str(DGGS.direction)
+_DIRECTIONALISED_NEIGHBOUR = str(DGGS.directionalisedNeighbour)
+_DIRECTIONS = {d: str(URI_BASE_DATASET[d.title()]) for d in ("down", "left", "right", "up")}
+_SF_WITHIN = str(GEO.sfWithin)
+_SF_TOUCHES = str(GEO.sfTouches)
+_SF_CONTAINS = str(GEO.sfContains)
+_HAS_DEFAULT_GEOMETRY = str(GEO.hasDefaultGeometry)
+_HAS_CENTROID = str(GEO.hasCentroid)
+_GEOMETRY = str(GEO.Geometry)
+_AS_WKT = str(GEO.asWKT)
+_WKT_LITERAL = str(GEO.wktLiteral)
+_AS_DGGS = str(GEOX.asDGGS)
+_DGGS_LITERAL = str(GEOX.dggsLiteral)
+_IS_PART_OF = str(DCTERMS.isPartOf)
+_IS_GEOMETRY_OF = str(GEOX.isGeometryOf)
+_CELL_BASE = str(URI_BASE_CELL)
+
+
+def zone_triples(zone, bnode_prefix=""):
+    """The triples of the DGGS profile of a model.Zone. Its blank nodes' labels start with bnode_prefix, which makes
+    them unique when many Zones' triples are written to one document"""
+    uri = str(zone.uri)
+    zone_id = uri.split("/")[-1]
+    yield uri, _RDF_TYPE, _ZONE
+    yield uri, _LABEL, Lit("Zone {}".format(zone_id))
+    yield uri, _SF_WITHIN, str(zone.parent[0])
+    for n, (neighbour_uri, neighbour_id, direction) in enumerate(zone.neighbours):
+        bn = BNodeId("{}n{}".format(bnode_prefix, n))
+        yield bn, _NEIGHBOUR, str(neighbour_uri)
+        yield bn, _DIRECTION, _DIRECTIONS[direction]
+        yield uri, _DIRECTIONALISED_NEIGHBOUR, bn
+        yield uri, _SF_TOUCHES, str(neighbour_uri)
+    for c in range(9):
+        yield uri, _SF_CONTAINS, uri + str(c)
+    yield uri, _HAS_DEFAULT_GEOMETRY, _CELL_BASE + zone_id
+    centroid = BNodeId(bnode_prefix + "c")
+    yield uri, _HAS_CENTROID, centroid
+    yield centroid, _RDF_TYPE, _GEOMETRY
+    yield centroid, _AS_WKT, Lit(point_wkt(*zone.centroid), _WKT_LITERAL)
+
+
+def cell_triples(cell):
+    """The triples of the DGGS profile of a model.Cell"""
+    uri = str(cell.uri)
+    cell_id = uri.split("/")[-1]
+    yield uri, _RDF_TYPE, _CELL
+    yield uri, _LABEL, Lit("Cell {}".format(cell_id))
+    yield uri, _AS_DGGS, Lit("<https://w3id.org/dggs/tb16pix> {}".format(cell_id), _DGGS_LITERAL)
+    yield uri, _AS_WKT, Lit(cell.wkt, _WKT_LITERAL)
+    yield uri, _IS_PART_OF, str(cell.isPartOf[0])
+    yield uri, _IS_GEOMETRY_OF, str(cell.isGeometryOf[0])
+
+
+_GridZone = namedtuple("_GridZone", ["uri", "parent", "neighbours", "centroid"])
+_GridCell = namedtuple("_GridCell", ["uri", "isPartOf", "isGeometryOf", "wkt"])
+_ZONE_BASE = str(URI_BASE_ZONE)
+
+
+def grid_triples(resolution, start, stop, zones=True, cells=True):
+    """Yields the triples of the Zones and/or Cells from index start up to, but not including, index stop of the
+    Grid at a resolution, with their neighbours and geometries computed for all of them together. Each Zone's blank
+    node labels are prefixed with its ID and '_' so they are unique across Zones"""
+    index = np.arange(start, stop, dtype=np.int64)
+    zone_ids = unpack_array(pack_grid_index(index, resolution)).tolist()
+    points = grid_points(index, resolution)
+    neighbours = neighbours_batch(zone_ids).tolist() if zones else [None] * len(zone_ids)
+    centroids = cell_centroids(points) if zones else [None] * len(zone_ids)
+    geometries = cell_geojsons(zone_ids, points) if cells else [None] * len(zone_ids)
+    grid = str(URI_BASE_GRID[str(resolution)]), "Grid {}".format(resolution)
+    for zone_id, row, centroid, geometry in zip(zone_ids, neighbours, centroids, geometries):
+        if zones:
+            parent = zone_id[:-1] or "Earth"
+            yield from zone_triples(_GridZone(
+                _ZONE_BASE + zone_id,
+                (_ZONE_BASE + parent, parent),
+                [(_ZONE_BASE + n, n, d) for d, n in zip(DIRECTIONS, row)],
+                centroid,
+            ), zone_id + "_")
+        if cells:
+            yield from cell_triples(_GridCell(
+                _CELL_BASE + zone_id, grid, (_ZONE_BASE + zone_id,), geojson_wkt(geometry)
+            ))
+
+
+def earth_triples(earth):
+    """The triples of the DGGS profile of model.Earth"""
+    uri = str(earth.uri)
+    earth_id = uri.split("/")[-1]
+    yield uri, _RDF_TYPE, str(DGGS.Zone)
+    yield uri, str(RDFS.label), Lit("Zone {}".format(earth_id))
+    for c in ["N", "O", "P", "Q", "R", "S"]:
+        yield uri, str(GEO.sfContains), str(URI_BASE_ZONE + c)
+    yield uri, str(GEO.hasDefaultGeometry), str(URI_BASE_CELL[earth_id])
+
+
+def dataset_triples(dataset):
+    """The triples of the DCAT profile of a model.Dataset"""
+    uri = str(dataset.uri)
+    yield uri, _RDF_TYPE, str(DCAT.Dataset)
+    yield uri, str(DCTERMS.title), Lit(dataset.label)
+    yield uri, str(DCTERMS.description), Lit(dataset.description)
+    for part_uri, part_label in dataset.parts:
+        yield uri, str(DCTERMS.hasPart), str(part_uri)
+    for n, (distribution_uri, distribution_label) in enumerate(dataset.distributions):
+        bn = BNodeId("d{}".format(n))
+        yield uri, str(DCAT.distribution), bn
+        yield bn, _RDF_TYPE, str(DCAT.Distribution)
+        yield bn, str(DCTERMS.title), Lit(distribution_label)
+        yield bn, str(DCAT.accessURL), str(distribution_uri)
+
+
+_ALTR = "http://www.w3.org/ns/dx/conneg/altr#"
+_PROF = "http://www.w3.org/ns/dx/prof/"
+
+
+@lru_cache(maxsize=None)
+def _alt_profiles_triples(profiles, default_profile_token):
+    # the alternate representations of any resource with a model.profiles.Profiles registry, with None for it
+    triples = []
+    for token, p in profiles.items():
+        triples.append((str(p.uri), _RDF_TYPE, _PROF + "Profile"))
+        triples.append((str(p.uri), _LABEL, Lit(str(p.label), str(XSD.string))))
+        triples.append((str(p.uri), str(RDFS.comment), Lit(str(p.comment), str(XSD.string))))
+    for token, p in profiles.items():
+        for mediatype in p.mediatypes:
+            if mediatype.startswith("_"):
+                continue
+            rep = BNodeId("r{}".format(len(triples)))
+            triples.append((rep, _RDF_TYPE, _ALTR + "Representation"))
+            triples.append((rep, str(DCTERMS.conformsTo), str(p.uri)))
+            triples.append((rep, str(DCTERMS.format), Lit(mediatype)))
+            triples.append((rep, _PROF + "hasToken", Lit(token, str(XSD.token))))
+            if mediatype == p.default_mediatype:
+                triples.append((rep, _ALTR + "isProfilesDefault", Lit("true", str(XSD.boolean))))
+            triples.append((None, _ALTR + "hasRepresentation", rep))
+            if token == default_profile_token and mediatype == p.default_mediatype:
+                triples.append((None, _ALTR + "hasDefaultRepresentation", rep))
+    return tuple(triples)
+
+
+def alt_profiles_triples(uri, profiles, default_profile_token):
+    """The triples of the alternate profiles profile of a resource, as pyldapi makes them: the same, apart from its
+    URI, for every resource with the same model.profiles.Profiles, so they are only worked out once"""
+    uri = str(uri)
+    for s, p, o in _alt_profiles_triples(profiles, default_profile_token):
+        yield uri if s is None else s, p, o
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _nt_term(term):
+    if type(term) is str:
+        return "<" + term + ">"
+    elif isinstance(term, Lit):
+        if term.datatype is None:
+            return '"{}"'.format(_escape(term.value))
+        return '"{}"^^<{}>'.format(_escape(term.value), term.datatype)
+    elif isinstance(term, BNodeId):
+        return "_:" + term
+    return "<{}>".format(term)
+
+
+def iter_ntriples(triples):
+    """Yields N-Triples lines"""
+    for s, p, o in triples:
+        yield "{} {} {} .\n".format(_nt_term(s), _nt_term(p), _nt_term(o))
+
+
+def _group(triples):
+    # {subject: {predicate: [objects]}} in first-seen order, and how many times each blank node is an object
+    subjects = {}
+    bnode_refs = {}
+    for s, p, o in triples:
+        subjects.setdefault(s, {}).setdefault(p, []).append(o)
+        if isinstance(o, BNodeId):
+            bnode_refs[o] = bnode_refs.get(o, 0) + 1
+    return subjects, bnode_refs
+
+
+def iter_turtle(triples, prefixes=PREFIXES):
+    """Yields Turtle chunks. Blank nodes that are the object of only one triple are written inline as [ ... ]"""
+    subjects, bnode_refs = _group(triples)
+    used = set()
+
+    def qname(iri):
+        for prefix, namespace in prefixes:
+            if iri.startswith(namespace):
+                local = iri[len(namespace):]
+                if local and (local[0].isalpha() or local[0] == "_") and \
+                        all(ch.isalnum() or ch in "_-" for ch in local):
+                    used.add(prefix)
+                    return "{}:{}".format(prefix, local)
+        return "<{}>".format(iri)
+
+    def term(t, indent):
+        if isinstance(t, Lit):
+            if t.datatype is None:
+                return '"{}"'.format(_escape(t.value))
+            return '"{}"^^{}'.format(_escape(t.value), qname(t.datatype))
+        elif isinstance(t, BNodeId):
+            if bnode_refs.get(t) == 1 and t in subjects:
+                return "[ " + predicate_list(subjects[t], indent + "    ") + " ]"
+            return "_:" + t
+        return qname(t)
+
+    def predicate_list(predicates, indent):
+        parts = []
+        for p, objects in predicates.items():
+            p_term = "a" if p == _RDF_TYPE else qname(p)
+            parts.append("{} {}".format(p_term, (",\n" + indent + "    ").join(term(o, indent) for o in objects)))
+        return (" ;\n" + indent).join(parts)
+
+    body = []
+    for s, predicates in subjects.items():
+        if isinstance(s, BNodeId) and bnode_refs.get(s) == 1:
+            continue  # written inline where it is referenced
+        s_term = "_:" + s if isinstance(s, BNodeId) else qname(s)
+        body.append("{} {} .\n\n".format(s_term, predicate_list(predicates, "    ")))
+
+    for prefix, namespace in prefixes:
+        if prefix in used:
+            yield "@prefix {}: <{}> .\n".format(prefix, namespace)
+    yield "\n"
+    yield from body
+
+
+def _jsonld_node(subject, predicates, subjects, bnode_refs):
+    node = {} if isinstance(subject, BNodeId) and bnode_refs.get(subject) == 1 else \
+        {"@id": "_:" + subject if isinstance(subject, BNodeId) else subject}
+    for p, objects in predicates.items():
+        if p == _RDF_TYPE and all(isinstance(o, str) and not isinstance(o, BNodeId) for o in objects):
+            node["@type"] = list(objects)
+            continue
+        values = []
+        for o in objects:
+            if isinstance(o, Lit):
+                values.append({"@value": o.value} if o.datatype is None else {"@value": o.value, "@type": o.datatype})
+            elif isinstance(o, BNodeId) and bnode_refs.get(o) == 1 and o in subjects:
+                values.append(_jsonld_node(o, subjects[o], subjects, bnode_refs))
+            elif isinstance(o, BNodeId):
+                values.append({"@id": "_:" + o})
+            else:
+                values.append({"@id": o})
+        node[p] = values
+    return node
+
+
+def iter_jsonld(triples):
+    """Yields expanded-form JSON-LD. Blank nodes that are the object of only one triple are embedded"""
+    subjects, bnode_refs = _group(triples)
+    nodes = [
+        _jsonld_node(s, predicates, subjects, bnode_refs)
+        for s, predicates in subjects.items()
+        if not (isinstance(s, BNodeId) and bnode_refs.get(s) == 1)
+    ]
+    yield json.dumps(nodes, indent=2)
+
+
+def to_graph(triples):
+    """An rdflib Graph of the triples, for the serializations that have no direct writer"""
+    bnodes = {}
+
+    def term(t):
+        if isinstance(t, Lit):
+            return RDFLiteral(t.value, datatype=URIRef(t.datatype) if t.datatype is not None else None)
+        elif isinstance(t, BNodeId):
+            return bnodes.setdefault(t, RDFBNode())
+        return URIRef(t)
+
+    g = Graph()
+    for prefix, namespace in PREFIXES:
+        g.bind(prefix, namespace)
+    for s, p, o in triples:
+        g.add((term(s), term(p), term(o)))
+    return g
+
+
+_WRITERS = {
+    "text/turtle": iter_turtle,
+    "text/n3": iter_turtle,  # Turtle is a subset of N3
+    "application/n-triples": iter_ntriples,
+    "application/ld+json": iter_jsonld,
+    "application/json": iter_jsonld,
+    "application/rdf+json": iter_jsonld,
+}
+
+
+def serialize(triples, mediatype):
+    """The triples serialized in the given RDF mediatype"""
+    writer = _WRITERS.get(mediatype)
+    if writer is not None:
+        return "".join(writer(triples))
+    return to_graph(triples).serialize(format=Renderer.RDF_SERIALIZER_TYPES_MAP.get(mediatype, mediatype))
+
+
+def rdf_response(triples, mediatype):
+    with phase("triples"):
+        triples = list(triples)
+    with phase("serialize"):
+        body = serialize(triples, mediatype)
+    return Response(body, mimetype=mediatype)
+
@@ -0,0 +1,148 @@
+from functools import lru_cache
+from flask_paginate import Pagination
+from pyldapi import ContainerRenderer, Renderer
+from config import NEGOTIATION_CACHE_SIZE
+from streams import template_response
+from .rdf import alt_profiles_triples, rdf_response
+
+__all__ = [
+    "ProfileRenderer",
+    "StreamingContainerRenderer",
+    "negotiate",
+]
+
+# pyldapi's Renderers make their alternate profiles and members pages with render_template(). These make the same
+# pages, from the same template context, with streams.template_response(), so they are streamed if STREAM_TEMPLATES.
+#
+# A pyldapi Renderer negotiates a request's profile, mediatype and language, and makes its Link header, from
+# scratch when it is made. For a given model.profiles.Profiles registry and default profile, they depend only on
+# the request's conneg query string arguments and headers, of which there are few distinct sets, so
+# ProfileRenderers run pyldapi's negotiation once per set and keep the results.
+
+_QSA = ("_view", "_profile", "_format", "_mediatype", "_lang")
+_HEADERS = (  # and their WSGI environ keys
+    ("Accept", "HTTP_ACCEPT"),
+    ("Accept-Profile", "HTTP_ACCEPT_PROFILE"),
+    ("Accept-Language", "HTTP_ACCEPT_LANGUAGE"),
+)
+_URI = "\x00"  # stands in for the resource's URI in the headers negotiate() makes
+
+
+class _Preferences:
+    # the parts of a request that pyldapi's negotiation reads
+    def __init__(self, values, headers):
+        self.values = dict(values)
+        self.headers = dict(headers)
+
+
+@lru_cache(maxsize=NEGOTIATION_CACHE_SIZE)
+def negotiate(profiles, default_profile_token, values, headers):
+    """pyldapi's negotiation for a Profiles registry and default profile and a request's (name, value) conneg query
+    string arguments and headers: (error, profile, mediatype, language, headers), with the Link header as the
+    parts to join with the resource's URI. Raises pyldapi's ProfilesMediatypesException for malformed headers"""
+    renderer = Renderer(_Preferences(values, headers), _URI, dict(profiles), default_profile_token)
+    response_headers = None
+    if renderer.vf_error is None:
+        response_headers = tuple(
+            (k, tuple(v.split(_URI)) if k == "Link" else v) for k, v in renderer.headers.items()
+        )
+    return renderer.vf_error, renderer.profile, renderer.mediatype, renderer.language, response_headers
+
+
+def _alt_profiles_context(profiles):
+    # the profiles in the template context of an alternate profiles page, as pyldapi makes them
+    return {
+        token: {
+            "label": str(profile.label),
+            "comment": str(profile.comment),
+            "mediatypes": tuple(f for f in profile.mediatypes if not f.startswith("_")),
+            "default_mediatype": str(profile.default_mediatype),
+            "languages": profile.languages if profile.languages is not None else ["en"],
+            "default_language": str(profile.default_language),
+            "uri": str(profile.uri),
+        }
+        for token, profile in profiles.items()
+    }
+
+
+_registry_alt_profiles_context = lru_cache(maxsize=None)(_alt_profiles_context)
+
+
+class _StreamedAltProfile:
+    def _render_alt_profile_html(self, template_context=None):
+        context = {
+            "uri": self.instance_uri,
+            "default_profile_token": self.default_profile_token,
+            "profiles": self._alt_profiles_context(),
+        }
+        context.update(template_context or {})
+        return template_response(self.alt_template or "alt.html", headers=self.headers, **context)
+
+    def _alt_profiles_context(self):
+        return _alt_profiles_context(self.profiles)
+
+
+class ProfileRenderer(_StreamedAltProfile, Renderer):
+    """A pyldapi Renderer of a resource with a model.profiles.Profiles registry, whose negotiation is memoised by
+    negotiate() and whose alternate profiles page is streamed and, in RDF, made from triples worked out once"""
+    def __init__(self, request, instance_uri, profiles, default_profile_token, alternates_template=None):
+        # instead of pyldapi's Renderer.__init__(), which negotiates from scratch
+        self.request = request
+        self.instance_uri = instance_uri
+        self.profiles = profiles
+        self.default_profile_token = default_profile_token
+        self.alt_template = alternates_template
+        values = request.values
+        environ = request.environ
+        self.vf_error, self.profile, self.mediatype, self.language, headers = negotiate(
+            profiles,
+            default_profile_token,
+            tuple((k, values[k]) for k in _QSA if k in values),
+            tuple((name, environ[k]) for name, k in _HEADERS if k in environ),
+        )
+        if self.vf_error is None:
+            uri = str(instance_uri)
+            self.headers = {k: uri.join(v) if k == "Link" else v for k, v in headers}
+
+    def _alt_profiles_context(self):
+        return _registry_alt_profiles_context(self.profiles)
+
+    def _render_alt_profile_rdf(self):
+        response = rdf_response(
+            alt_profiles_triples(self.instance_uri, self.profiles, self.default_profile_token), self.mediatype
+        )
+        for k, v in self.headers.items():
+            response.headers[k] = v
+        return response
+
+
+class StreamingContainerRenderer(_StreamedAltProfile, ContainerRenderer):
+    """A pyldapi ContainerRenderer whose members and alternate profiles pages are streamed. The members may be any
+    iterable, e.g. a generator, which is consumed as the page is written"""
+    def _render_mem_profile_html(self, template_context=None):
+        pagination = Pagination(
+            members_uri=self.instance_uri,
+            page=self.page,
+            per_page=self.per_page,
+            total=self.members_total_count,
+            page_parameter="page",
+            per_page_parameter="per_page",
+        )
+        context = {
+            "uri": self.instance_uri,
+            "label": self.label,
+            "comment": self.comment,
+            "parent_container_uri": self.parent_container_uri,
+            "parent_container_label": self.parent_container_label,
+            "members": self.members,
+            "page": self.page,
+            "per_page": self.per_page,
+            "first_page": self.first_page,
+            "prev_page": self.prev_page,
+            "next_page": self.next_page,
+            "last_page": self.last_page,
+            "pagination": pagination,
+        }
+        context.update(self.template_extras or {})
+        context.update(template_context or {})
+        return template_response(self.members_template or "members.html", headers=self.headers, **context)
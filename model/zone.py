@@ -1,11 +1,16 @@
-from flask import Response, render_template
-from rdflib import Graph, URIRef, Literal, RDF, RDFS, BNode
+from flask import Response, render_template, jsonify
 from .profiles import *
+from .renderers import ProfileRenderer
+from .rdf import zone_triples, rdf_response
 from config import *
+from metrics import timed
+from grid.attributes import cell_attributes
+from grid.geometry import cell_geojson
 from utils import calculate_neighbours, calculate_children, calculate_parent
 
 
 class Zone:
+    @timed("model")
     def __init__(
         self,
         zone_id
@@ -16,13 +21,25 @@ class Zone:
         self.neighbours = [(URI_BASE_ZONE[x[1]], x[1], x[0]) for x in calculate_neighbours(zone_id)]
         self.children = calculate_children(zone_id)
         self.defaultGeometry = (URI_BASE_CELL[zone_id], "Cell " + zone_id)
+        attributes = cell_attributes(zone_id)
+        self.centroid = attributes["centroid"]
+        self.area = attributes["area"]
+        self.bbox = attributes["bbox"]
 
 
-class ZoneRenderer(Renderer):
+class ZoneRenderer(ProfileRenderer):
+    @timed("conneg")
     def __init__(self, request, zone_id):
-        self.zone = Zone(zone_id)
-        self.profiles = {"dggs": profile_dggs}
-        super().__init__(request, self.zone.uri, self.profiles, "dggs")
+        self.zone_id = zone_id
+        self._zone = None
+        super().__init__(request, URI_BASE_ZONE[zone_id], DGGS_PROFILES, "dggs")
+
+    @property
+    def zone(self):
+        # the Zone is only made when it is rendered, so conditional requests can be answered without it
+        if self._zone is None:
+            self._zone = Zone(self.zone_id)
+        return self._zone
 
     def render(self):
         # try returning alt profile
@@ -32,43 +49,33 @@ class ZoneRenderer(Renderer):
         elif self.profile == "dggs":
             if self.mediatype in Renderer.RDF_SERIALIZER_TYPES_MAP:
                 return self._render_dggs_rdf()
+            elif self.mediatype == "application/geo+json":
+                return self._render_dggs_geojson()
             else:
                 return self._render_dggs_html()
 
     def _render_dggs_rdf(self):
-        item_graph = Graph()
-        item_graph.bind("dggs", DGGS)
-        GEO = Namespace("http://www.opengis.net/ont/geosparql#")
-        item_graph.bind("geo", GEO)
-        GEOX = Namespace("https://linked.data.gov.au/def/geox#")
-        item_graph.bind("geox", GEOX)
-        item_uri = URIRef(self.zone.uri)
-        item_id = self.zone.uri.split("/")[-1]
-        item_graph.add((item_uri, RDF.type, DGGS.Zone))
-        item_graph.add((item_uri, RDFS.label, Literal("Zone {}".format(item_id))))
-
-        item_graph.add((item_uri, GEO.sfWithin, URIRef(URI_BASE_ZONE[self.zone.parent[0]])))
-
-        for neighbour in calculate_neighbours(item_id):
-            direction_uri = URIRef(URI_BASE_DATASET[neighbour[0].title()])
-            neighbour_uri = URIRef(URI_BASE_ZONE[neighbour[1]])
-            bn = BNode()
-            item_graph.add((bn, DGGS.neighbour, neighbour_uri))
-            item_graph.add((bn, DGGS.direction, direction_uri))
-            item_graph.add((item_uri, DGGS.directionalisedNeighbour, bn))
-
-            item_graph.add((item_uri, GEO.sfTouches, URIRef(URI_BASE_ZONE[neighbour[1]])))
-
-        for c in range(9):
-            item_graph.add((item_uri, GEO.sfContains, URIRef(self.zone.uri + str(c))))
-
-        item_graph.add((item_uri, GEO.hasDefaultGeometry, URIRef(URI_BASE_CELL[item_id])))
+        return rdf_response(zone_triples(self.zone), self.mediatype)
 
-        # serialise in the appropriate RDF format
-        if self.mediatype in ["application/rdf+json", "application/json"]:
-            return Response(item_graph.serialize(format="json-ld"), mimetype=self.mediatype)
-        else:
-            return Response(item_graph.serialize(format=self.mediatype), mimetype=self.mediatype)
+    def _render_dggs_geojson(self):
+        # a Zone's geometry is its default geometry, its Cell
+        response = jsonify({
+            "type": "Feature",
+            "id": self.zone_id,
+            "bbox": self.zone.bbox,
+            "geometry": cell_geojson(self.zone_id),
+            "properties": {
+                "label": self.zone.label,
+                "uri": str(self.zone.uri),
+                "centroid": self.zone.centroid,
+                "area": self.zone.area,
+                "parent": self.zone.parent[1] if self.zone.parent is not None else None,
+                "defaultGeometry": str(self.zone.defaultGeometry[0]),
+            },
+        })
+        response.mimetype = self.mediatype
+        response.headers.extend(self.headers)
+        return response
 
     def _render_dggs_html(self):
         _template_context = {
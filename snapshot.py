@@ -0,0 +1,220 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+from functools import lru_cache
+import numpy as np
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.store import Store
+
+# A compact, read-only binary snapshot of an RDF graph, which is memory-mapped rather than parsed, so it loads at
+# once and every worker process that maps it shares one copy of it in the page cache. It holds no Python objects,
+# so, unlike a pickle, loading one can't run code.
+#
+# A snapshot file is laid out as:
+#
+#   header    magic, format version, bits per term ID, number of terms, number of triples, metadata length
+#   metadata  JSON: the version of the sources it was made from and the graph's namespace bindings
+#   offsets   uint64[terms + 1], the start of each term in the terms block
+#   terms     the encoded terms, sorted, so a term's ID is its position and is found by binary search
+#   SPO, POS, OSP   uint64[triples] each: the triples' term IDs packed into one number in each of the three
+#                   orders, sorted, so the triples matching any pattern are a range of one of them
+#
+# with each block after the header starting at a multiple of 8 bytes.
+
+SNAPSHOT_MAGIC = b"DGGSSNAP"
+SNAPSHOT_FORMAT = 1
+_HEADER = struct.Struct("<8sIIQQQ")
+
+
+def _encode(term):
+    # terms sort and compare as these bytes; the lexical form of a Literal comes first as it may contain anything
+    if isinstance(term, Literal):
+        fields = (str(term), str(term.datatype) if term.datatype is not None else "", term.language or "")
+        return ("L" + "\x00".join(fields)).encode("utf-8")
+    elif isinstance(term, BNode):
+        return ("B" + str(term)).encode("utf-8")
+    elif isinstance(term, URIRef):
+        return ("U" + str(term)).encode("utf-8")
+    return None
+
+
+def _decode(data):
+    kind, value = data[:1], data[1:].decode("utf-8")
+    if kind == b"U":
+        return URIRef(value)
+    elif kind == b"B":
+        return BNode(value)
+    lexical, datatype, language = value.rsplit("\x00", 2)
+    return Literal(lexical, lang=language or None, datatype=URIRef(datatype) if datatype else None)
+
+
+def _pad(n):
+    return -n % 8
+
+
+def write_snapshot(graph, path, version):
+    """Writes a snapshot of a graph, made from sources of the given version, to a new file at path"""
+    terms = sorted({_encode(t) for triple in graph for t in triple})
+    ids = {t: n for n, t in enumerate(terms)}
+    bits = max(1, (len(terms) - 1).bit_length())
+    if 3 * bits > 64:
+        raise ValueError("A snapshot can't hold {} terms".format(len(terms)))
+    triples = np.array(
+        [[ids[_encode(t)] for t in triple] for triple in graph], dtype=np.uint64
+    ).reshape(-1, 3)
+    s, p, o = (triples[:, i] for i in range(3))
+    b = np.uint64(bits)
+    indexes = [np.sort((x << (b + b)) | (y << b) | z) for x, y, z in ((s, p, o), (p, o, s), (o, s, p))]
+
+    metadata = json.dumps({
+        "version": version,
+        "namespaces": [[prefix, str(namespace)] for prefix, namespace in graph.namespaces()],
+    }).encode("utf-8")
+    offsets = np.cumsum([0] + [len(t) for t in terms], dtype=np.uint64)
+    term_bytes = b"".join(terms)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, bits, len(terms), len(triples), len(metadata)))
+        for block in (metadata, offsets.astype("<u8").tobytes(), term_bytes):
+            f.write(block + b"\x00" * _pad(len(block)))
+        for index in indexes:
+            f.write(index.astype("<u8").tobytes())
+    os.replace(temp, path)  # atomic, so other processes never map a partial snapshot
+
+
+class SnapshotStore(Store):
+    """A read-only rdflib Store over a memory-mapped snapshot file. Raises ValueError if the file isn't a valid
+    snapshot. Use it as Graph(store=SnapshotStore(path))"""
+    def __init__(self, path, cache_size=65536):
+        super().__init__()
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open(cache_size)
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+    def _open(self, cache_size):
+        size = len(self._map)
+        if size < _HEADER.size:
+            raise ValueError("{} is not a version {} graph snapshot".format(self.path, SNAPSHOT_FORMAT))
+        magic, fmt, bits, n_terms, n_triples, n_metadata = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT:
+            raise ValueError("{} is not a version {} graph snapshot".format(self.path, SNAPSHOT_FORMAT))
+        position = _HEADER.size + n_metadata + _pad(n_metadata)
+        offsets_size = 8 * (n_terms + 1)
+        if position + offsets_size > size:
+            raise ValueError("{} is truncated".format(self.path))
+        self._offsets = np.frombuffer(self._map, dtype="<u8", count=n_terms + 1, offset=position)
+        terms_start = position + offsets_size
+        terms_size = int(self._offsets[-1])
+        position = terms_start + terms_size + _pad(terms_size)
+        if position + 3 * 8 * n_triples != size:
+            raise ValueError("{} is truncated or has the wrong size".format(self.path))
+        self._spo, self._pos, self._osp = (
+            np.frombuffer(self._map, dtype="<u8", count=n_triples, offset=position + 8 * n_triples * i)
+            for i in range(3)
+        )
+        metadata = json.loads(self._map[_HEADER.size:_HEADER.size + n_metadata].decode("utf-8"))
+        self.version = metadata["version"]
+        self._namespaces = [(prefix, URIRef(namespace)) for prefix, namespace in metadata["namespaces"]]
+        self._terms_start = terms_start
+        self._bits = np.uint64(bits)
+        self._mask = np.uint64((1 << bits) - 1)
+        self._n_terms = n_terms
+        # decoded terms and looked up IDs are kept, as the same few terms are used over and over
+        self.term = lru_cache(maxsize=cache_size)(self._term)
+        self.term_id = lru_cache(maxsize=cache_size)(self._term_id)
+
+    def close(self):
+        # the arrays are views of the map, so they go first
+        self._offsets = self._spo = self._pos = self._osp = None
+        self._map.close()
+
+    def _term_bytes(self, n):
+        start, stop = self._offsets[n:n + 2]
+        return self._map[self._terms_start + int(start):self._terms_start + int(stop)]
+
+    def _term(self, n):
+        return _decode(self._term_bytes(n))
+
+    def _term_id(self, term):
+        # the ID of a term, or None if it isn't in the snapshot
+        key = _encode(term)
+        if key is None:
+            return None
+        n = bisect.bisect_left(range(self._n_terms), key, key=self._term_bytes)
+        return n if n < self._n_terms and self._term_bytes(n) == key else None
+
+    def __len__(self, context=None):
+        return len(self._spo)
+
+    def namespaces(self):
+        yield from self._namespaces
+
+    def _range(self, index, prefix):
+        # the keys of an index starting with the given IDs
+        shift = self._bits * np.uint64(3 - len(prefix))
+        key = np.uint64(0)
+        for n in prefix:
+            key = (key << self._bits) | np.uint64(n)
+        start = np.searchsorted(index, key << shift)
+        stop = np.searchsorted(index, (key + np.uint64(1)) << shift)
+        return index[start:stop]
+
+    def triples(self, triple_pattern, context=None):
+        bound = []
+        for t in triple_pattern:
+            if t is None:
+                bound.append(None)
+                continue
+            n = self.term_id(t) if isinstance(t, (URIRef, BNode, Literal)) else None
+            if n is None:
+                return  # a term that isn't in the snapshot, or a pattern this Store can't match
+            bound.append(n)
+        s, p, o = bound
+
+        # the index in whose order the bound IDs are a prefix of the keys, and where s, p and o are in its keys
+        if s is not None and p is None and o is not None:
+            index, order, prefix = self._osp, (1, 2, 0), [o, s]
+        elif s is not None:
+            index, order, prefix = self._spo, (0, 1, 2), [n for n in (s, p, o) if n is not None]
+        elif p is not None:
+            index, order, prefix = self._pos, (2, 0, 1), [p] if o is None else [p, o]
+        elif o is not None:
+            index, order, prefix = self._osp, (1, 2, 0), [o]
+        else:
+            index, order, prefix = self._spo, (0, 1, 2), []
+
+        keys = self._range(index, prefix) if prefix else index
+        b = self._bits
+        columns = (keys >> (b + b), (keys >> b) & self._mask, keys & self._mask)
+        for ids in zip(*(columns[i].tolist() for i in order)):
+            yield tuple(self.term(n) for n in ids), iter(())
+
+    def stats(self):
+        return {
+            "file": self.path,
+            "bytes": len(self._map),
+            "terms": self._n_terms,
+            "triples": len(self._spo),
+            "term_cache": self.term.cache_info()._asdict(),
+        }
+
+
+def load_snapshot(path):
+    """The read-only Graph of a snapshot file, or None if there isn't a valid one at path"""
+    try:
+        return Graph(store=SnapshotStore(path))
+    except (OSError, ValueError) as e:
+        if os.path.exists(path):
+            logging.warning("Could not load graph snapshot {}: {}".format(path, e))
+        return None
+
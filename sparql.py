@@ -0,0 +1,244 @@
+import csv
+import io
+import json
+import re
+import time
+from itertools import chain, islice
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import DCTERMS, RDF, RDFS
+from rdflib.store import Store
+from config import *
+from grid import MAX_RESOLUTION, index_from_cell_id, neighbours, num_cells
+from model.rdf import GEO, GEOX, PREFIXES, BNodeId, Lit, earth_triples, grid_triples
+from model.earth import Earth
+
+# A SPARQL endpoint over the static dataset graph and the triples the API delivers for Earth and every Zone and
+# Cell, of which there are far too many to store. The Zone and Cell triples are computed for each triple pattern
+# the query engine asks for: those of a Zone or Cell bound as the subject, or of the Zones and Cells that
+# reference one bound as the object. Patterns bound to neither are answered by walking the Grids, coarsest first,
+# a batch at a time, so they produce results as soon as they are asked for and LIMITs stop the walk early.
+
+SPARQL_RESULTS_JSON = "application/sparql-results+json"
+SPARQL_RESULTS_XML = "application/sparql-results+xml"
+SPARQL_QUERY = "application/sparql-query"
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def query_errors():
+    """The errors of queries that can't be parsed or run. rdflib's SPARQL parser is slow to import, so it's only
+    imported when a query is run, which is when these can be raised"""
+    from pyparsing import ParseException
+    from rdflib.plugins.sparql.sparql import SPARQLError
+
+    return ParseException, SPARQLError, NotImplementedError, ValueError
+
+
+_ZONE_BASE = str(URI_BASE_ZONE)
+_CELL_BASE = str(URI_BASE_CELL)
+_GRID_BASE = str(URI_BASE_GRID)
+_ID = re.compile("[NOPQRS][0-8]{{0,{}}}".format(MAX_RESOLUTION))
+_BNODE = re.compile("([NOPQRS][0-8]{{0,{}}})_(?:n[0-3]|c)".format(MAX_RESOLUTION))
+_LABEL = re.compile("(Zone|Cell) ([NOPQRS][0-8]{{0,{}}})".format(MAX_RESOLUTION))
+_DGGS_LITERAL = re.compile("<https://w3id.org/dggs/tb16pix> ([NOPQRS][0-8]{{0,{}}})".format(MAX_RESOLUTION))
+
+# the predicates of only Cells' triples, and of both Zones' and Cells'; the others are only Zones'
+_CELL_PREDICATES = {URIRef(str(GEOX.asDGGS)), DCTERMS.isPartOf, URIRef(str(GEOX.isGeometryOf))}
+_SHARED_PREDICATES = {RDF.type, RDFS.label, URIRef(str(GEO.asWKT))}
+_ZONE_PREDICATES = {
+    URIRef(str(p)) for p in (
+        DGGS.neighbour, DGGS.direction, DGGS.directionalisedNeighbour, GEO.sfWithin, GEO.sfTouches,
+        GEO.sfContains, GEO.hasDefaultGeometry, GEO.hasCentroid,
+    )
+}
+_ZONE_OBJECTS = {URIRef(str(DGGS.Zone)), URIRef(str(GEO.Geometry))} | {
+    URIRef(str(URI_BASE_DATASET[d])) for d in ("Down", "Left", "Right", "Up")
+}
+
+
+def _term(t):
+    if isinstance(t, Lit):
+        return Literal(t.value, datatype=URIRef(t.datatype) if t.datatype is not None else None)
+    elif isinstance(t, BNodeId):
+        return BNode(t)
+    return URIRef(t)
+
+
+def _plain(term):
+    # the model.rdf form of an rdflib term
+    if isinstance(term, Literal):
+        return Lit(str(term), str(term.datatype) if term.datatype is not None else None)
+    elif isinstance(term, BNode):
+        return BNodeId(term)
+    return str(term)
+
+
+def _zone_id(term, base):
+    # the Zone or Cell ID of a URI, or None
+    if isinstance(term, URIRef) and term.startswith(base) and _ID.fullmatch(term[len(base):]):
+        return term[len(base):]
+    return None
+
+
+class DGGSStore(Store):
+    """A read-only rdflib Store of the static dataset graph plus the computed triples of Earth and every Zone and
+    Cell. Iterating over triples raises QueryTimeout once the deadline, a time.monotonic() value, has passed"""
+    def __init__(self, graph, deadline=None, batch_size=BULK_BATCH_SIZE):
+        super().__init__()
+        self.graph = graph
+        self.deadline = deadline
+        self.batch_size = batch_size
+        self._static_subjects = set(graph.subjects())
+
+    def __len__(self, context=None):
+        # the computed triples aren't counted
+        return len(self.graph)
+
+    def namespaces(self):
+        for prefix, namespace in PREFIXES:
+            yield prefix, URIRef(namespace)
+
+    def triples(self, triple_pattern, context=None):
+        for triple in self.graph.triples(triple_pattern):
+            yield triple, iter(())
+        s, p, o = triple_pattern
+        if isinstance(o, Literal) and o.language:
+            return  # no computed literal has a language
+        # computed triples are matched before they are made into rdflib terms, which is most of their cost
+        pattern = [None if t is None else _plain(t) for t in triple_pattern]
+        for n, plain in enumerate(self._computed(s, p, o)):
+            if n % 1000 == 0 and self.deadline is not None and time.monotonic() > self.deadline:
+                raise QueryTimeout("The query took too long")
+            if all(t is None or t == u for t, u in zip(pattern, plain)):
+                triple = tuple(_term(t) for t in plain)
+                if triple[0] in self._static_subjects and triple in self.graph:
+                    continue  # also in the static graph
+                yield triple, iter(())
+
+    def _computed(self, s, p, o):
+        # model.rdf triples that include all those matching the pattern
+        if p is not None and p not in _CELL_PREDICATES | _SHARED_PREDICATES | _ZONE_PREDICATES:
+            return
+        zones = p is None or p not in _CELL_PREDICATES
+        cells = p is None or p not in _ZONE_PREDICATES
+        if s is not None:
+            yield from self._subject(s, zones, cells)
+        elif o is not None and not (isinstance(o, Literal) and o.datatype == URIRef(str(GEO.wktLiteral))):
+            yield from self._object(o, zones, cells)
+        else:
+            yield from self._walk(zones and o not in (DGGS.Cell,), cells and o not in _ZONE_OBJECTS)
+
+    def _ids(self, zone_ids, zones=True, cells=True):
+        for zone_id in zone_ids:
+            if zone_id == "Earth":
+                if zones:
+                    yield from earth_triples(Earth("Earth"))
+                continue
+            resolution = len(zone_id) - 1
+            index = index_from_cell_id(zone_id)
+            yield from grid_triples(resolution, index, index + 1, zones, cells)
+
+    def _subject(self, s, zones, cells):
+        if s == URIRef(_ZONE_BASE + "Earth"):
+            yield from self._ids(["Earth"], zones, False)
+        elif _zone_id(s, _ZONE_BASE) is not None:
+            yield from self._ids([_zone_id(s, _ZONE_BASE)], zones, False)
+        elif _zone_id(s, _CELL_BASE) is not None:
+            yield from self._ids([_zone_id(s, _CELL_BASE)], False, cells)
+        elif isinstance(s, BNode) and _BNODE.fullmatch(s):
+            yield from self._ids([_BNODE.fullmatch(s).group(1)], zones, False)
+
+    def _object(self, o, zones, cells):
+        zone_id = _zone_id(o, _ZONE_BASE)
+        if o == URIRef(_ZONE_BASE + "Earth"):
+            yield from self._ids(["N", "O", "P", "Q", "R", "S"], zones, False)
+        elif zone_id is not None:
+            # the Zones containing, within and touching it, and its Cell
+            related = ["Earth" if len(zone_id) == 1 else zone_id[:-1]] + [n for _, n in neighbours(zone_id)]
+            if len(zone_id) <= MAX_RESOLUTION:
+                related += [zone_id + str(c) for c in range(9)]
+            yield from self._ids(related, zones, False)
+            yield from self._ids([zone_id], False, cells)
+        elif _zone_id(o, _CELL_BASE) is not None:
+            yield from self._ids([_zone_id(o, _CELL_BASE)], zones, False)
+        elif isinstance(o, URIRef) and o.startswith(_GRID_BASE) and o[len(_GRID_BASE):].isdigit():
+            resolution = int(o[len(_GRID_BASE):])
+            if resolution <= MAX_RESOLUTION:
+                yield from self._grid(resolution, False, cells)
+        elif isinstance(o, BNode) and _BNODE.fullmatch(o):
+            yield from self._ids([_BNODE.fullmatch(o).group(1)], zones, False)
+        elif isinstance(o, Literal) and _LABEL.fullmatch(o):
+            kind, zone_id = _LABEL.fullmatch(o).groups()
+            yield from self._ids([zone_id], zones and kind == "Zone", cells and kind == "Cell")
+        elif isinstance(o, Literal) and _DGGS_LITERAL.fullmatch(o):
+            yield from self._ids([_DGGS_LITERAL.fullmatch(o).group(1)], False, cells)
+        elif o in _ZONE_OBJECTS or o == DGGS.Cell:
+            yield from self._walk(zones and o != DGGS.Cell, cells and o not in _ZONE_OBJECTS)
+
+    def _grid(self, resolution, zones, cells):
+        for start in range(0, num_cells(resolution), self.batch_size):
+            stop = min(start + self.batch_size, num_cells(resolution))
+            yield from grid_triples(resolution, start, stop, zones, cells)
+
+    def _walk(self, zones, cells):
+        # Earth, then every Grid, coarsest first
+        if zones:
+            yield from self._ids(["Earth"])
+        if zones or cells:
+            for resolution in range(MAX_RESOLUTION + 1):
+                yield from self._grid(resolution, zones, cells)
+
+
+def query(text, graph, timeout=SPARQL_TIMEOUT):
+    """Runs a SPARQL query over the static graph and the computed Zone and Cell triples. Raises the rdflib/pyparsing
+    errors of invalid queries; the results' rows are made as they are iterated over"""
+    store = DGGSStore(graph, deadline=time.monotonic() + timeout if timeout else None)
+    return Graph(store=store).query(text, initNs={prefix: namespace for prefix, namespace in PREFIXES})
+
+
+def _json_term(term):
+    if isinstance(term, URIRef):
+        return {"type": "uri", "value": str(term)}
+    elif isinstance(term, BNode):
+        return {"type": "bnode", "value": str(term)}
+    value = {"type": "literal", "value": str(term)}
+    if term.language:
+        value["xml:lang"] = term.language
+    elif term.datatype:
+        value["datatype"] = str(term.datatype)
+    return value
+
+
+def iter_results_json(result):
+    """Yields the SPARQL 1.1 Query Results JSON of a SELECT or ASK result, a row at a time"""
+    if result.type == "ASK":
+        yield json.dumps({"head": {}, "boolean": bool(result.askAnswer)})
+        return
+    variables = [str(v) for v in result.vars]
+    yield '{{"head": {{"vars": {}}}, "results": {{"bindings": ['.format(json.dumps(variables))
+    for n, row in enumerate(result):
+        binding = {v: _json_term(t) for v, t in zip(variables, row) if t is not None}
+        yield (",\n" if n else "\n") + json.dumps(binding)
+    yield "\n]}}\n"
+
+
+def iter_results_csv(result):
+    """Yields the SPARQL 1.1 Query Results CSV of a SELECT result, a row at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\r\n")
+    writer.writerow([str(v) for v in result.vars])
+    for row in result:
+        writer.writerow(["" if t is None else "_:" + t if isinstance(t, BNode) else str(t) for t in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def started(chunks, n=2):
+    """Makes the first n chunks of a results writer, which runs the query up to its first result so errors are
+    raised before a response is started, and returns an iterator over all of them"""
+    chunks = iter(chunks)
+    return chain(list(islice(chunks, n)), chunks)
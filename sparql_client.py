@@ -0,0 +1,213 @@
+import base64
+import http.client
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from config import *
+
+# A client for an upstream SPARQL endpoint, SPARQL_ENDPOINT, used by app.sparql_query2(). It keeps a pool of
+# persistent HTTP connections, retries failed queries a bounded number of times with exponential backoff and
+# keeps results in an LRU cache with a time limit. Many queries can be sent at once by query_many(), a limited
+# number at a time. It only needs the standard library.
+
+
+class SPARQLClientError(Exception):
+    """An upstream SPARQL endpoint's error response"""
+    def __init__(self, status, message):
+        super().__init__("SPARQL endpoint error {}: {}".format(status, message))
+        self.status = status
+
+
+class ResultCache:
+    """A thread-safe LRU cache of up to max_entries results, each kept for at most max_seconds"""
+    def __init__(self, max_entries, max_seconds):
+        self.max_entries = max_entries
+        self.max_seconds = max_seconds
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expiries = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expiries += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.max_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expiries": self.expiries,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class SPARQLClient:
+    """Sends SPARQL queries to an endpoint over a pool of up to pool_size persistent connections
+
+    Queries that fail to connect or get a 429, 502, 503 or 504 response are retried up to retries times, after
+    waiting backoff * 2^attempt seconds, with jitter, or as long as a Retry-After header asks, up to max_backoff.
+    Results are cached for cache_seconds, keyed by query and Accept mediatype, unless cache_size is 0.
+    """
+    RETRY_STATUSES = {429, 502, 503, 504}
+
+    def __init__(
+        self,
+        endpoint,
+        username=None,
+        password=None,
+        timeout=SPARQL_CLIENT_TIMEOUT,
+        retries=SPARQL_CLIENT_RETRIES,
+        backoff=0.5,
+        max_backoff=30.0,
+        pool_size=SPARQL_CLIENT_POOL_SIZE,
+        cache_size=SPARQL_CLIENT_CACHE_SIZE,
+        cache_seconds=SPARQL_CLIENT_CACHE_SECONDS,
+        concurrency=SPARQL_CLIENT_CONCURRENCY,
+    ):
+        url = urlsplit(endpoint)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise ValueError("'{}' is not an http or https SPARQL endpoint URL".format(endpoint))
+        self.endpoint = endpoint
+        self._connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host, self._port = url.hostname, url.port
+        self._path = (url.path or "/") + ("?" + url.query if url.query else "")
+        self._auth = None
+        if username is not None and password is not None:
+            token = base64.b64encode("{}:{}".format(username, password).encode("utf-8")).decode("ascii")
+            self._auth = "Basic " + token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self.cache = ResultCache(cache_size, cache_seconds) if cache_size > 0 else None
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.pool_size = pool_size
+        self.requests = self.connections = self.retried = self.errors = 0
+
+    def _connect(self):
+        # an idle pooled connection, if there is one, and whether it was
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            self.connections += 1
+            return self._connection_class(self._host, self._port, timeout=self.timeout), False
+
+    def _post(self, query, accept):
+        headers = {"Content-Type": "application/sparql-query", "Accept": accept}
+        if self._auth is not None:
+            headers["Authorization"] = self._auth
+        with self._slots:
+            while True:
+                connection, reused = self._connect()
+                try:
+                    connection.request("POST", self._path, body=query.encode("utf-8"), headers=headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    if reused:
+                        continue  # the server closed an idle connection, so try another one straight away
+                    raise
+                self.requests += 1
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._idle.put(connection)
+                return response.status, response.getheader("Retry-After"), body, response.headers.get_content_charset()
+
+    def _wait(self, attempt, retry_after):
+        try:
+            seconds = float(retry_after)
+        except (TypeError, ValueError):
+            seconds = random.uniform(0.5, 1.0) * self.backoff * 2 ** attempt
+        time.sleep(min(seconds, self.max_backoff))
+
+    def query(self, query, accept="application/json"):
+        """The result of a query in the accept mediatype, as a str. Raises SPARQLClientError for error responses
+        and OSError or http.client.HTTPException if the endpoint can't be reached, after any retries"""
+        key = (query, accept)
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+        for attempt in range(self.retries + 1):
+            try:
+                status, retry_after, body, charset = self._post(query, accept)
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    self.errors += 1
+                    raise
+                logging.warning("SPARQL query to {} failed, retrying: {}".format(self.endpoint, e))
+                self.retried += 1
+                self._wait(attempt, None)
+                continue
+            if status in self.RETRY_STATUSES and attempt < self.retries:
+                self.retried += 1
+                self._wait(attempt, retry_after)
+                continue
+            result = body.decode(charset or "utf-8", errors="replace")
+            if status >= 400:
+                self.errors += 1
+                raise SPARQLClientError(status, result[:1000])
+            if self.cache is not None:
+                self.cache.put(key, result)
+            return result
+
+    def query_many(self, queries, accept="application/json", concurrency=None):
+        """The results of many queries, in order, with at most concurrency of them being sent at once. Raises the
+        first error of any of them"""
+        queries = list(queries)
+        workers = max(1, min(concurrency or self.concurrency, len(queries)))
+        if workers == 1:
+            return [self.query(q, accept) for q in queries]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda q: self.query(q, accept), queries))
+
+    def close(self):
+        """Closes the idle pooled connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        return {
+            "endpoint": self.endpoint,
+            "requests": self.requests,
+            "connections": self.connections,
+            "idle_connections": self._idle.qsize(),
+            "pool_size": self.pool_size,
+            "retried": self.retried,
+            "errors": self.errors,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+SPARQL_CLIENT = SPARQLClient(SPARQL_ENDPOINT, SPARQL_USERNAME, SPARQL_PASSWORD) if SPARQL_ENDPOINT else None
+
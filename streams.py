@@ -0,0 +1,243 @@
+import csv
+import json
+from flask import Response, render_template, stream_template
+from config import STREAM_TEMPLATES
+
+# Helpers for the bulk endpoints, which read lists of values from request bodies and stream back one JSON record
+# per line (NDJSON) so that neither input nor output has to be held in memory, and for streaming large HTML pages.
+
+NDJSON = "application/x-ndjson"
+GEOJSON = "application/geo+json"
+
+
+def iter_lines(stream, chunk_size=64 * 1024):
+    """Yields the non-empty, stripped, decoded lines of a binary stream without reading it all first"""
+    remainder = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line.decode("utf-8")
+    remainder = remainder.strip()
+    if remainder:
+        yield remainder.decode("utf-8")
+
+
+def request_ids(request, key):
+    """An iterator over the IDs in a request body, which may be
+
+    * application/json: a list of IDs or an object with the list under key, e.g. {"zones": ["R0", ...]}
+    * application/x-ndjson: one JSON string, or object with the ID under "id", per line
+    * anything else: one ID per line
+
+    JSON bodies are parsed whole, here, and raise ValueError if malformed. The others are read a line at a time
+    as the iterator is consumed, and lines that aren't valid JSON are passed on as they are, to be reported as
+    invalid IDs.
+    """
+    mimetype = request.mimetype
+    if mimetype == "application/json":
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            body = body.get(key)
+        if not isinstance(body, list):
+            raise ValueError("A JSON body must be a list of IDs or an object with a list of IDs in '{}'".format(key))
+        return (str(value) for value in body)
+    elif mimetype in (NDJSON, "application/jsonl"):
+        return (_ndjson_id(line) for line in iter_lines(request.stream))
+    else:
+        return iter_lines(request.stream)
+
+
+def _ndjson_id(line):
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return line
+    return str(value.get("id") if isinstance(value, dict) else value)
+
+
+def iter_ndjson(records):
+    """Yields each record as a line of NDJSON"""
+    for record in records:
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def iter_chunks(pieces, size=64 * 1024):
+    """Joins strings into chunks of about size characters, so a response of many short lines isn't written to the
+    client a line at a time"""
+    chunk = []
+    length = 0
+    for piece in pieces:
+        chunk.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def template_response(template_name, headers=None, **context):
+    """A Response of a rendered template. If STREAM_TEMPLATES, it is streamed in chunks as it is rendered, so the
+    context's values may be generators, which are consumed as the page is written"""
+    if STREAM_TEMPLATES:
+        return Response(iter_chunks(stream_template(template_name, **context), 16 * 1024), headers=headers)
+    return Response(render_template(template_name, **context), headers=headers)
+
+
+# column names recognised in the header of a CSV of points
+_LON_COLUMNS = ("lon", "lng", "long", "longitude", "x")
+_LAT_COLUMNS = ("lat", "latitude", "y")
+_ID_COLUMNS = ("id",)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def request_points(request):
+    """An iterator over the (id, lon, lat) points in a request body, which may be
+
+    * application/geo+json or application/json: a GeoJSON FeatureCollection, Feature or geometry of Points or
+      MultiPoints, the id being each Feature's "id"
+    * application/x-ndjson: one point per line, as [lon, lat], {"id": ..., "lon": ..., "lat": ...} or a GeoJSON
+      Feature or Point
+    * anything else: CSV, with lon and lat columns (and optionally an id column) named in a header row, or, if
+      there is no header, lon,lat in the first two columns
+
+    GeoJSON bodies are parsed whole, here, and CSV headers read here, and raise ValueError if malformed. Other
+    lines are read as the iterator is consumed. ids are None where the input has none, and lon and lat None where
+    a point can't be read, to be reported as invalid points.
+    """
+    mimetype = request.mimetype
+    if mimetype in (GEOJSON, "application/json"):
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ValueError("A GeoJSON body must be a FeatureCollection, Feature or geometry")
+        return iter(list(_geojson_points(body)))
+    elif mimetype in (NDJSON, "application/jsonl", "application/geo+json-seq"):
+        return (_ndjson_point(line) for line in iter_lines(request.stream))
+    else:
+        return _csv_points(iter_lines(request.stream))
+
+
+def _geojson_points(obj, id=None):
+    kind = obj.get("type")
+    if kind == "FeatureCollection":
+        features = obj.get("features")
+        if not isinstance(features, list):
+            raise ValueError("A GeoJSON FeatureCollection must have a list of features")
+        for feature in features:
+            if not isinstance(feature, dict):
+                raise ValueError("GeoJSON features must be objects")
+            yield from _geojson_points(feature)
+    elif kind == "Feature":
+        geometry = obj.get("geometry")
+        if isinstance(geometry, dict):
+            yield from _geojson_points(geometry, obj.get("id"))
+        else:
+            yield obj.get("id"), None, None
+    elif kind == "Point":
+        yield id, _coordinate(obj.get("coordinates"), 0), _coordinate(obj.get("coordinates"), 1)
+    elif kind == "MultiPoint":
+        for coordinates in obj.get("coordinates") or []:
+            yield id, _coordinate(coordinates, 0), _coordinate(coordinates, 1)
+    elif kind in ("LineString", "Polygon", "MultiLineString", "MultiPolygon", "GeometryCollection"):
+        yield id, None, None  # not a point
+    else:
+        raise ValueError("A GeoJSON body must be a FeatureCollection, Feature or geometry")
+
+
+def _coordinate(coordinates, i):
+    if isinstance(coordinates, list) and len(coordinates) >= 2 and not isinstance(coordinates[i], bool):
+        return _float(coordinates[i])
+    return None
+
+
+def _ndjson_point(line):
+    try:
+        value = json.loads(line)
+    except ValueError:
+        return None, None, None
+    if isinstance(value, list):
+        return None, _coordinate(value, 0), _coordinate(value, 1)
+    elif isinstance(value, dict):
+        if value.get("type") in ("Feature", "Point"):
+            try:
+                return next(_geojson_points(value), (None, None, None))
+            except ValueError:
+                return None, None, None
+        return value.get("id"), _float(value.get("lon")), _float(value.get("lat"))
+    return None, None, None
+
+
+def _csv_points(lines):
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return iter(())
+    header = next(csv.reader([first]))
+    names = [name.strip().lower() for name in header]
+    if len(header) >= 2 and _float(header[0]) is not None and _float(header[1]) is not None:
+        # no header row: lon,lat
+        lon_col, lat_col, id_col = 0, 1, None
+        rows = csv.reader(_chain_first(first, lines))
+    else:
+        lon_col = next((names.index(c) for c in _LON_COLUMNS if c in names), None)
+        lat_col = next((names.index(c) for c in _LAT_COLUMNS if c in names), None)
+        id_col = next((names.index(c) for c in _ID_COLUMNS if c in names), None)
+        if lon_col is None or lat_col is None:
+            raise ValueError(
+                "A CSV of points must have lon and lat columns, named in a header row as one of {} and one of {}"
+                .format(", ".join(_LON_COLUMNS), ", ".join(_LAT_COLUMNS))
+            )
+        rows = csv.reader(lines)
+    return _csv_rows(rows, lon_col, lat_col, id_col)
+
+
+def _csv_rows(rows, lon_col, lat_col, id_col):
+    for row in rows:
+        point_id = row[id_col] if id_col is not None and id_col < len(row) else None
+        if lon_col < len(row) and lat_col < len(row):
+            yield point_id, _float(row[lon_col]), _float(row[lat_col])
+        else:
+            yield point_id, None, None
+
+
+def _chain_first(first, lines):
+    yield first
+    yield from lines
+
+
+def iter_csv(rows, header):
+    """Yields the header and then each row as a line of CSV"""
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(header)
+    yield buffer.pop()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.pop()
+
+
+class _LineBuffer:
+    # a file-like object for csv.writer that hands back what was written to it
+    def __init__(self):
+        self._parts = []
+
+    def write(self, value):
+        self._parts.append(value)
+
+    def pop(self):
+        value = "".join(self._parts)
+        self._parts = []
+        return value
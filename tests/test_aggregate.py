@@ -0,0 +1,290 @@
+import csv
+import io
+import json
+import math
+import subprocess
+import sys
+from functools import lru_cache
+import numpy as np
+import pytest
+import coldstart
+from config import AGGREGATE_CHUNK_SIZE
+from aggregate import (
+    CellAggregator, _file_ranges, aggregate, aggregate_file, csv_header, iter_line_blocks, iter_point_tables,
+    rollups,
+)
+from app import app
+from grid import cell_id_from_point
+
+RESOLUTION = 4
+VALUES = ["depth", "temp"]
+
+
+def _points(n=1500, seed=25):
+    # (lon, lat, depth, temp): most in a small area, so Cells have many points, some anywhere, and some invalid
+    rng = np.random.default_rng(seed)
+    points = []
+    for i in range(n):
+        if i % 5:
+            lon, lat = rng.uniform(130, 134), rng.uniform(-30, -26)
+        else:
+            lon, lat = rng.uniform(-180, 180), float(np.degrees(np.arcsin(rng.uniform(-1, 1))))
+        depth = round(float(rng.normal(100, 30)), 3)
+        temp = round(float(rng.normal(15, 5)), 3) if i % 7 else None  # temp is missing for some points
+        points.append([round(lon, 6), round(lat, 6), depth, temp])
+    points += [[200.0, 0.0, 1.0, 1.0], [0.0, -91.0, 1.0, 1.0], [None, 10.0, 1.0, 1.0], [180.0, 90.0, 2.0, None]]
+    return points
+
+
+POINTS = _points()
+
+
+@lru_cache(maxsize=None)
+def _naive(points, resolution):
+    # the statistics of each Cell's points, worked out one point at a time
+    cells = {}
+    invalid = 0
+    for lon, lat, *values in points:
+        cell_id = None
+        if lon is not None and lat is not None and -180 <= lon <= 180 and -90 <= lat <= 90:
+            cell_id = cell_id_from_point(lon, lat, resolution)
+        if cell_id is None:
+            invalid += 1
+            continue
+        cell = cells.setdefault(cell_id, {"count": 0, "values": {name: [] for name in VALUES}})
+        cell["count"] += 1
+        for name, value in zip(VALUES, values):
+            if value is not None and math.isfinite(value):
+                cell["values"][name].append(value)
+    return cells, invalid
+
+
+def _check(records, points, resolution):
+    expected, _ = _naive(tuple(map(tuple, points)), resolution)
+    assert [r["zone"] for r in records] == sorted(expected)
+    for record in records:
+        cell = expected[record["zone"]]
+        assert record["resolution"] == resolution and record["count"] == cell["count"]
+        for name in VALUES:
+            values, stats = cell["values"][name], record["values"][name]
+            assert stats["count"] == len(values)
+            assert stats["sum"] == pytest.approx(sum(values), abs=1e-9)
+            if values:
+                assert stats["min"] == min(values) and stats["max"] == max(values)
+                assert stats["mean"] == pytest.approx(sum(values) / len(values))
+            else:
+                assert stats["min"] is None and stats["max"] is None and stats["mean"] is None
+
+
+def _records(aggregator):
+    return [json.loads(line) for line in aggregator.ndjson_lines(batch_size=50)]
+
+
+def _rounded(records):
+    # records with their sums and means rounded, as they depend on the order the values are added in
+    def rounded(value):
+        return float("%.10g" % value) if isinstance(value, float) else value
+
+    return [
+        dict(r, values={name: {k: rounded(v) for k, v in stats.items()} for name, stats in r["values"].items()})
+        for r in records
+    ]
+
+
+def _csv(points):
+    lines = ["id,Lat,depth,LON,temp"]
+    for i, (lon, lat, depth, temp) in enumerate(points):
+        lines.append(",".join("" if v is None else str(v) for v in (i, lat, depth, lon, temp)))
+    return "\n".join(lines) + "\n"
+
+
+def _ndjson(points):
+    lines = []
+    for i, (lon, lat, depth, temp) in enumerate(points):
+        if i % 3 == 0:
+            lines.append(json.dumps({"lon": lon, "lat": lat, "depth": depth, "temp": temp}))
+        elif i % 3 == 1:
+            lines.append(json.dumps([lon, lat, depth, temp]))
+        else:
+            geometry = {"type": "Point", "coordinates": [lon, lat]} if lon is not None else None
+            properties = {"depth": depth, "temp": temp}
+            lines.append(json.dumps({"type": "Feature", "geometry": geometry, "properties": properties}))
+    return "\n".join(lines) + "\n"
+
+
+def _aggregate(text, format, resolution=RESOLUTION, chunk_size=100, block_size=4096):
+    blocks = iter_line_blocks(io.BytesIO(text.encode("utf-8")), size=block_size)
+    return aggregate(iter_point_tables(blocks, format, VALUES, chunk_size=chunk_size), resolution, VALUES)
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("format", ["csv", "ndjson"])
+def test_aggregate(format):
+    aggregator = _aggregate(_csv(POINTS) if format == "csv" else _ndjson(POINTS), format)
+    _check(_records(aggregator), POINTS, RESOLUTION)
+    assert aggregator.points == len(POINTS)
+    assert aggregator.invalid == _naive(tuple(map(tuple, POINTS)), RESOLUTION)[1] == 3
+
+
+@pytest.mark.parametrize("chunk_size,block_size", [(1, 64), (7, 100), (10 ** 6, 10 ** 6)])
+def test_chunks(chunk_size, block_size):
+    # the Cells don't depend on how the input is read
+    expected = _rounded(_records(_aggregate(_csv(POINTS), "csv")))
+    actual = _records(_aggregate(_csv(POINTS), "csv", chunk_size=chunk_size, block_size=block_size))
+    assert _rounded(actual) == expected
+
+
+def test_invalid_rows():
+    text = "lon,lat,depth,temp\n130,-28,1,2\n130,-28\nabc,-28,1,2\n130,-28,x,3\n\n200,0,1,1\n130,-28,inf,nan\n"
+    aggregator = _aggregate(text, "csv")
+    # a short row is a point without values, which aren't counted, as are those that aren't finite numbers
+    assert aggregator.points == 6 and aggregator.invalid == 2
+    (record,) = _records(aggregator)
+    assert record["count"] == 4
+    assert record["values"]["depth"] == {"count": 1, "sum": 1.0, "min": 1.0, "max": 1.0, "mean": 1.0}
+    assert record["values"]["temp"] == {"count": 2, "sum": 5.0, "min": 2.0, "max": 3.0, "mean": 2.5}
+    aggregator = _aggregate('{"lon": 130, "lat": -28}\nnot json\n"a string"\n[1]\n{"type": "Feature"}\n', "ndjson")
+    assert aggregator.points == 5 and aggregator.invalid == 4
+
+
+@pytest.mark.parametrize("resolution", [0, 1, 2, 3])
+def test_rollup(resolution):
+    aggregator = _aggregate(_csv(POINTS), "csv")
+    rolled = aggregator.rollup(resolution)
+    _check(_records(rolled), POINTS, resolution)
+    assert _rounded(_records(rolled)) == _rounded(_records(_aggregate(_csv(POINTS), "csv", resolution=resolution)))
+    assert rolled.points == aggregator.points and rolled.invalid == aggregator.invalid
+
+
+def test_rollups():
+    aggregators = rollups(_aggregate(_csv(POINTS), "csv"), [1, 3, 1, RESOLUTION])
+    assert [a.resolution for a in aggregators] == [RESOLUTION, 3, 1]
+    for a in aggregators:
+        _check(_records(a), POINTS, a.resolution)
+
+
+def test_update():
+    # aggregators of parts of the points, merged, are an aggregator of them all
+    parts = [POINTS[i::3] for i in range(3)]
+    merged = CellAggregator(RESOLUTION, VALUES)
+    for part in parts:
+        merged.update(_aggregate(_csv(part), "csv"))
+    merged.update(_aggregate(_csv(parts[0][:5]), "csv").state())
+    _check(_records(merged), POINTS + parts[0][:5], RESOLUTION)
+    assert merged.points == len(POINTS) + 5
+
+
+def test_csv_lines():
+    aggregator = _aggregate(_csv(POINTS), "csv")
+    rows = list(csv.reader(aggregator.csv_lines(50)))
+    assert csv_header(VALUES) == ["zone", "resolution", "count"] + [
+        "{}_{}".format(name, s) for name in VALUES for s in ("count", "sum", "min", "max", "mean")
+    ]
+    for row, record in zip(rows, _records(aggregator)):
+        expected = [record["zone"], str(record["resolution"]), str(record["count"])]
+        for name in VALUES:
+            stats = record["values"][name]
+            expected += ["" if stats[s] is None else repr(float(stats[s])) if s != "count" else str(stats[s])
+                         for s in ("count", "sum", "min", "max", "mean")]
+        assert row == expected
+    assert len(rows) == len(aggregator)
+
+
+def test_no_values():
+    aggregator = _aggregate(_csv(POINTS), "csv")
+    counts = CellAggregator(RESOLUTION)
+    for table in iter_point_tables(iter_line_blocks(io.BytesIO(_csv(POINTS).encode())), "csv"):
+        counts.add(table)
+    records = [json.loads(line) for line in counts.ndjson_lines()]
+    assert records == [{k: r[k] for k in ("zone", "resolution", "count")} for r in _records(aggregator)]
+    assert list(counts.csv_lines())[0].count(",") == 2
+
+
+@pytest.mark.parametrize("text", ["depth,temp\n1,2\n", "1,2,3,4\n", "lon,lat,depth\n1,2,3\n"])
+def test_csv_header_errors(text):
+    # no lon and lat columns, or no temp column
+    with pytest.raises(ValueError):
+        _aggregate(text, "csv")
+
+
+def test_file_ranges(tmp_path):
+    path = tmp_path / "points.csv"
+    path.write_text(_csv(POINTS))
+    content = path.read_bytes()
+    for parts in (1, 3, 16, 10 ** 6):
+        ranges = _file_ranges(str(path), parts, True)
+        assert ranges[0][0] == content.index(b"\n") + 1 and ranges[-1][1] == len(content)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        assert all(content[start - 1:start] == b"\n" for start, _ in ranges)
+
+
+@pytest.mark.parametrize("format,workers", [("csv", 1), ("csv", 3), ("ndjson", 2)])
+def test_aggregate_file(tmp_path, format, workers):
+    path = tmp_path / ("points." + format)
+    path.write_text(_csv(POINTS) if format == "csv" else _ndjson(POINTS))
+    aggregator = aggregate_file(str(path), format, RESOLUTION, VALUES, workers=workers, chunk_size=64)
+    _check(_records(aggregator), POINTS, RESOLUTION)
+    assert aggregator.points == len(POINTS) and aggregator.invalid == 3
+
+
+def test_cli(tmp_path):
+    path = tmp_path / "points.csv"
+    path.write_text(_csv(POINTS))
+    output = tmp_path / "cells.ndjson"
+    subprocess.run([
+        sys.executable, "aggregate.py", str(path), "-r", str(RESOLUTION), "-v", ",".join(VALUES), "--rollup", "2",
+        "-w", "2", "-o", str(output),
+    ], cwd=coldstart.APP_DIR, check=True, capture_output=True)
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    _check([r for r in records if r["resolution"] == RESOLUTION], POINTS, RESOLUTION)
+    _check([r for r in records if r["resolution"] == 2], POINTS, 2)
+    process = subprocess.run(
+        [sys.executable, "aggregate.py", str(path), "-r", "2", "--rollup", "3"], cwd=coldstart.APP_DIR,
+        capture_output=True
+    )
+    assert process.returncode == 2
+
+
+@pytest.mark.parametrize("content_type,format", [("text/csv", "csv"), ("application/x-ndjson", "ndjson")])
+def test_endpoint(client, content_type, format):
+    body = _csv(POINTS) if format == "csv" else _ndjson(POINTS)
+    response = client.post(
+        "/zones/aggregate?resolution={}&values={}&rollup=1,3".format(RESOLUTION, ",".join(VALUES)),
+        data=body, content_type=content_type
+    )
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Points"] == str(len(POINTS)) and response.headers["X-Invalid-Points"] == "3"
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r["resolution"] for r in records] == sorted((r["resolution"] for r in records), reverse=True)
+    for resolution in (RESOLUTION, 3, 1):
+        _check([r for r in records if r["resolution"] == resolution], POINTS, resolution)
+
+
+def test_endpoint_csv(client):
+    path = "/zones/aggregate?resolution={}&values={}".format(RESOLUTION, ",".join(VALUES))
+    response = client.post(path, data=_csv(POINTS), content_type="text/csv", headers={"Accept": "text/csv"})
+    assert response.mimetype == "text/csv"
+    # read as the endpoint reads it, so the values are added in the same order
+    aggregator = _aggregate(_csv(POINTS), "csv", chunk_size=AGGREGATE_CHUNK_SIZE, block_size=4 * 1024 * 1024)
+    expected = [",".join(csv_header(VALUES)) + "\n"] + list(aggregator.csv_lines())
+    assert response.get_data(as_text=True) == "".join(expected)
+    assert client.post(path + "&_mediatype=text/csv", data=_csv(POINTS)).get_data(as_text=True) == "".join(expected)
+
+
+@pytest.mark.parametrize("query,body", [
+    ("", "lon,lat\n1,2\n"),
+    ("resolution=x", "lon,lat\n1,2\n"),
+    ("resolution=16", "lon,lat\n1,2\n"),
+    ("resolution=3&rollup=4", "lon,lat\n1,2\n"),
+    ("resolution=3&rollup=a", "lon,lat\n1,2\n"),
+    ("resolution=3", "a,b,c\n1,2,3\n"),
+    ("resolution=3&values=depth", "lon,lat\n1,2\n"),
+])
+def test_endpoint_errors(client, query, body):
+    response = client.post("/zones/aggregate?" + query, data=body, content_type="text/csv")
+    assert response.status_code == 400
+    assert response.mimetype == "application/json"
@@ -0,0 +1,149 @@
+import asyncio
+import pytest
+from app import app
+from asgi import ASGIApp, wsgi_environ
+
+LOOKUP = b'["R0", "R08", "Q45"]'
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def asgi_app(loop):
+    asgi_app = ASGIApp(processes=2)
+    yield asgi_app
+    asgi_app._stop()
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def _scope(method, path, query=b"", headers=()):
+    headers = (("Host", "localhost"),) + tuple(headers)
+    return {
+        "type": "http", "method": method, "path": path, "query_string": query, "scheme": "http",
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        "server": ("localhost", 5000), "client": ("127.0.0.1", 40000), "http_version": "1.1", "root_path": "",
+    }
+
+
+async def _fetch(asgi_app, method, path, query=b"", headers=(), body=b""):
+    # calls the ASGI app as a server would and returns its response's status, headers and body
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(_scope(method, path, query, headers), receive, send)
+    assert sent[0]["type"] == "http.response.start"
+    assert sent[-1]["type"] == "http.response.body" and not sent[-1].get("more_body")
+    return (
+        sent[0]["status"],
+        {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in sent[0]["headers"]},
+        b"".join(m.get("body", b"") for m in sent[1:]),
+    )
+
+
+@pytest.mark.parametrize("method,path,query,headers,body", [
+    ("GET", "/", b"", (), b""),
+    ("GET", "/about", b"", (), b""),
+    ("GET", "/collections", b"", (("Accept", "text/turtle"),), b""),
+    ("GET", "/object", b"uri=https://w3id.org/dggs/tb16pix/zone/R08&_profile=dggs", (), b""),
+    ("GET", "/object", b"uri=https://w3id.org/dggs/tb16pix/cell/R08", (), b""),
+    ("GET", "/collections/2/items", b"limit=5", (("Accept", "application/json"),), b""),
+    ("GET", "/collections/2/items/R08", b"", (("Accept", "application/n-triples"),), b""),
+    ("GET", "/zones/cover", b"resolution=3&bbox=130,-30,140,-20", (), b""),
+    ("POST", "/zones/lookup", b"", (("Content-Type", "application/json"),), LOOKUP),
+    ("GET", "/zones/lookup", b"", (), b""),
+    ("GET", "/nowhere", b"", (), b""),
+])
+def test_same_as_flask(loop, asgi_app, client, method, path, query, headers, body):
+    status, response_headers, content = loop.run_until_complete(_fetch(asgi_app, method, path, query, headers, body))
+    expected = client.open(path, method=method, query_string=query, headers=list(headers), data=body)
+    assert status == expected.status_code
+    for name in ("Content-Type", "Location", "Vary", "Link"):
+        assert response_headers.get(name.lower()) == expected.headers.get(name), name
+    assert content == expected.data
+
+
+def test_heavy_requests_run_in_processes(loop, asgi_app):
+    async def run():
+        # a cheap request isn't held up by a heavy one that's running
+        heavy = asyncio.ensure_future(_fetch(asgi_app, "GET", "/zones/cover", b"resolution=8&bbox=130,-30,135,-25"))
+        await asyncio.sleep(0.05)
+        status, _, _ = await _fetch(asgi_app, "GET", "/about")
+        assert status == 200 and not heavy.done(), "a heavy request finished before a cheap one"
+        status, _, content = await heavy
+        assert status == 200 and content.count(b"\n") > 1000
+        assert asgi_app.stats()["pending"] == 0
+
+    loop.run_until_complete(run())
+
+
+def test_queue_limit(loop):
+    asgi_app = ASGIApp(processes=1, queue_limit=2, retry_after=7)
+    accept = (("Accept", "application/json"),)
+
+    async def run():
+        return await asyncio.gather(*(
+            _fetch(asgi_app, "GET", "/zones/cover", b"resolution=7&bbox=130,-30,140,-20", accept) for _ in range(5)
+        ))
+
+    try:
+        responses = loop.run_until_complete(run())
+    finally:
+        asgi_app._stop()
+    assert sorted(status for status, _, _ in responses) == [200, 200, 503, 503, 503]
+    for status, headers, content in responses:
+        if status == 503:
+            assert headers["retry-after"] == "7" and headers["content-type"] == "application/json"
+    assert asgi_app.stats()["rejected"] == 3 and asgi_app.stats()["pending"] == 0
+
+
+def test_lifespan(loop):
+    asgi_app = ASGIApp(processes=1)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        if len(messages) == 1:
+            # started up, with its worker running
+            assert len(asgi_app._workers) == 1 and asgi_app._workers[0].process.is_alive()
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    loop.run_until_complete(asgi_app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert asgi_app._workers == [] and asgi_app._idle is None
+
+
+def test_websocket(loop):
+    with pytest.raises(ValueError):
+        loop.run_until_complete(ASGIApp(processes=1)({"type": "websocket"}, None, None))
+
+
+def test_wsgi_environ():
+    scope = dict(
+        _scope("GET", "/api/collections", b"a=1", (("Accept", "text/html"), ("X-A", "1"), ("X-A", "2"))),
+        root_path="/api"
+    )
+    environ = wsgi_environ(scope, b"body")
+    assert environ["SCRIPT_NAME"] == "/api" and environ["PATH_INFO"] == "/collections"
+    assert environ["QUERY_STRING"] == "a=1"
+    assert environ["CONTENT_LENGTH"] == "4"
+    assert environ["HTTP_ACCEPT"] == "text/html" and environ["HTTP_X_A"] == "1,2"
+    assert environ["SERVER_PORT"] == "5000" and environ["REMOTE_ADDR"] == "127.0.0.1"
+
@@ -0,0 +1,132 @@
+import json
+import random
+from itertools import product
+from math import pi
+import numpy as np
+import pytest
+from rhealpixdggs.dggs import Cell as RHEALPixCell
+from app import app
+from config import ATTRIBUTE_TABLE_RESOLUTION, TB16Pix, WGS84_TB16
+from grid import MAX_RESOLUTION, cell_id_from_index, cell_lonlat_bbox, num_cells
+from grid.attributes import (
+    ATTRIBUTE_COLUMNS, _compute_columns, attribute_table, build_attribute_tables, cell_area, cell_attributes,
+    grid_attributes, iter_attributes,
+)
+from grid.cells import suid_from_cell_id
+from grid.geometry import _DECIMALS
+
+
+def _cell_ids():
+    rng = random.Random(23)
+    # the polar caps, Cells on the antimeridian and either side of the table's finest resolution
+    cell_ids = ["N", "S", "N4", "S4", "N44", "P", "P1", "P4", "P7", "N5", "R08", "Q" + "4" * 7]
+    for r in (1, 2, 4, ATTRIBUTE_TABLE_RESOLUTION, ATTRIBUTE_TABLE_RESOLUTION + 1, 9):
+        cell_ids += [cell_id_from_index(rng.randrange(num_cells(r)), r) for _ in range(15)]
+    return cell_ids
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def test_area():
+    for r in range(MAX_RESOLUTION + 1):
+        assert cell_area(r) == pytest.approx(TB16Pix.cell_area(r, plane=False), rel=1e-12)
+    # equal-area, so the Cells at every resolution cover the ellipsoid's authalic sphere
+    assert num_cells(4) * cell_area(4) == pytest.approx(4 * pi * WGS84_TB16.R_A ** 2, rel=1e-12)
+
+
+@pytest.mark.parametrize("cell_id", _cell_ids())
+def test_cell_attributes(cell_id):
+    attributes = cell_attributes(cell_id)
+    assert attributes["area"] == cell_area(len(cell_id) - 1)
+    nucleus = RHEALPixCell(TB16Pix, suid_from_cell_id(cell_id)).nucleus(plane=False)
+    assert np.allclose(attributes["centroid"], nucleus, rtol=0, atol=10 ** -_DECIMALS)
+    assert np.allclose(attributes["bbox"], cell_lonlat_bbox(cell_id), rtol=0, atol=10 ** -_DECIMALS)
+
+
+def test_tables():
+    # the tables hold what is computed for each Cell
+    for r in range(4):
+        table = attribute_table(r)
+        assert sorted(table) == sorted(ATTRIBUTE_COLUMNS)
+        for column, values in zip(ATTRIBUTE_COLUMNS, _compute_columns(np.arange(num_cells(r)), r)):
+            assert np.array_equal(table[column], values), (r, column)
+    assert attribute_table(ATTRIBUTE_TABLE_RESOLUTION + 1) is None
+
+
+def test_build(tmp_path):
+    build_attribute_tables(str(tmp_path), 2, batch_size=7)
+    for r in range(3):
+        for column in ATTRIBUTE_COLUMNS:
+            built = np.load(str(tmp_path / str(r) / (column + ".npy")))
+            assert np.array_equal(built, attribute_table(r)[column]), (r, column)
+    assert not list(tmp_path.glob("**/*.tmp"))
+
+
+def test_grid_attributes():
+    index = [0, 5, 17, 53]
+    for r in (2, ATTRIBUTE_TABLE_RESOLUTION + 2):
+        values = grid_attributes(index, r, ("west", "north"))
+        assert sorted(values) == ["north", "west"]
+        computed = dict(zip(ATTRIBUTE_COLUMNS, _compute_columns(index, r)))
+        assert np.array_equal(values["west"], computed["west"]) and np.array_equal(values["north"], computed["north"])
+
+
+@pytest.mark.parametrize("zone_id,depth", [
+    ("Earth", 1),
+    ("Earth", 2),
+    ("R0", 2),
+    ("N", 1),
+    ("S44", ATTRIBUTE_TABLE_RESOLUTION - 2),
+    ("Q012", ATTRIBUTE_TABLE_RESOLUTION - 2),
+    ("P1234", 2),
+])
+def test_iter_attributes(zone_id, depth):
+    records = list(iter_attributes(zone_id, depth, batch_size=10))
+    # every descendant, in Grid order
+    if zone_id == "Earth":
+        expected = [b + "".join(d) for b in "NOPQRS" for d in product("012345678", repeat=depth - 1)]
+    else:
+        expected = [zone_id + "".join(d) for d in product("012345678", repeat=depth)]
+    assert [r["id"] for r in records] == expected
+    for record in records[::7]:
+        assert record == dict(id=record["id"], **cell_attributes(record["id"]))
+
+
+def test_endpoint(client):
+    response = client.get("/zones/R08/attributes")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["id"] == "R08" and body["area"] == cell_area(2)
+    assert body["centroid"] == list(cell_attributes("R08")["centroid"])
+    assert body["bbox"] == list(cell_attributes("R08")["bbox"])
+    earth = client.get("/zones/Earth/attributes").get_json()
+    assert earth["bbox"] == [-180, -90, 180, 90] and earth["area"] == pytest.approx(6 * cell_area(0))
+
+
+@pytest.mark.parametrize("query,resolution", [("depth=2", 4), ("resolution=6", 6)])
+def test_endpoint_descendants(client, query, resolution):
+    response = client.get("/zones/R08/attributes?" + query)
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 9 ** (resolution - 2)
+    expected = [
+        dict(r, centroid=list(r["centroid"]), bbox=list(r["bbox"])) for r in iter_attributes("R08", resolution - 2)
+    ]
+    assert records == expected
+
+
+@pytest.mark.parametrize("path", [
+    "/zones/X1/attributes",
+    "/zones/R08/attributes?depth=0",
+    "/zones/R08/attributes?depth=x",
+    "/zones/R08/attributes?resolution=1",
+    "/zones/R08/attributes?depth=1&resolution=3",
+    "/zones/R08/attributes?depth={}".format(MAX_RESOLUTION),
+])
+def test_endpoint_errors(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert response.mimetype == "application/json"
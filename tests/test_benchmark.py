@@ -0,0 +1,124 @@
+import threading
+import pytest
+from werkzeug.serving import make_server
+import benchmark
+from app import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+
+
+@pytest.mark.parametrize("name,path,mediatype", benchmark.cases())
+def test_cases(client, name, path, mediatype):
+    # every route benchmarked gives its mediatype, as a benchmark of an error page would be meaningless
+    response = benchmark._get(client, path, mediatype)
+    assert response.status_code == 200
+    assert response.get_data()
+
+
+def test_get_checks_the_response(client):
+    with pytest.raises(RuntimeError):
+        benchmark._get(client, "/collections/2/items/X1", benchmark.HTML)
+    with pytest.raises(RuntimeError):
+        benchmark._get(client, "/collections/2/items", benchmark.TURTLE)
+
+
+@pytest.mark.parametrize("values,p,expected", [
+    ([1], 50, 1),
+    ([1, 2, 3, 4], 50, 2),
+    (list(range(1, 101)), 95, 95),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 11)), 100, 10),
+])
+def test_percentile(values, p, expected):
+    assert benchmark._percentile(values, p) == expected
+
+
+def test_summary():
+    assert benchmark._summary([0.003, 0.001, 0.002]) == {
+        "n": 3, "p50_ms": 2.0, "p95_ms": 3.0, "p99_ms": 3.0, "mean_ms": 2.0
+    }
+
+
+def test_bench_routes(client, monkeypatch):
+    monkeypatch.setattr(benchmark, "ROUTES", benchmark.ROUTES[:2])
+    results = benchmark.bench_routes(client, requests=3, warmup=1)
+    assert sorted(results) == sorted(name for name, _, _ in benchmark.cases())
+    for summary in results.values():
+        assert summary["n"] == 3 and 0 < summary["p50_ms"] <= summary["p95_ms"]
+
+
+def test_bench_micro():
+    results = benchmark.bench_micro(repeats=2, number=5)
+    assert sorted(results) == ["calculate_children", "calculate_neighbours", "get_collections"]
+    for summary in results.values():
+        assert summary["n"] == 10 and 0 < summary["min_us"] <= summary["p50_us"]
+
+
+@pytest.mark.parametrize("target", ["test client", "server"])
+def test_bench_load(server, target):
+    def make_client():
+        return benchmark._HTTPClient(server) if target == "server" else benchmark._TestClient(app.test_client())
+
+    result = benchmark.bench_load(make_client, threads=3, seconds=0.5)
+    assert result["errors"] == 0
+    assert result["threads"] == 3
+    assert result["n"] > 0 and result["requests_per_second"] > 0
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+
+def test_bench_load_counts_errors():
+    # the server isn't there, so every request fails
+    result = benchmark.bench_load(lambda: benchmark._HTTPClient("http://127.0.0.1:9"), threads=2, seconds=0.2)
+    assert result["n"] == 0 and result["errors"] > 0
+
+
+BASELINE = {
+    "routes": {"item text/html": {"p50_ms": 10.0}},
+    "micro": {"get_collections": {"min_us": 100.0}},
+    "load": {"target": "test client", "p50_ms": 10.0, "p95_ms": 20.0, "requests_per_second": 100.0, "errors": 0},
+}
+
+
+def _result(route=10.0, micro=100.0, p50=10.0, p95=20.0, rps=100.0, errors=0, target="test client"):
+    return {
+        "routes": {"item text/html": {"p50_ms": route}, "new route": {"p50_ms": 1.0}},
+        "micro": {"get_collections": {"min_us": micro}},
+        "load": {"target": target, "p50_ms": p50, "p95_ms": p95, "requests_per_second": rps, "errors": errors},
+    }
+
+
+@pytest.mark.parametrize("result,regressions", [
+    (_result(), []),
+    (_result(route=12.4, micro=80.0, rps=81.0), []),
+    (_result(route=12.6), ["routes/item text/html p50_ms"]),
+    (_result(micro=130.0), ["micro/get_collections min_us"]),
+    (_result(p50=13.0, p95=30.0), ["load p50_ms", "load p95_ms"]),
+    (_result(rps=79.0), ["load requests_per_second"]),
+    (_result(errors=2), ["load: 2 errors"]),
+    # a load run on another target isn't comparable
+    (_result(rps=10.0, target="http://localhost:5000"), []),
+])
+def test_compare(result, regressions):
+    found = benchmark.compare(result, BASELINE, 0.25)
+    assert [r.split(":")[0] for r in found] == [r.split(":")[0] for r in regressions]
+
+
+def test_run_processes():
+    # the worker processes' results are combined into medians
+    result = benchmark.run_processes(2, ["micro"], 1, "none")
+    assert sorted(result) == ["micro"]
+    assert sorted(result["micro"]) == ["calculate_children", "calculate_neighbours", "get_collections"]
+    for summary in result["micro"].values():
+        assert summary["n"] == 7 * 2000 and 0 < summary["min_us"] <= summary["p50_us"]
@@ -0,0 +1,87 @@
+import sqlite3
+import pytest
+import caching
+from app import app
+from caching import DiskResponseCache, MemoryResponseCache
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("mediatype", ["text/turtle", "text/html"])
+def test_pages_have_their_own_etags(client, mediatype):
+    first = client.get("/collections?per_page=3&page=1&_mediatype=" + mediatype)
+    second = client.get("/collections?per_page=3&page=2&_mediatype=" + mediatype)
+    assert first.status_code == second.status_code == 200
+    assert first.headers["ETag"] != second.headers["ETag"]
+    # page 1's ETag doesn't validate page 2, but validates page 1
+    response = client.get(
+        "/collections?per_page=3&page=2&_mediatype=" + mediatype, headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert response.status_code == 200
+    response = client.get(
+        "/collections?per_page=3&page=1&_mediatype=" + mediatype, headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+
+@pytest.fixture(params=["memory", "disk"])
+def response_cache(request, monkeypatch, tmp_path):
+    cache = MemoryResponseCache(1 << 20) if request.param == "memory" else \
+        DiskResponseCache(str(tmp_path / "responses.sqlite"), 1 << 20)
+    monkeypatch.setattr(caching, "RESPONSE_CACHE_STORE", cache)
+    return cache
+
+
+@pytest.mark.parametrize("mediatype", ["text/turtle", "application/ld+json"])
+def test_pages_are_cached_separately(client, response_cache, mediatype):
+    paths = ["/collections?per_page=3&page={}&_mediatype={}".format(page, mediatype) for page in (1, 2)]
+    first, second = (client.get(path).get_data() for path in paths)
+    assert first != second
+    assert response_cache.stores == 2
+    # both are now served from the cache, each with its own body
+    assert [client.get(path).get_data() for path in paths] == [first, second]
+    assert response_cache.hits == 2
+
+
+class _FailingConnection:
+    # an SQLite connection whose statements starting with fail raise an error
+    def __init__(self, conn, fail):
+        self._conn = conn
+        self._fail = fail
+
+    def execute(self, sql, *args):
+        if sql.strip().startswith(self._fail):
+            raise sqlite3.OperationalError("disk I/O error")
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@pytest.mark.parametrize("method,fail", [
+    ("get", "DELETE FROM responses WHERE version"),  # inside _check_version()'s transaction
+    ("put", "DELETE FROM responses WHERE version"),
+    ("put", "INSERT OR REPLACE"),
+])
+def test_disk_cache_errors_roll_back(tmp_path, method, fail):
+    path = str(tmp_path / "responses.sqlite")
+    cache = DiskResponseCache(path, 1 << 20)
+    conn = cache._connection()
+    cache._local.conn = _FailingConnection(conn, fail)
+    if method == "get":
+        assert cache.get("key", "v1") is None
+    else:
+        cache.put("key", "v1", b"body", [])
+    assert cache.errors == 1
+    assert not conn.in_transaction
+    # the write lock is free for other processes
+    other = sqlite3.connect(path, timeout=0, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("ROLLBACK")
+    # and the cache works once the errors stop
+    cache._local.conn = conn
+    cache.put("key", "v1", b"body", [])
+    assert cache.get("key", "v1") == (b"body", [])
@@ -0,0 +1,71 @@
+import json
+import subprocess
+import sys
+import pytest
+import coldstart
+from app import app
+from utils import markdown_html
+
+# modules that take most of the start-up time and are only imported when they are first needed
+LAZY_MODULES = ["rhealpixdggs.dggs", "scipy", "markdown", "rdflib.plugins.sparql.parser"]
+
+
+def _fresh(code):
+    # runs code in a fresh process in the app's directory and returns what it prints, as JSON
+    process = subprocess.run(
+        [sys.executable, "-c", code], cwd=coldstart.APP_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def test_heavy_imports_are_lazy():
+    imported = _fresh(
+        "import json, sys\n"
+        "import app\n"
+        "lazy = {!r}\n"
+        "before = [m for m in lazy if m in sys.modules]\n"
+        "client = app.app.test_client()\n"
+        "client.get('/about')\n"
+        "client.get('/sparql?query=ASK%20%7B%7D')\n"
+        "import config\n"
+        "config.TB16Pix\n"
+        "print(json.dumps([before, [m for m in lazy if m in sys.modules]]))\n".format(LAZY_MODULES)
+    )
+    assert imported == [[], LAZY_MODULES]
+
+
+def test_static_html_is_made_once():
+    client = app.test_client()
+    client.get("/about")
+    client.get("/")
+    misses = markdown_html.cache_info().misses
+    for _ in range(3):
+        assert client.get("/about").status_code == 200
+        assert client.get("/").status_code == 200
+    assert markdown_html.cache_info().misses == misses
+
+
+def test_status_reports_startup():
+    client = app.test_client()
+    client.get("/")
+    startup = client.get("/status").get_json()["startup"]
+    assert startup["import_seconds"] > 0
+    assert startup["first_request_seconds"] > 0
+    assert startup["first_request"]
+
+
+def test_run_once():
+    result = coldstart.run_once(["/", "/about"])
+    assert result["import_seconds"] > 0
+    for latencies in (result["first"], result["second"]):
+        assert [status for status, _ in latencies.values()] == [200, 200]
+    assert "app" in result["modules"]
+    assert result["modules"]["app"] >= max(t for m, t in result["modules"].items() if m.startswith("utils"))
+
+
+@pytest.mark.parametrize("stderr,expected", [
+    ("import time: self [us] | cumulative | imported package\nimport time:  5 |  1500 | app\n", {"app": 0.0015}),
+    ("import time: 12 | 34 |   grid.cells\nsomething else\n", {"grid.cells": 0.000034}),
+])
+def test_importtimes(stderr, expected):
+    assert coldstart._importtimes(stderr) == expected
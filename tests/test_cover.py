@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from grid import (
+    cell_ids_from_points,
+    compact_cell_ids,
+    iter_cell_ids,
+    iter_cover,
+    region_from_bbox,
+    region_from_geojson,
+)
+
+REGIONS = {
+    "bbox": region_from_bbox((130.0, -30.0, 140.0, -20.0)),
+    "antimeridian": region_from_bbox((170.0, -10.0, -170.0, 10.0)),
+    "north pole": region_from_bbox((-180.0, 80.0, 180.0, 90.0)),
+    "polar edge": region_from_bbox((-60.0, 35.0, 10.0, 55.0)),
+    "polygon with a hole": region_from_geojson({
+        "type": "Polygon",
+        "coordinates": [
+            [[0, 0], [40, 0], [40, 40], [0, 40], [0, 0]],
+            [[10, 10], [30, 10], [30, 30], [10, 30], [10, 10]],
+        ],
+    }),
+}
+
+
+def _random_points(region, n=20000, seed=10):
+    # points of the region, from a sample of its bbox
+    rng = np.random.default_rng(seed)
+    west, south, east, north = region.bbox
+    lon, lat = rng.uniform(west, east, n), rng.uniform(south, north, n)
+    inside = np.array([region.contains_point(x, y) for x, y in zip(lon, lat)])
+    return lon[inside], lat[inside]
+
+
+def _expand(cell_ids, resolution):
+    # Cells of mixed resolutions as their descendants at a resolution
+    expanded = []
+    for cell_id in cell_ids:
+        depth = resolution - len(cell_id) + 1
+        expanded += [
+            cell_id + "".join(str(d // 9 ** i % 9) for i in range(depth - 1, -1, -1)) for d in range(9 ** depth)
+        ]
+    return expanded
+
+
+@pytest.mark.parametrize("name", REGIONS)
+@pytest.mark.parametrize("resolution", [1, 3])
+def test_cover_matches_relating_every_cell(name, resolution):
+    region = REGIONS[name]
+    expected = [cell_id for cell_id in iter_cell_ids(resolution) if region.relate(cell_id) != "outside"]
+    assert list(iter_cover(region, resolution)) == expected
+
+
+@pytest.mark.parametrize("name", REGIONS)
+def test_cover_contains_the_region(name):
+    region = REGIONS[name]
+    cover = set(iter_cover(region, 4))
+    lon, lat = _random_points(region)
+    assert len(lon)
+    assert set(cell_ids_from_points(lon, lat, 4).tolist()) <= cover
+
+
+@pytest.mark.parametrize("name", REGIONS)
+@pytest.mark.parametrize("resolution", [2, 4])
+def test_compact(name, resolution):
+    region = REGIONS[name]
+    cover = list(iter_cover(region, resolution))
+    compact = list(iter_cover(region, resolution, compact=True))
+    assert compact == list(compact_cell_ids(cover))
+    assert _expand(compact, resolution) == cover
+    assert len(set(compact)) == len(compact)
+    # no complete set of siblings is left
+    parents = {}
+    for cell_id in compact:
+        if len(cell_id) > 1:
+            parents[cell_id[:-1]] = parents.get(cell_id[:-1], 0) + 1
+    assert max(parents.values(), default=0) < 9
+
+
+def test_compact_whole_grid():
+    assert list(compact_cell_ids(iter_cell_ids(2))) == list("NOPQRS")
+    assert list(compact_cell_ids(["R00", "R01", "R02", "R03", "R04", "R05", "R06", "R07", "R08", "R1"])) == ["R0", "R1"]
+
+
+@pytest.mark.parametrize("geojson", [
+    {"type": "Point", "coordinates": [0, 0]},
+    {"type": "Polygon", "coordinates": [[[0, 0], [1, 1]]]},
+    {"type": "Polygon", "coordinates": [[[0, 0], [200, 0], [0, 1], [0, 0]]]},
+    {"type": "FeatureCollection", "features": []},
+])
+def test_invalid_regions(geojson):
+    with pytest.raises(ValueError):
+        region_from_geojson(geojson)
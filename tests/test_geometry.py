@@ -0,0 +1,78 @@
+import random
+import numpy as np
+import pytest
+from rhealpixdggs.dggs import Cell as RHEALPixCell
+from app import app
+from config import TB16Pix
+from grid import cell_id_from_index, cell_points, index_from_cell_id, num_cells
+from grid.cells import suid_from_cell_id
+from grid.geometry import _compute_points, cell_geojson, geojson_wkt
+
+
+def _cell_ids():
+    rng = random.Random(11)
+    cell_ids = ["N", "S", "N4", "S44", "R08", "O0", "Q8", "P" + "6" * 8]
+    for r in (1, 3, 5, 7, 12):
+        cell_ids += [cell_id_from_index(rng.randrange(num_cells(r)), r) for _ in range(20)]
+    return cell_ids
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def test_points_match_rhealpixdggs():
+    cell_ids = _cell_ids()
+    points = cell_points(cell_ids)
+    for cell_id, p in zip(cell_ids, points):
+        cell = RHEALPixCell(TB16Pix, suid_from_cell_id(cell_id))
+        # rhealpixdggs starts some polar Cells' vertices at another corner, so they are compared in lon/lat order
+        vertices = sorted(tuple(float(x) for x in v) for v in cell.vertices(plane=False))
+        assert np.allclose(sorted(tuple(v) for v in p[:4]), vertices, rtol=0, atol=1e-9), cell_id
+        assert np.allclose(p[4], cell.nucleus(plane=False), rtol=0, atol=1e-9), cell_id
+
+
+def test_table_matches_computed():
+    # the table's points, for coarse Cells, are those computed for finer ones
+    for r in range(4):
+        index = np.arange(num_cells(r))
+        assert np.array_equal(cell_points([cell_id_from_index(i, r) for i in index]), _compute_points(index, r))
+
+
+def test_geometries():
+    assert cell_geojson("R08")["type"] == "Polygon"
+    assert len(cell_geojson("R08")["coordinates"][0]) == 5
+    assert geojson_wkt(cell_geojson("R08")).startswith("POLYGON ((")
+    # the north polar cap is closed along the antimeridian and the pole
+    assert [180.0, 90.0] in cell_geojson("N4")["coordinates"][0]
+    # Cells that cross the antimeridian are split there
+    for cell_id in ("P", "P1", "P4", "P7", "N5"):
+        assert cell_geojson(cell_id)["type"] == "MultiPolygon"
+        for polygon in cell_geojson(cell_id)["coordinates"]:
+            lons = [lon for lon, _ in polygon[0]]
+            assert -180 <= min(lons) and max(lons) <= 180 and (min(lons) == -180 or max(lons) == 180)
+
+
+@pytest.mark.parametrize("cell_id", ["X12", "R9", "R08a", "", "r08"])
+def test_invalid_cell_ids(cell_id):
+    with pytest.raises(ValueError):
+        index_from_cell_id(cell_id)
+
+
+def test_item(client):
+    response = client.get("/collections/2/items/R08?_mediatype=application/geo+json")
+    assert response.status_code == 200
+    assert response.get_json()["geometry"] == cell_geojson("R08")
+
+
+@pytest.mark.parametrize("path", [
+    "/collections/3/items/R9",
+    "/collections/3/items/X12",
+    "/collections/3/items/R01",
+    "/collections/1/items/R012",
+    "/collections/3/items/R012x",
+    "/object?uri=https://w3id.org/dggs/tb16pix/cell/X12",
+])
+def test_unknown_items(client, path):
+    assert client.get(path, follow_redirects=True).status_code == 404
@@ -0,0 +1,116 @@
+import json
+import pytest
+from app import app
+from config import URI_BASE_ZONE
+from grid import CELLS0, MAX_RESOLUTION, iter_ancestors, iter_descendants
+from utils import calculate_children
+
+
+def _walk(zone_id, depth, leaves_only=False):
+    # a Zone's descendants by recursing through calculate_children(), each Zone before its children
+    if depth == 0:
+        return []
+    zone_ids = []
+    for _, child in calculate_children(zone_id):
+        if depth == 1 or not leaves_only:
+            zone_ids.append(child)
+        zone_ids += _walk(child, depth - 1, leaves_only)
+    return zone_ids
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("leaves_only", [False, True])
+@pytest.mark.parametrize("zone_id,depth", [
+    ("R", 1), ("R", 3), ("N4", 2), ("S888", 3), ("O31", 0), ("Earth", 1), ("Earth", 3),
+    ("P" + "8" * (MAX_RESOLUTION - 2), 2), ("Q" + "0" * (MAX_RESOLUTION - 1), 1),
+])
+def test_descendants(zone_id, depth, leaves_only):
+    zone_ids = list(iter_descendants(zone_id, depth, leaves_only))
+    assert zone_ids == _walk(zone_id, depth, leaves_only)
+    if zone_id != "Earth":
+        assert zone_ids == sorted(zone_ids)
+    # Earth has 6 children and every Zone 9
+    counts = [0] + [6 * 9 ** (d - 1) if zone_id == "Earth" else 9 ** d for d in range(1, depth + 1)]
+    assert len(zone_ids) == (counts[-1] if leaves_only else sum(counts))
+
+
+def test_descendants_cross_batches():
+    # R's resolution 5 descendants span several batches of Grid indices
+    zone_ids = list(iter_descendants("R", 5, leaves_only=True))
+    assert len(zone_ids) == 9 ** 5
+    assert zone_ids[0] == "R00000" and zone_ids[-1] == "R88888"
+    assert zone_ids == sorted(zone_ids)
+    assert all(len(zone_id) == 6 and zone_id.startswith("R") for zone_id in zone_ids)
+
+
+@pytest.mark.parametrize("zone_id,depth", [
+    ("R", -1), ("R", MAX_RESOLUTION + 1), ("R0", MAX_RESOLUTION), ("Earth", MAX_RESOLUTION + 2),
+    ("S" + "8" * MAX_RESOLUTION, 1),
+])
+def test_descendants_too_deep(zone_id, depth):
+    with pytest.raises(ValueError):
+        list(iter_descendants(zone_id, depth))
+
+
+def test_ancestors():
+    assert list(iter_ancestors("R083")) == ["R08", "R0", "R", "Earth"]
+    assert list(iter_ancestors("N")) == ["Earth"]
+    assert list(iter_ancestors("Earth")) == []
+    finest = "S" + "8" * MAX_RESOLUTION
+    assert len(list(iter_ancestors(finest))) == MAX_RESOLUTION + 1
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_descendants_endpoint(client):
+    response = client.get("/zones/R08/descendants?depth=2")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    records = _ndjson(response)
+    assert [r["id"] for r in records] == _walk("R08", 2)
+    assert records[0] == {"id": "R080", "uri": URI_BASE_ZONE + "R080", "resolution": 3, "parent": "R08"}
+
+    leaves = _ndjson(client.get("/zones/R08/descendants?resolution=4&leaves=true"))
+    assert [r["id"] for r in leaves] == _walk("R08", 2, leaves_only=True)
+
+    assert [r["id"] for r in _ndjson(client.get("/zones/Earth/descendants"))] == list(CELLS0)
+
+
+def test_descendants_endpoint_ntriples(client):
+    response = client.get("/zones/N4/descendants", headers={"Accept": "application/n-triples"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/n-triples"
+    assert response.get_data(as_text=True).splitlines() == [
+        "<{}N4> <http://www.opengis.net/ont/geosparql#sfContains> <{}N4{}> .".format(URI_BASE_ZONE, URI_BASE_ZONE, c)
+        for c in range(9)
+    ]
+
+
+def test_ancestors_endpoint(client):
+    records = _ndjson(client.get("/zones/R083/ancestors"))
+    assert [r["id"] for r in records] == ["R08", "R0", "R", "Earth"]
+    assert records[-1] == {"id": "Earth", "uri": URI_BASE_ZONE + "Earth", "resolution": None, "parent": None}
+    response = client.get("/zones/R0/ancestors", headers={"Accept": "application/n-triples"})
+    assert response.get_data(as_text=True).splitlines() == [
+        "<{0}R0> <http://www.opengis.net/ont/geosparql#sfWithin> <{0}{1}> .".format(URI_BASE_ZONE, z)
+        for z in ("R", "Earth")
+    ]
+
+
+@pytest.mark.parametrize("path", [
+    "/zones/X1/descendants",
+    "/zones/R/descendants?depth=0",
+    "/zones/R/descendants?depth=x",
+    "/zones/R/descendants?depth={}".format(MAX_RESOLUTION + 1),
+    "/zones/R/descendants?resolution=0",
+    "/zones/R/descendants?depth=1&resolution=2",
+    "/zones/X1/ancestors",
+])
+def test_invalid_requests(client, path):
+    assert client.get(path).status_code == 400
@@ -0,0 +1,77 @@
+import json
+import pytest
+from app import app
+from config import URI_BASE_CELL, URI_BASE_ZONE
+from grid import MAX_RESOLUTION
+from utils import calculate_children, calculate_neighbours, calculate_parent, is_zone_id, iter_zone_records
+
+ZONE_IDS = ["R08", "N", "S" + "8" * MAX_RESOLUTION, "Earth", "X1", "R9", "R" + "0" * (MAX_RESOLUTION + 1), "O3"]
+
+
+def _record(zone_id):
+    # a Zone's record from the per-Zone functions
+    if not is_zone_id(zone_id):
+        return {"id": zone_id, "error": "Not a TB16Pix Zone ID"}
+    parent = calculate_parent(zone_id)
+    children = calculate_children(zone_id)
+    return {
+        "id": zone_id,
+        "uri": str(URI_BASE_ZONE[zone_id]),
+        "parent": parent[1] if parent is not None else None,
+        "children": [c[1] for c in children] if children is not None else [],
+        "neighbours": dict((d, z) for d, z in calculate_neighbours(zone_id)) if zone_id != "Earth" else None,
+        "defaultGeometry": str(URI_BASE_CELL[zone_id]),
+    }
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def test_is_zone_id():
+    assert is_zone_id("Earth") and is_zone_id("R08") and is_zone_id("S" + "8" * MAX_RESOLUTION)
+    assert not is_zone_id("R" + "0" * (MAX_RESOLUTION + 1))
+    assert not any(is_zone_id(zone_id) for zone_id in ["", "X1", "R9", "r08", "R08 "])
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 1000])
+def test_records(batch_size):
+    assert list(iter_zone_records(iter(ZONE_IDS), batch_size=batch_size)) == [_record(z) for z in ZONE_IDS]
+
+
+@pytest.mark.parametrize("data,content_type", [
+    (json.dumps(ZONE_IDS), "application/json"),
+    (json.dumps({"zones": ZONE_IDS}), "application/json"),
+    ("\n".join(json.dumps(z) for z in ZONE_IDS), "application/x-ndjson"),
+    ("\n".join(json.dumps({"id": z}) for z in ZONE_IDS), "application/x-ndjson"),
+    ("\n".join(ZONE_IDS) + "\n", "text/plain"),
+])
+def test_lookup_endpoint(client, data, content_type):
+    response = client.post("/zones/lookup", data=data, content_type=content_type)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert _ndjson(response) == [_record(z) for z in ZONE_IDS]
+
+
+def test_lookup_fields(client):
+    response = client.post("/zones/lookup?fields=parent,geometry", json=["R08", "N"])
+    assert _ndjson(response) == [
+        {"id": "R08", "uri": str(URI_BASE_ZONE.R08), "parent": "R0", "defaultGeometry": str(URI_BASE_CELL.R08)},
+        {"id": "N", "uri": str(URI_BASE_ZONE.N), "parent": "Earth", "defaultGeometry": str(URI_BASE_CELL.N)},
+    ]
+
+
+@pytest.mark.parametrize("path,data", [
+    ("/zones/lookup?fields=parent,colour", json.dumps(["R08"])),
+    ("/zones/lookup", "[\"R08\""),
+    ("/zones/lookup", json.dumps({"ids": ["R08"]})),
+])
+def test_invalid_lookups(client, path, data):
+    response = client.post(path, data=data, content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["status"] == 400
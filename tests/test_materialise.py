@@ -0,0 +1,97 @@
+import glob
+import gzip
+import os
+import pytest
+from rdflib import BNode, Graph, URIRef
+from rdflib.namespace import RDF
+from rdflib.compare import isomorphic
+from app import app
+from config import URI_BASE_CELL, URI_BASE_ZONE
+from grid import num_cells
+from materialise import materialise
+
+
+def _files(output):
+    return sorted(os.path.relpath(p, output) for p in glob.glob(os.path.join(output, "**", "*.nt*"), recursive=True))
+
+
+def _read(path):
+    with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as f:
+        return f.read()
+
+
+def _dump(output):
+    return {name: _read(os.path.join(output, name)) for name in _files(output)}
+
+
+def _about(graph, uris):
+    # the triples about the given resources, with those about the blank nodes they refer to
+    about = Graph()
+    for uri in uris:
+        for p, o in graph.predicate_objects(URIRef(uri)):
+            about.add((URIRef(uri), p, o))
+            if isinstance(o, BNode):
+                for triple in graph.triples((o, None, None)):
+                    about.add(triple)
+    return about
+
+
+@pytest.fixture(scope="module")
+def dump(tmp_path_factory):
+    output = str(tmp_path_factory.mktemp("dump"))
+    assert materialise(output, 2, workers=2, chunk_depth=1) == (6 + 6 + 54, 0)
+    return output
+
+
+def test_layout(dump):
+    assert _files(dump) == sorted(
+        ["earth.nt"] + ["0/{}.nt".format(b) for b in "NOPQRS"] + ["1/{}.nt".format(b) for b in "NOPQRS"] +
+        ["2/{}{}.nt".format(b, d) for b in "NOPQRS" for d in range(9)]
+    )
+
+
+def test_triples_are_the_apis(dump):
+    graph = Graph()
+    for content in _dump(dump).values():
+        graph.parse(data=content.decode("utf-8"), format="nt")
+    client = app.test_client()
+    for zone_id in ("Earth", "N", "R", "R0", "S4", "R08", "N44", "P26"):
+        expected = Graph()
+        paths = ["/object?uri={}&".format(URI_BASE_ZONE[zone_id])]
+        if zone_id != "Earth":
+            paths.append("/collections/{}/items/{}?".format(len(zone_id) - 1, zone_id))
+        for path in paths:
+            response = client.get(path + "_mediatype=application/n-triples")
+            assert response.status_code == 200
+            expected.parse(data=response.get_data(as_text=True), format="nt")
+        uris = [URI_BASE_ZONE[zone_id]] + ([URI_BASE_CELL[zone_id]] if zone_id != "Earth" else [])
+        assert isomorphic(_about(graph, uris), expected), zone_id
+    # every Zone and Cell of the Grids is there
+    typed = set(s for s in graph.subjects(RDF.type, None) if isinstance(s, URIRef))
+    assert len(typed) == 1 + 2 * sum(num_cells(r) for r in range(3))
+
+
+def test_deterministic_and_gzip(dump, tmp_path):
+    one = str(tmp_path / "one")
+    zipped = str(tmp_path / "zipped")
+    materialise(one, 2, workers=1, chunk_depth=1, batch_size=7)
+    materialise(zipped, 2, workers=3, chunk_depth=1, compress=True)
+    assert _dump(one) == _dump(dump)
+    assert {name[:-3]: content for name, content in _dump(zipped).items()} == _dump(dump)
+    # gzip files have no name or time in them, so the same content always makes the same bytes
+    zipped_again = str(tmp_path / "zipped_again")
+    materialise(zipped_again, 2, workers=2, chunk_depth=1, compress=True)
+    for name in _files(zipped):
+        assert open(os.path.join(zipped, name), "rb").read() == open(os.path.join(zipped_again, name), "rb").read()
+
+
+def test_resume(dump, tmp_path):
+    output = str(tmp_path / "resumed")
+    materialise(output, 2, workers=2, chunk_depth=1)
+    os.remove(os.path.join(output, "2", "R0.nt"))
+    os.remove(os.path.join(output, "earth.nt"))
+    with open(os.path.join(output, "2", "R1.nt.1234.tmp"), "w") as f:
+        f.write("<a> <b> ")  # left by an interrupted run
+    assert materialise(output, 2, workers=2, chunk_depth=1) == (1, 6 + 6 + 53)
+    assert _dump(output) == _dump(dump)
+    assert not glob.glob(os.path.join(output, "**", "*.tmp"), recursive=True)
@@ -0,0 +1,125 @@
+import os
+import subprocess
+import sys
+import pytest
+import caching
+import coldstart
+from app import app
+from metrics import BUCKETS, Histograms, exposition
+
+ITEM = "/collections/<string:collection_id>/items/<string:item_id>"
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def _timings(response):
+    # the Server-Timing header's {phase: milliseconds}
+    timings = {}
+    for timing in response.headers["Server-Timing"].split(", "):
+        name, duration = timing.split(";dur=")
+        timings[name] = float(duration)
+    return timings
+
+
+def _samples(text):
+    # the exposition's {metric{labels}: value}
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line[:1] != "#"}
+
+
+@pytest.mark.parametrize("path,mediatype,phases", [
+    ("/collections/2/items/R08", "text/turtle", ["graph", "conneg", "model", "triples", "serialize", "render"]),
+    ("/collections/2/items/R08", "text/html", ["graph", "conneg", "model", "template", "render"]),
+    ("/object?uri=https://w3id.org/dggs/tb16pix/zone/R08", "application/n-triples",
+     ["graph", "conneg", "model", "triples", "serialize", "render"]),
+    ("/collections/2/items/X1", "text/html", ["graph", "template"]),
+])
+def test_server_timing(client, monkeypatch, path, mediatype, phases):
+    # rendered each time, rather than from the response cache
+    monkeypatch.setattr(caching, "RESPONSE_CACHE_STORE", None)
+    timings = _timings(client.get(path, headers={"Accept": mediatype}))
+    assert list(timings)[-1] == "total"
+    assert set(phases) <= set(timings)
+    for name, duration in timings.items():
+        assert 0 <= duration <= timings["total"], name
+
+
+def test_server_timing_cached(client):
+    client.get("/collections/3/items/R012", headers={"Accept": "text/turtle"})
+    timings = _timings(client.get("/collections/3/items/R012", headers={"Accept": "text/turtle"}))
+    assert "cache" in timings and "render" not in timings and "serialize" not in timings
+
+
+def test_metrics(client):
+    client.get("/collections/2/items/R08", headers={"Accept": "text/turtle"})
+    before = _samples(client.get("/metrics").get_data(as_text=True))
+    for _ in range(3):
+        client.get("/collections/2/items/R08", headers={"Accept": "text/turtle"})
+    client.get("/collections/2/items/X1")
+    response = client.get("/metrics")
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    after = _samples(text)
+    labels = 'route="{}",mediatype="text/turtle",status="200"'.format(ITEM)
+    count = "dggs_request_duration_seconds_count{{{}}}".format(labels)
+    assert after[count] == before[count] + 3
+    assert after["dggs_request_duration_seconds_sum{{{}}}".format(labels)] > 0
+    assert 'mediatype="text/html",status="404"' in text
+    # the buckets are cumulative and end with all of them
+    buckets = [after['dggs_request_duration_seconds_bucket{{{},le="{}"}}'.format(labels, b)] for b in BUCKETS]
+    buckets.append(after['dggs_request_duration_seconds_bucket{{{},le="+Inf"}}'.format(labels)])
+    assert buckets == sorted(buckets) and buckets[-1] == after[count]
+    phase_count = 'dggs_request_phase_duration_seconds_count{phase="cache"}'
+    assert after[phase_count] == before[phase_count] + 3
+    for cache in ("geometry", "negotiation"):
+        hits = after['dggs_cache_hits_total{{cache="{}"}}'.format(cache)]
+        misses = after['dggs_cache_misses_total{{cache="{}"}}'.format(cache)]
+        ratio = after['dggs_cache_hit_ratio{{cache="{}"}}'.format(cache)]
+        assert ratio == pytest.approx(hits / (hits + misses) if hits + misses else 0, abs=1e-6)
+    assert after["dggs_graph_triples"] > 0
+
+
+def test_histograms():
+    histograms = Histograms("h", "Help", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histograms.observe(('/a"b',), seconds)
+    histograms.observe(("/c",), 0.5)
+    assert list(histograms.lines()) == [
+        "# HELP h Help",
+        "# TYPE h histogram",
+        'h_bucket{route="/a\\"b",le="0.1"} 2',
+        'h_bucket{route="/a\\"b",le="1.0"} 3',
+        'h_bucket{route="/a\\"b",le="+Inf"} 4',
+        'h_count{route="/a\\"b"} 4',
+        'h_sum{route="/a\\"b"} 2.65',
+        'h_bucket{route="/c",le="0.1"} 0',
+        'h_bucket{route="/c",le="1.0"} 1',
+        'h_bucket{route="/c",le="+Inf"} 1',
+        'h_count{route="/c"} 1',
+        'h_sum{route="/c"} 0.5',
+    ]
+
+
+def test_exposition():
+    samples = _samples(exposition([("a", 3, 1), ("b", 0, 0)], [("g", "A gauge", 7)]))
+    assert samples['dggs_cache_hits_total{cache="a"}'] == 3
+    assert samples['dggs_cache_misses_total{cache="a"}'] == 1
+    assert samples['dggs_cache_hit_ratio{cache="a"}'] == 0.75
+    assert samples['dggs_cache_hit_ratio{cache="b"}'] == 0
+    assert samples["g"] == 7
+
+
+def test_metrics_off():
+    code = (
+        "from app import app\n"
+        "client = app.test_client()\n"
+        "response = client.get('/collections/2/items/R08')\n"
+        "print(response.status_code, 'Server-Timing' in response.headers, client.get('/metrics').status_code)\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code], cwd=coldstart.APP_DIR, capture_output=True, text=True, check=True,
+        env=dict(os.environ, METRICS="0")
+    )
+    assert process.stdout.strip().splitlines()[-1].split() == ["200", "False", "404"]
@@ -0,0 +1,85 @@
+from itertools import product
+import pytest
+from flask import request
+from pyldapi import Renderer
+from pyldapi.exceptions import ProfilesMediatypesException
+from app import app
+from model import CellRenderer, DatasetRenderer, ZoneRenderer, negotiate
+from model.profiles import DATASET_PROFILES, DGGS_PROFILES
+
+ACCEPTS = [
+    None,
+    "text/html",
+    "text/turtle",
+    "application/ld+json, text/html;q=0.5",
+    "text/turtle;q=0.2, application/rdf+xml;q=0.9",
+    "application/json",
+    "image/png",
+    "*/*",
+]
+ARGS = [
+    {},
+    {"_profile": "dggs"},
+    {"_profile": "dcat"},
+    {"_profile": "alt"},
+    {"_profile": "nonsense"},
+    {"_mediatype": "text/turtle"},
+    {"_mediatype": "application/n-triples", "_profile": "alt"},
+    {"_mediatype": "image/png"},
+    {"_view": "alt", "_format": "application/ld+json"},
+    {"_lang": "en"},
+]
+OTHER_HEADERS = [
+    {},
+    {"Accept-Profile": "<https://w3id.org/dggs/tb16pix/spec>"},
+    {"Accept-Profile": "<http://www.w3.org/ns/dx/conneg/altr>;q=0.9, <https://www.w3.org/TR/vocab-dcat/>"},
+    {"Accept-Language": "en-AU, fr;q=0.5"},
+    {"Accept-Profile": "not a profile URI"},
+]
+RENDERERS = [
+    (ZoneRenderer, ("R08",), "https://w3id.org/dggs/tb16pix/zone/R08", DGGS_PROFILES, "dggs"),
+    (CellRenderer, ("R08",), "https://w3id.org/dggs/tb16pix/cell/R08", DGGS_PROFILES, "dggs"),
+    (DatasetRenderer, (), "https://w3id.org/dggs/tb16pix", DATASET_PROFILES, "dcat"),
+]
+
+
+def _negotiated(renderer):
+    return (
+        renderer.vf_error, renderer.profile, renderer.mediatype, renderer.language,
+        renderer.headers if renderer.vf_error is None else None,
+    )
+
+
+@pytest.mark.parametrize("renderer,args,uri,profiles,default", RENDERERS)
+@pytest.mark.parametrize("accept", ACCEPTS)
+def test_same_as_pyldapi(renderer, args, uri, profiles, default, accept):
+    for values, headers in product(ARGS, OTHER_HEADERS):
+        headers = dict(headers, Accept=accept) if accept is not None else headers
+        with app.test_request_context("/", query_string=values, headers=headers):
+            expected = _negotiated(Renderer(request, uri, dict(profiles), default))
+            # once when it's worked out and again from the cache
+            assert _negotiated(renderer(request, *args)) == expected, (values, headers)
+            assert _negotiated(renderer(request, *args)) == expected, (values, headers)
+
+
+def test_cached():
+    with app.test_request_context("/", query_string={"_profile": "alt"}, headers={"Accept": "text/turtle"}):
+        ZoneRenderer(request, "R0")
+        hits = negotiate.cache_info().hits
+        # the same conneg arguments and headers for another resource, with others that don't matter
+        with app.test_request_context(
+            "/?_profile=alt&page=2", headers={"Accept": "text/turtle", "X-Other": "1"}
+        ):
+            renderer = ZoneRenderer(request, "S44")
+        assert negotiate.cache_info().hits == hits + 1
+        assert renderer.headers["Link"].count("https://w3id.org/dggs/tb16pix/zone/S44") > 1
+        assert "zone/R0>" not in renderer.headers["Link"]
+
+
+@pytest.mark.parametrize("headers", [{"Accept": "text/html;q=high"}, {"Accept-Language": "en;q=x"}])
+def test_malformed_headers(headers):
+    with app.test_request_context("/", headers=headers):
+        with pytest.raises(ProfilesMediatypesException):
+            Renderer(request, "https://w3id.org/dggs/tb16pix/zone/R08", dict(DGGS_PROFILES), "dggs")
+        with pytest.raises(ProfilesMediatypesException):
+            ZoneRenderer(request, "R08")
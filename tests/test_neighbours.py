@@ -0,0 +1,29 @@
+import pytest
+from rhealpixdggs.dggs import Cell
+from app import app
+from config import TB16Pix
+from grid import DIRECTIONS, iter_cell_ids, neighbour, neighbours, neighbours_batch
+from grid.cells import suid_from_cell_id
+
+
+@pytest.mark.parametrize("resolution", range(5))
+def test_neighbours_match_rhealpixdggs(resolution):
+    # every Zone at the resolution, against rhealpixdggs' Cell.neighbors()
+    ids = list(iter_cell_ids(resolution))
+    batch = neighbours_batch(ids)
+    for i, zone_id in enumerate(ids):
+        expected = [(k, str(v)) for k, v in sorted(Cell(TB16Pix, suid_from_cell_id(zone_id)).neighbors().items())]
+        assert neighbours(zone_id) == expected
+        assert list(batch[i]) == [v for k, v in expected]
+
+
+def test_neighbour():
+    for direction, zone_id in neighbours("R08"):
+        assert neighbour("R08", direction) == zone_id
+    assert [direction for direction, _ in neighbours("R08")] == list(DIRECTIONS)
+
+
+@pytest.mark.parametrize("zone_id", ["X1", "R9", "R08x", ""])
+def test_unknown_zone(zone_id):
+    response = app.test_client().get("/object?uri=https://w3id.org/dggs/tb16pix/zone/{}".format(zone_id))
+    assert response.status_code == 404
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from config import TB16Pix, WGS84_TB16
+from grid import cell_id_from_point, cell_ids_from_points, cell_indices_from_points, index_from_cell_id
+from grid import lonlat_from_xy, packed_ids_from_points, pack, rhealpix_xy
+from grid.tb16pix import TB16PIX_PLANE
+
+RESOLUTIONS = [0, 1, 2, 5, 9, 15]
+
+
+def _expected(lons, lats, resolution):
+    # the Cells rhealpixdggs puts the points in, one Cell object at a time
+    cells = [TB16Pix.cell_from_point(resolution, (lon, lat), plane=False) for lon, lat in zip(lons, lats)]
+    return ["" if c is None else str(c) for c in cells]
+
+
+def _random_points(n=2000, seed=9):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-180, 180, n), np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+
+
+def _edge_points():
+    # the poles, the antimeridian and the base Cells' edges: the meridians a multiple of 90 degrees from lon_0 and
+    # the parallels between the equatorial and polar base Cells
+    edge_lat = float(TB16Pix.rhealpix(0, TB16Pix.ellipsoid.R_A * np.pi / 4, inverse=True)[1])
+    meridians = [WGS84_TB16.lon_0 + 90 * k for k in range(4)] + [-180, 180, 0]
+    parallels = [-90, -edge_lat, -45, 0, 45, edge_lat, 90, -89.999999, 89.999999]
+    lons = [lon for lon in meridians for _ in parallels] + [-180, 180, 179.9999999, -179.9999999] * 3
+    lats = [lat for _ in meridians for lat in parallels] + [0] * 4 + [edge_lat] * 4 + [-edge_lat] * 4
+    return np.array(lons, dtype=np.float64), np.array(lats, dtype=np.float64)
+
+
+def _vertex_points(resolution):
+    # the corners of every Cell at a resolution, which are on the edges of Cells at it and every finer one
+    points = set()
+    for cell in TB16Pix.grid(resolution):
+        points.update(tuple(float(v) for v in p) for p in cell.vertices(plane=False))
+    lons, lats = zip(*sorted(points))
+    return np.array(lons), np.array(lats)
+
+
+@pytest.mark.parametrize("resolution", RESOLUTIONS)
+def test_random_points(resolution):
+    lons, lats = _random_points()
+    assert cell_ids_from_points(lons, lats, resolution).tolist() == _expected(lons, lats, resolution)
+
+
+@pytest.mark.parametrize("resolution", RESOLUTIONS)
+def test_edge_points(resolution):
+    lons, lats = _edge_points()
+    assert cell_ids_from_points(lons, lats, resolution).tolist() == _expected(lons, lats, resolution)
+
+
+@pytest.mark.parametrize("vertex_resolution,resolution", [(0, 0), (0, 3), (1, 1), (1, 4), (2, 2), (2, 6)])
+def test_vertex_points(vertex_resolution, resolution):
+    lons, lats = _vertex_points(vertex_resolution)
+    assert cell_ids_from_points(lons, lats, resolution).tolist() == _expected(lons, lats, resolution)
+
+
+def test_plane():
+    # the grid computations' parameters are rhealpixdggs' own
+    for attribute in ("N_side", "north_square", "south_square", "max_resolution", "ul_vertex"):
+        assert getattr(TB16PIX_PLANE, attribute) == getattr(TB16Pix, attribute), attribute
+    for resolution in range(TB16Pix.max_resolution + 1):
+        assert TB16PIX_PLANE.cell_width(resolution) == TB16Pix.cell_width(resolution)
+
+
+def test_projection():
+    lons, lats = _random_points(500)
+    x, y = rhealpix_xy(lons, lats)
+    expected = np.array([TB16Pix.rhealpix(lon, lat) for lon, lat in zip(lons, lats)])
+    assert np.array_equal(x, expected[:, 0]) and np.array_equal(y, expected[:, 1])
+    lon, lat = lonlat_from_xy(x, y)
+    expected = np.array([TB16Pix.rhealpix(*p, inverse=True) for p in zip(x, y)])
+    assert np.allclose(lon, expected[:, 0], rtol=0, atol=1e-9)
+    assert np.allclose(lat, expected[:, 1], rtol=0, atol=1e-9)
+
+
+def test_off_the_grid():
+    lons = np.array([np.nan, 0, np.inf, 10])
+    lats = np.array([0, np.nan, 0, 20])
+    assert cell_ids_from_points(lons, lats, 3).tolist()[:3] == ["", "", ""]
+    assert cell_indices_from_points(lons, lats, 3).tolist()[:3] == [-1, -1, -1]
+    assert packed_ids_from_points(lons, lats, 3).tolist()[:3] == [-1, -1, -1]
+    assert cell_id_from_point(np.nan, 0, 3) is None
+
+
+def test_indices_and_packed_ids():
+    lons, lats = _random_points(200)
+    ids = _expected(lons, lats, 7)
+    assert cell_indices_from_points(lons, lats, 7).tolist() == [index_from_cell_id(i) for i in ids]
+    assert packed_ids_from_points(lons, lats, 7).tolist() == [pack(i) for i in ids]
+    assert cell_id_from_point(lons[0], lats[0], 7) == ids[0]
+
+
+@pytest.mark.parametrize("resolution", [-1, 16])
+def test_invalid_resolution(resolution):
+    with pytest.raises(ValueError):
+        cell_indices_from_points([0], [0], resolution)
@@ -0,0 +1,149 @@
+import json
+import pytest
+from rdflib import BNode, Graph, Literal, Namespace, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import DCAT, DCTERMS, RDF, RDFS
+from rhealpixdggs.dggs import Cell as RHEALPixCell
+from app import app
+from config import DGGS, TB16Pix, URI_BASE_CELL, URI_BASE_DATASET, URI_BASE_GRID, URI_BASE_ZONE
+from grid.cells import suid_from_cell_id
+from grid.geometry import point_wkt
+from model.cell import Cell
+from model.dataset import Dataset
+from model.profiles import DATASET_PROFILES
+from model.rdf import Lit, alt_profiles_triples, serialize, to_graph
+from model.zone import Zone
+
+GEO = Namespace("http://www.opengis.net/ont/geosparql#")
+GEOX = Namespace("https://linked.data.gov.au/def/geox#")
+
+MEDIATYPES = [("text/turtle", "turtle"), ("application/n-triples", "nt"), ("application/ld+json", "json-ld")]
+
+
+# The graphs the baseline renderers built with rdflib, with the triples added to them since: a Zone's centroid and
+# a Cell's WKT. Neighbours come from rhealpixdggs, as they did in the baseline.
+
+def baseline_zone(zone_id):
+    g = Graph()
+    uri = URIRef(URI_BASE_ZONE[zone_id])
+    g.add((uri, RDF.type, DGGS.Zone))
+    g.add((uri, RDFS.label, Literal("Zone {}".format(zone_id))))
+    g.add((uri, GEO.sfWithin, URIRef(URI_BASE_ZONE[zone_id[:-1] or "Earth"])))
+    for direction, neighbour in RHEALPixCell(TB16Pix, suid_from_cell_id(zone_id)).neighbors().items():
+        neighbour_uri = URIRef(URI_BASE_ZONE[str(neighbour)])
+        bn = BNode()
+        g.add((bn, DGGS.neighbour, neighbour_uri))
+        g.add((bn, DGGS.direction, URIRef(URI_BASE_DATASET[direction.title()])))
+        g.add((uri, DGGS.directionalisedNeighbour, bn))
+        g.add((uri, GEO.sfTouches, neighbour_uri))
+    for c in range(9):
+        g.add((uri, GEO.sfContains, URIRef(uri + str(c))))
+    g.add((uri, GEO.hasDefaultGeometry, URIRef(URI_BASE_CELL[zone_id])))
+    centroid = BNode()
+    g.add((uri, GEO.hasCentroid, centroid))
+    g.add((centroid, RDF.type, GEO.Geometry))
+    g.add((centroid, GEO.asWKT, Literal(point_wkt(*Zone(zone_id).centroid), datatype=GEO.wktLiteral)))
+    return g
+
+
+def baseline_cell(cell_id):
+    g = Graph()
+    uri = URIRef(URI_BASE_CELL[cell_id])
+    g.add((uri, RDF.type, DGGS.Cell))
+    g.add((uri, RDFS.label, Literal("Cell {}".format(cell_id))))
+    g.add((uri, GEOX.asDGGS, Literal("<https://w3id.org/dggs/tb16pix> {}".format(cell_id), datatype=GEOX.dggsLiteral)))
+    g.add((uri, GEO.asWKT, Literal(Cell(cell_id).wkt, datatype=GEO.wktLiteral)))
+    g.add((uri, DCTERMS.isPartOf, URIRef(URI_BASE_GRID[str(len(cell_id) - 1)])))
+    g.add((uri, GEOX.isGeometryOf, URIRef(URI_BASE_ZONE[cell_id])))
+    return g
+
+
+def baseline_earth():
+    g = Graph()
+    uri = URIRef(URI_BASE_ZONE.Earth)
+    g.add((uri, RDF.type, DGGS.Zone))
+    g.add((uri, RDFS.label, Literal("Zone Earth")))
+    for c in "NOPQRS":
+        g.add((uri, GEO.sfContains, URIRef(URI_BASE_ZONE + c)))
+    g.add((uri, GEO.hasDefaultGeometry, URIRef(URI_BASE_CELL.Earth)))
+    return g
+
+
+def baseline_dataset():
+    # the baseline's DCAT RDF failed, treating the dataset as a Zone, so this is the DCAT it now has
+    dataset = Dataset()
+    g = Graph()
+    uri = URIRef(dataset.uri)
+    g.add((uri, RDF.type, DCAT.Dataset))
+    g.add((uri, DCTERMS.title, Literal(dataset.label)))
+    g.add((uri, DCTERMS.description, Literal(dataset.description)))
+    for part_uri, _ in dataset.parts:
+        g.add((uri, DCTERMS.hasPart, URIRef(part_uri)))
+    for distribution_uri, label in dataset.distributions:
+        bn = BNode()
+        g.add((uri, DCAT.distribution, bn))
+        g.add((bn, RDF.type, DCAT.Distribution))
+        g.add((bn, DCTERMS.title, Literal(label)))
+        g.add((bn, DCAT.accessURL, URIRef(distribution_uri)))
+    return g
+
+
+RESOURCES = [
+    ("/object?uri={}".format(URI_BASE_ZONE[zone_id]), lambda zone_id=zone_id: baseline_zone(zone_id))
+    for zone_id in ("N", "S", "R08", "O3", "P66666", "Q8888")
+] + [
+    ("/collections/{}/items/{}".format(len(cell_id) - 1, cell_id), lambda cell_id=cell_id: baseline_cell(cell_id))
+    for cell_id in ("N", "R0837", "P666668", "S44444444")
+] + [
+    ("/object?uri={}".format(URI_BASE_ZONE.Earth), baseline_earth),
+    ("/?_profile=dcat", baseline_dataset),
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("mediatype,format", MEDIATYPES)
+@pytest.mark.parametrize("path,baseline", RESOURCES)
+def test_isomorphic_to_baseline(client, path, baseline, mediatype, format):
+    response = client.get(path + ("&" if "?" in path else "?") + "_mediatype=" + mediatype)
+    assert response.status_code == 200
+    assert response.mimetype == mediatype
+    actual = Graph().parse(data=response.get_data(as_text=True), format=format)
+    assert isomorphic(actual, baseline())
+
+
+@pytest.mark.parametrize("mediatype,format", MEDIATYPES)
+def test_literals(mediatype, format):
+    # datatypes, language-free plain literals and the characters that must be escaped come back unchanged
+    values = ['say "hi"', "back\\slash", "line\nbreak\r\n", "tab\tand unicode é 𝄞", "", "'single'"]
+    s = "https://w3id.org/dggs/tb16pix/zone/R08"
+    triples = [(s, str(RDFS.comment), Lit(v)) for v in values] + [
+        (s, str(GEO.asWKT), Lit("POINT (1.5 -2)", str(GEO.wktLiteral))),
+        (s, str(GEOX.asDGGS), Lit("<https://w3id.org/dggs/tb16pix> R08", str(GEOX.dggsLiteral))),
+    ]
+    g = Graph().parse(data=serialize(triples, mediatype), format=format)
+    s = URIRef(s)
+    assert sorted(str(o) for o in g.objects(s, RDFS.comment)) == sorted(values)
+    assert all(o.datatype is None for o in g.objects(s, RDFS.comment))
+    assert list(g.objects(s, GEO.asWKT)) == [Literal("POINT (1.5 -2)", datatype=GEO.wktLiteral)]
+    assert list(g.objects(s, GEOX.asDGGS)) == [
+        Literal("<https://w3id.org/dggs/tb16pix> R08", datatype=GEOX.dggsLiteral)
+    ]
+
+
+@pytest.mark.parametrize("mediatype,format", MEDIATYPES + [("text/n3", "n3")])
+def test_alt_profiles(mediatype, format):
+    triples = list(alt_profiles_triples("https://w3id.org/dggs/tb16pix", DATASET_PROFILES, "dcat"))
+    actual = Graph().parse(data=serialize(triples, mediatype), format=format)
+    assert isomorphic(actual, to_graph(triples))
+
+
+def test_jsonld_is_expanded():
+    triples = [("https://w3id.org/dggs/tb16pix/zone/R08", str(RDFS.label), Lit("Zone R08"))]
+    assert json.loads(serialize(triples, "application/ld+json")) == [{
+        "@id": "https://w3id.org/dggs/tb16pix/zone/R08",
+        str(RDFS.label): [{"@value": "Zone R08"}],
+    }]
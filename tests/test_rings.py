@@ -0,0 +1,128 @@
+import json
+import random
+import pytest
+from app import app
+from config import RINGS_MAX_K
+from grid import cell_id_from_index, index_from_cell_id, iter_rings, k_rings, num_cells
+from grid.neighbours import neighbours
+
+
+def _rings(zone_ids, k):
+    # the rings by a breadth-first search a Zone at a time over neighbours()
+    seen = set(zone_ids)
+    ring = set(zone_ids)
+    rings = [sorted(ring)]
+    for _ in range(k):
+        following = set()
+        for zone_id in ring:
+            for _, neighbour in neighbours(zone_id):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    following.add(neighbour)
+        if not following:
+            break
+        rings.append(sorted(following))
+        ring = following
+    return rings
+
+
+def _cases():
+    rng = random.Random(3)
+    cases = [(["N"], 5), (["R"], 3), (["N4"], 6), (["S44"], 10), (["O0"], 4), (["N0", "S8"], 8), (["R08"], 0)]
+    for r in range(1, 6):
+        for _ in range(5):
+            cases.append(([cell_id_from_index(rng.randrange(num_cells(r)), r)], rng.randint(0, 20)))
+        # the corners of the cube, where the polar and equatorial base Cells meet
+        for base in "NOPQRS":
+            for digit in "0268":
+                cases.append(([base + digit * r], 8))
+        cases.append(([cell_id_from_index(rng.randrange(num_cells(r)), r) for _ in range(5)], 6))
+    return cases
+
+
+@pytest.mark.parametrize("zone_ids,k", _cases())
+def test_rings(zone_ids, k):
+    rings = k_rings(zone_ids, k)
+    assert rings == _rings(zone_ids, k)
+    assert [ring.tolist() for ring in iter_rings(zone_ids, k)] == [
+        sorted(index_from_cell_id(zone_id) for zone_id in ring) for ring in rings
+    ]
+
+
+def test_fine_corner():
+    zone_id = "N" + "0" * 12
+    assert k_rings([zone_id], 30) == _rings([zone_id], 30)
+
+
+@pytest.mark.parametrize("zone_id", ["P4", "N0", "R88"])
+def test_whole_grid(zone_id):
+    # the rings stop once every Zone of the resolution is in one
+    rings = k_rings([zone_id], 1000)
+    assert len(rings) < 1000
+    disk = [z for ring in rings for z in ring]
+    assert len(disk) == len(set(disk)) == num_cells(len(zone_id) - 1)
+
+
+def test_merged_rings_are_nearest():
+    # with several Zones, each Zone is in the ring of its distance from the nearest of them
+    zone_ids = ["N44", "O80", "S40"]
+    merged = k_rings(zone_ids, 10)
+    nearest = {}
+    for zone_id in zone_ids:
+        for d, ring in enumerate(k_rings([zone_id], 10)):
+            for z in ring:
+                nearest[z] = min(d, nearest.get(z, d))
+    assert merged == [sorted(z for z, d in nearest.items() if d == n) for n in range(len(merged))]
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        k_rings(["R0", "R01"], 2)
+    with pytest.raises(ValueError):
+        list(iter_rings(["R0", "R01"], 2))
+    assert k_rings([], 2) == []
+    assert list(iter_rings([], 2)) == []
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def test_rings_endpoint(client):
+    response = client.get("/zones/R08/rings?k=3")
+    assert response.status_code == 200
+    assert response.get_json() == {"id": "R08", "k": 3, "rings": _rings(["R08"], 3)}
+    response = client.get("/zones/R08/rings?k=3&disk=true")
+    assert response.get_json() == {"id": "R08", "k": 3, "zones": sorted(sum(_rings(["R08"], 3), []))}
+
+
+def test_rings_batch_endpoint(client):
+    response = client.post("/zones/rings?k=2", data="R08\nN\nX1\nEarth\n", content_type="text/plain")
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert records[:2] == [
+        {"id": "R08", "k": 2, "rings": _rings(["R08"], 2)},
+        {"id": "N", "k": 2, "rings": _rings(["N"], 2)},
+    ]
+    assert [r["id"] for r in records[2:]] == ["X1", "Earth"]
+    assert all("error" in r for r in records[2:])
+
+    response = client.post("/zones/rings?k=2&merge=true", json=["R08", "R10"])
+    assert response.get_json() == {"k": 2, "rings": _rings(["R08", "R10"], 2)}
+
+
+@pytest.mark.parametrize("method,path,body", [
+    ("get", "/zones/R08/rings", None),
+    ("get", "/zones/R08/rings?k=-1", None),
+    ("get", "/zones/R08/rings?k={}".format(RINGS_MAX_K + 1), None),
+    ("get", "/zones/Earth/rings?k=1", None),
+    ("get", "/zones/X1/rings?k=1", None),
+    ("post", "/zones/rings?k=1&merge=true", ["R0", "R01"]),
+    ("post", "/zones/rings?k=1&merge=true", ["R0", "X1"]),
+    ("post", "/zones/rings?k=1&merge=true", []),
+    ("post", "/zones/rings?k=x", ["R0"]),
+])
+def test_invalid_requests(client, method, path, body):
+    response = client.get(path) if method == "get" else client.post(path, json=body)
+    assert response.status_code == 400
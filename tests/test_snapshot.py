@@ -0,0 +1,108 @@
+import glob
+import os
+import shutil
+from itertools import product
+import pytest
+from rdflib import BNode, Graph, Literal, URIRef
+import utils
+from config import DATA_DIR
+from snapshot import load_snapshot, write_snapshot
+from utils import GraphStore
+
+EX = "http://example.com/"
+
+
+def _parse(data_dir):
+    graph = Graph()
+    for f in sorted(glob.glob(os.path.join(data_dir, "*.ttl"))):
+        graph.parse(f, format="turtle")
+    return graph
+
+
+@pytest.fixture(scope="module")
+def source():
+    graph = _parse(DATA_DIR)
+    # terms that are awkward to encode: a NUL and a quote in a language-tagged literal, a blank node subject
+    graph.add((URIRef(EX + "s"), URIRef(EX + "p"), Literal("a\x00b\"c", lang="en")))
+    graph.add((BNode("b1"), URIRef(EX + "p"), Literal("1", datatype=URIRef("http://x/int"))))
+    return graph
+
+
+@pytest.fixture(scope="module")
+def path(source, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("snapshot") / "graph.snapshot")
+    write_snapshot(source, path, "test")
+    return path
+
+
+def test_round_trip(source, path):
+    snapshot = load_snapshot(path)
+    assert snapshot.store.version == "test"
+    assert len(snapshot) == len(source)
+    assert set(snapshot) == set(source)
+    assert dict(snapshot.namespaces())["dggs"] == dict(source.namespaces())["dggs"]
+
+
+def test_patterns(source, path):
+    snapshot = load_snapshot(path)
+    triples = list(source)[:25] + [(URIRef(EX + "s"), None, None), (BNode("b1"), None, None)]
+    for triple in triples + [(URIRef(EX + "missing"), None, None)]:
+        for mask in product((True, False), repeat=3):
+            pattern = tuple(t if keep else None for t, keep in zip(triple, mask))
+            assert set(snapshot.triples(pattern)) == set(source.triples(pattern)), pattern
+
+
+def test_invalid(path, tmp_path):
+    truncated = str(tmp_path / "truncated.snapshot")
+    shutil.copy(path, truncated)
+    with open(truncated, "r+b") as f:
+        f.truncate(os.path.getsize(truncated) - 8)
+    assert load_snapshot(truncated) is None
+    with open(truncated, "wb") as f:
+        f.write(b"not a snapshot")
+    assert load_snapshot(truncated) is None
+    assert load_snapshot(str(tmp_path / "missing.snapshot")) is None
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for f in glob.glob(os.path.join(DATA_DIR, "*.ttl")):
+        shutil.copy(f, str(data_dir))
+    monkeypatch.setattr(utils, "DATA_DIR", str(data_dir))
+    return data_dir
+
+
+def test_graph_store(data_dir, tmp_path):
+    snapshot_file = str(tmp_path / "graph.snapshot")
+    store = GraphStore(snapshot_file=snapshot_file, check_seconds=0)
+    graph, version = store.current()
+    assert store.loaded_from == "turtle" and store.loads == 1
+    assert set(graph) == set(_parse(str(data_dir)))
+    assert load_snapshot(snapshot_file).store.version == version
+    # unchanged sources aren't reloaded, and another store loads the snapshot made of them
+    assert store.current() == (graph, version) and store.loads == 1
+    other = GraphStore(snapshot_file=snapshot_file, check_seconds=0)
+    assert other.version == version and other.loaded_from == "snapshot"
+    assert set(other.graph) == set(graph)
+
+
+def test_graph_store_reloads(data_dir, tmp_path):
+    store = GraphStore(snapshot_file=str(tmp_path / "graph.snapshot"), check_seconds=0)
+    graph, version = store.current()
+    (data_dir / "extra.ttl").write_text("<{0}s> <{0}p> \"added\" .\n".format(EX))
+    reloaded, new_version = store.current()
+    assert store.loads == 2 and store.loaded_from == "turtle"
+    assert new_version != version
+    assert set(reloaded) == set(graph) | {(URIRef(EX + "s"), URIRef(EX + "p"), Literal("added"))}
+    # a source that is changed back makes the version it had before
+    os.remove(str(data_dir / "extra.ttl"))
+    assert store.version == version and store.loads == 3
+
+
+def test_graph_store_checks_every_check_seconds(data_dir, tmp_path):
+    store = GraphStore(snapshot_file=str(tmp_path / "graph.snapshot"), check_seconds=3600)
+    version = store.version
+    (data_dir / "extra.ttl").write_text("<{0}s> <{0}p> \"added\" .\n".format(EX))
+    assert store.version == version and store.loads == 1
@@ -0,0 +1,196 @@
+import csv
+import io
+import json
+import time
+from functools import partial
+from itertools import chain, islice
+import pytest
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import DCTERMS, RDF, RDFS
+import app as app_module
+import sparql
+from app import app
+from config import DGGS, URI_BASE_CELL, URI_BASE_GRID, URI_BASE_ZONE
+from grid import neighbours, num_cells
+from model.earth import Earth
+from model.rdf import GEO, GEOX, earth_triples, grid_triples
+from sparql import DGGSStore, QueryTimeout, _term, query
+from utils import GRAPH_STORE
+
+RESOLUTION = 2  # the materialised graph has Earth and the Zones and Cells of Grids 0 - 2
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return GRAPH_STORE.graph
+
+
+@pytest.fixture(scope="module")
+def materialised(graph):
+    g = Graph()
+    for triple in graph:
+        g.add(triple)
+    computed = chain(
+        earth_triples(Earth("Earth")), *(grid_triples(r, 0, num_cells(r)) for r in range(RESOLUTION + 1))
+    )
+    for triple in computed:
+        g.add(tuple(_term(t) for t in triple))
+    return g
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+def _zone(zone_id):
+    return URIRef(URI_BASE_ZONE[zone_id])
+
+
+def _cell(cell_id):
+    return URIRef(URI_BASE_CELL[cell_id])
+
+
+# patterns whose matches are all in the materialised graph: bound subjects of Grids 0 - 2 and objects that only
+# Zones and Cells of Grids 0 - 2 refer to
+PATTERNS = [
+    (_zone("Earth"), None, None),
+    (_zone("R"), None, None),
+    (_zone("R08"), None, None),
+    (_zone("N44"), GEO.sfTouches, None),
+    (_zone("S"), DGGS.directionalisedNeighbour, None),
+    (_cell("P6"), None, None),
+    (_cell("Q26"), GEO.asWKT, None),
+    (_zone("R0"), RDFS.label, Literal("Zone R0")),
+    (_zone("R0"), RDFS.label, Literal("Zone R1")),
+    (BNode("R08_n2"), None, None),
+    (None, None, _zone("Earth")),
+    (None, None, _zone("R")),
+    (None, None, _zone("O3")),
+    (None, GEO.sfWithin, _zone("N4")),
+    (None, None, _cell("R0")),
+    (None, DCTERMS.isPartOf, URIRef(URI_BASE_GRID["1"])),
+    (None, None, Literal("Zone S44")),
+    (None, None, Literal("Cell P1")),
+    (None, None, Literal("<https://w3id.org/dggs/tb16pix> Q", datatype=GEOX.dggsLiteral)),
+    (None, None, BNode("N4_c")),
+    (_zone("R08"), GEO.sfContains, None),
+    (None, RDFS.label, Literal("Zone R", lang="en")),
+    (None, URIRef("http://example.org/unknown"), None),
+    (URIRef("http://example.org/unknown"), None, None),
+]
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_patterns(graph, materialised, pattern):
+    matches = [triple for triple, _ in DGGSStore(graph, batch_size=7).triples(pattern)]
+    assert len(matches) == len(set(matches)), "repeated triples"
+    assert set(matches) == set(materialised.triples(pattern))
+
+
+def test_static_graph(graph):
+    # the static dataset graph's own triples are matched too
+    subject = next(iter(graph.subjects(RDF.type, None)))
+    store = DGGSStore(graph)
+    assert set(t for t, _ in store.triples((subject, None, None))) >= set(graph.triples((subject, None, None)))
+
+
+def test_walk_is_coarsest_first(graph, materialised):
+    # an unbound pattern matches the static graph, then walks Earth and the Grids in order, so its first matches
+    # are those of Grids 0 - 2
+    expected = set(materialised.triples((None, RDF.type, DGGS.Zone)))
+    walked = islice((t for t, _ in DGGSStore(graph).triples((None, RDF.type, DGGS.Zone))), len(expected))
+    assert set(walked) == expected
+
+
+def test_select(graph):
+    result = query("SELECT ?parent WHERE { <%s> geo:sfWithin ?parent }" % _zone("R08"), graph)
+    assert [row[0] for row in result] == [_zone("R0")]
+    result = query(
+        "SELECT ?n WHERE { <%s> dggs:directionalisedNeighbour [ dggs:neighbour ?n ] } ORDER BY ?n" % _zone("R08"), graph
+    )
+    assert [str(row[0]).split("/")[-1] for row in result] == sorted(n for _, n in neighbours("R08"))
+
+
+def test_ask(graph):
+    assert query("ASK { <%s> geo:sfContains <%s> }" % (_zone("R0"), _zone("R08")), graph).askAnswer
+    assert not query("ASK { <%s> geo:sfContains <%s> }" % (_zone("R1"), _zone("R08")), graph).askAnswer
+
+
+def test_construct(graph, materialised):
+    result = query("CONSTRUCT { ?s ?p ?o } WHERE { VALUES ?s { <%s> } ?s ?p ?o }" % _cell("R08"), graph)
+    expected = Graph()
+    for triple in materialised.triples((_cell("R08"), None, None)):
+        expected.add(triple)
+    assert isomorphic(result.graph, expected)
+
+
+def test_limit_stops_the_walk(graph):
+    # without the LIMIT, this would walk every Zone of every Grid
+    started = time.perf_counter()
+    result = query("SELECT ?z WHERE { ?z a dggs:Zone } LIMIT 10", graph)
+    assert len(list(result)) == 10
+    assert time.perf_counter() - started < 5
+
+
+def test_timeout(graph):
+    started = time.perf_counter()
+    with pytest.raises(QueryTimeout):
+        list(query("SELECT (COUNT(?z) AS ?n) WHERE { ?z a dggs:Zone }", graph, timeout=0.5))
+    assert time.perf_counter() - started < 5
+
+
+def test_endpoint_select(client):
+    q = "SELECT ?parent WHERE { <%s> geo:sfWithin ?parent }" % _zone("R08")
+    response = client.get("/sparql", query_string={"query": q})
+    assert response.status_code == 200
+    assert response.mimetype == "application/sparql-results+json"
+    assert json.loads(response.get_data(as_text=True)) == {
+        "head": {"vars": ["parent"]},
+        "results": {"bindings": [{"parent": {"type": "uri", "value": str(_zone("R0"))}}]},
+    }
+    response = client.post("/sparql", data=q, content_type="application/sparql-query", headers={"Accept": "text/csv"})
+    assert response.mimetype == "text/csv"
+    assert list(csv.reader(io.StringIO(response.get_data(as_text=True)))) == [["parent"], [str(_zone("R0"))]]
+    response = client.post("/sparql", data={"query": q, "_mediatype": "application/sparql-results+xml"})
+    assert response.mimetype == "application/sparql-results+xml"
+    assert str(_zone("R0")) in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize("mediatype", ["text/csv", "text/turtle", "nonsense", "application/sparql-results+json"])
+def test_endpoint_ask(client, mediatype):
+    # an ASK result can't be CSV, so a _mediatype it can't be given in is negotiated instead
+    q = "ASK { <%s> geo:sfContains <%s> }" % (_zone("R0"), _zone("R08"))
+    response = client.get("/sparql", query_string={"query": q, "_mediatype": mediatype})
+    assert response.status_code == 200
+    assert response.mimetype == "application/sparql-results+json"
+    assert response.get_json() == {"head": {}, "boolean": True}
+
+
+def test_endpoint_ask_xml(client):
+    q = "ASK { <%s> geo:sfContains <%s> }" % (_zone("R1"), _zone("R08"))
+    response = client.get("/sparql", query_string={"query": q}, headers={"Accept": "application/sparql-results+xml"})
+    assert response.mimetype == "application/sparql-results+xml"
+    assert "false" in response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize("mediatype,format,expected", [
+    ("application/n-triples", "nt", "application/n-triples"),
+    ("text/csv", "turtle", "text/turtle"),
+])
+def test_endpoint_construct(client, materialised, mediatype, format, expected):
+    q = "CONSTRUCT { <%s> ?p ?o } WHERE { <%s> ?p ?o }" % (_cell("S4"), _cell("S4"))
+    response = client.get("/sparql", query_string={"query": q, "_mediatype": mediatype})
+    assert response.status_code == 200
+    assert response.mimetype == expected
+    actual = Graph().parse(data=response.get_data(as_text=True), format=format)
+    assert set(actual) == set(materialised.triples((_cell("S4"), None, None)))
+
+
+def test_endpoint_errors(client, monkeypatch):
+    assert client.get("/sparql").status_code == 400
+    assert client.get("/sparql", query_string={"query": "SELECT WHERE {"}).status_code == 400
+    monkeypatch.setattr(app_module, "sparql_query", partial(sparql.query, timeout=0.5))
+    response = client.post("/sparql", data={"query": "SELECT (COUNT(?z) AS ?n) WHERE { ?z a dggs:Zone }"})
+    assert response.status_code == 503
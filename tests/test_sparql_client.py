@@ -0,0 +1,170 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from sparql_client import ResultCache, SPARQLClient, SPARQLClientError
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """A stand-in SPARQL endpoint that echoes queries, answers 'busy' with 503s and 'flaky' with 503s for its
+    first two requests and 'bad' with a 400, counting the requests it has running at once"""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        query = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.requests += 1
+        try:
+            if query == "busy" or (query == "flaky" and server.failures < 2):
+                server.failures += 1
+                status, body = 503, b"busy"
+            elif query == "bad":
+                status, body = 400, b"syntax error"
+            else:
+                time.sleep(0.05)
+                status, body = 200, '{{"query": "{}"}}'.format(query).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.lock = threading.Lock()
+    server.active = server.peak = server.requests = server.failures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = SPARQLClient("http://127.0.0.1:{}/sparql".format(server.server_port), backoff=0.01, pool_size=4)
+    yield client
+    client.close()
+
+
+def test_cached(client, server):
+    assert client.query("a") == '{"query": "a"}'
+    assert client.query("a") == '{"query": "a"}'
+    assert client.query("a", accept="text/csv") == '{"query": "a"}'
+    assert client.requests == server.requests == 2
+    assert client.cache.stats()["hits"] == 1
+    assert client.cache.stats()["misses"] == 2
+    assert client.retried == client.errors == 0
+
+
+def test_uncached(server):
+    client = SPARQLClient("http://127.0.0.1:{}/sparql".format(server.server_port), cache_size=0)
+    client.query("a")
+    client.query("a")
+    assert client.cache is None
+    assert client.requests == server.requests == 2
+    client.close()
+
+
+def test_retried(client, server):
+    assert client.query("flaky") == '{"query": "flaky"}'
+    assert client.retried == 2
+    assert client.errors == 0
+    assert client.requests == server.requests == 3
+    assert client.connections == 1
+
+
+def test_retries_run_out(server):
+    client = SPARQLClient("http://127.0.0.1:{}/sparql".format(server.server_port), retries=2, backoff=0.01)
+    with pytest.raises(SPARQLClientError) as e:
+        client.query("busy")
+    assert e.value.status == 503
+    assert client.retried == 2
+    assert client.errors == 1
+    assert server.requests == 3
+    assert client.cache.stats()["entries"] == 0
+    client.close()
+
+
+def test_error_response(client, server):
+    for _ in range(2):
+        with pytest.raises(SPARQLClientError) as e:
+            client.query("bad")
+        assert e.value.status == 400
+    # errors aren't retried or cached
+    assert client.retried == 0
+    assert client.errors == 2
+    assert server.requests == 2
+    assert client.cache.stats()["hits"] == 0
+
+
+def test_unreachable():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    client = SPARQLClient("http://127.0.0.1:{}/sparql".format(port), retries=2, backoff=0.01)
+    with pytest.raises(OSError):
+        client.query("a")
+    assert client.retried == 2
+    assert client.errors == 1
+    assert client.connections == 3
+
+
+def test_connections_reused(client, server):
+    queries = ["q{}".format(n) for n in range(40)]
+    assert client.query_many(queries, concurrency=8) == ['{{"query": "{}"}}'.format(q) for q in queries]
+    assert server.peak <= 4, "more than pool_size requests at once"
+    assert client.connections <= 4, "connections weren't reused"
+    assert client.requests == server.requests == 40
+    assert client.stats()["idle_connections"] == client.connections
+    assert client.cache.stats()["misses"] == 40
+
+    # the same queries again all come from the cache
+    client.query_many(queries, concurrency=8)
+    assert server.requests == 40
+    assert client.cache.stats()["hits"] == 40
+
+
+def test_closed_idle_connection(client, server):
+    client.query("a")
+    for connection in list(client._idle.queue):
+        connection.sock.shutdown(socket.SHUT_RDWR)
+    # the dead pooled connection is replaced without counting as a retry
+    assert client.query("b") == '{"query": "b"}'
+    assert client.retried == client.errors == 0
+    assert client.connections == 2
+
+
+def test_result_cache():
+    cache = ResultCache(2, 60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts b, the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {
+        "hits": 2, "misses": 1, "expiries": 0, "entries": 2, "max_entries": 2, "max_seconds": 60
+    }
+
+    cache = ResultCache(2, 0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expiries"] == 1
+
+
+def test_invalid_endpoint():
+    with pytest.raises(ValueError):
+        SPARQLClient("ftp://example.org/sparql")
@@ -0,0 +1,132 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from flask import request
+from pyldapi import ContainerRenderer, Renderer
+import caching
+import coldstart
+import streams
+from app import app
+from model import CellRenderer, DatasetRenderer, EarthRenderer, StreamingContainerRenderer, ZoneRenderer
+from streams import iter_chunks
+from utils import get_collections
+
+STREAMED = [
+    "/collections/2/items",
+    "/collections/5/items?limit=500",
+    "/collections/3/items?bbox=110,-45,155,-10",
+    "/collections?_profile=mem",
+    "/collections?_profile=alt",
+    "/?_profile=alt",
+    "/object?uri=https://w3id.org/dggs/tb16pix/zone/Earth&_profile=alt",
+    "/object?uri=https://w3id.org/dggs/tb16pix/zone/R08&_profile=alt",
+    "/collections/2/items/R08?_profile=alt",
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize("path", STREAMED)
+def test_streamed(client, monkeypatch, path):
+    monkeypatch.setattr(caching, "RESPONSE_CACHE_STORE", None)
+    streamed = client.get(path, headers={"Accept": "text/html"})
+    assert streamed.status_code == 200 and streamed.mimetype == "text/html"
+    # a streamed response's length isn't known until it's all been written
+    assert "Content-Length" not in streamed.headers
+    monkeypatch.setattr(streams, "STREAM_TEMPLATES", False)
+    whole = client.get(path, headers={"Accept": "text/html"})
+    assert "Content-Length" in whole.headers
+    assert streamed.get_data() == whole.get_data()
+    assert {k: v for k, v in streamed.headers.items() if k != "Server-Timing"} == \
+        {k: v for k, v in whole.headers.items() if k not in ("Server-Timing", "Content-Length")}
+
+
+@pytest.mark.parametrize("renderer,args,path", [
+    (DatasetRenderer, (), "/?_profile=alt"),
+    (EarthRenderer, ("Earth",), "/object?_profile=alt"),
+    (ZoneRenderer, ("R08",), "/object?_profile=alt"),
+    (CellRenderer, ("S4",), "/collections/1/items/S4?_profile=alt"),
+])
+def test_alt_profiles_are_pyldapis(renderer, args, path):
+    with app.test_request_context(path):
+        renderer = renderer(request, *args)
+        assert renderer._render_alt_profile_html().get_data() == Renderer._render_alt_profile_html(renderer).get_data()
+
+
+def test_members_are_pyldapis():
+    with app.test_request_context("/collections?_profile=mem"):
+        collections = get_collections()
+        renderer = StreamingContainerRenderer(
+            request, "https://w3id.org/dggs/tb16pix/grid/", "Collections", "Grids", "https://w3id.org/dggs/tb16pix",
+            "TB16Pix Dataset", collections, len(collections)
+        )
+        streamed = renderer._render_mem_profile_html().get_data()
+        assert streamed == ContainerRenderer._render_mem_profile_html(renderer).get_data()
+
+
+def test_members_may_be_a_generator():
+    with app.test_request_context("/collections?_profile=mem"):
+        collections = get_collections()
+        consumed = []
+
+        def members():
+            for member in collections:
+                consumed.append(member)
+                yield member
+
+        renderer = StreamingContainerRenderer(
+            request, "https://w3id.org/dggs/tb16pix/grid/", "Collections", "Grids", "https://w3id.org/dggs/tb16pix",
+            "TB16Pix Dataset", members(), len(collections)
+        )
+        response = renderer._render_mem_profile_html()
+        assert consumed == []  # not until the page is written
+        body = response.get_data(as_text=True)
+        assert consumed == collections
+        assert all(label in body for _, label in collections)
+
+
+@pytest.mark.parametrize("pieces,size", [
+    ([], 10),
+    (["a"], 10),
+    (["abc"] * 10, 10),
+    (["abcdefghijklmnop", "q", "r"], 4),
+])
+def test_iter_chunks(pieces, size):
+    chunks = list(iter_chunks(pieces, size))
+    assert "".join(chunks) == "".join(pieces)
+    assert all(len(chunk) >= size for chunk in chunks[:-1])
+
+
+def _render_all(cache_dir):
+    # renders every template in a fresh process and returns how many were compiled rather than loaded
+    code = (
+        "import json\n"
+        "from app import app\n"
+        "compiled = []\n"
+        "compile = app.jinja_env.compile\n"
+        "app.jinja_env.compile = lambda *args, **kwargs: compiled.append(args) or compile(*args, **kwargs)\n"
+        "for name in app.jinja_env.list_templates():\n"
+        "    app.jinja_env.get_template(name)\n"
+        "print(json.dumps([len(app.jinja_env.list_templates()), len(compiled)]))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code], cwd=coldstart.APP_DIR, capture_output=True, text=True, check=True,
+        env=dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir)
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def test_bytecode_cache(tmp_path):
+    cache_dir = str(tmp_path / "templates")
+    templates, compiled = _render_all(cache_dir)
+    assert templates > 0 and compiled == templates
+    assert len([f for f in os.listdir(cache_dir) if f.endswith(".cache")]) == templates
+    # a new process loads them all from the cache
+    assert _render_all(cache_dir) == [templates, 0]
+    # and without a cache directory compiles them again
+    assert _render_all("") == [templates, templates]
@@ -0,0 +1,79 @@
+import random
+import numpy as np
+import pytest
+from grid import (
+    MAX_RESOLUTION,
+    ancestor_of,
+    children_of,
+    grid_index_of,
+    index_from_cell_id,
+    iter_cell_ids,
+    pack,
+    pack_array,
+    pack_grid_index,
+    parent_of,
+    resolution_of,
+    unpack,
+    unpack_array,
+)
+
+
+def _random_ids(n, seed=4):
+    rng = random.Random(seed)
+    return [
+        rng.choice("NOPQRS") + "".join(rng.choice("012345678") for _ in range(rng.randint(0, MAX_RESOLUTION)))
+        for _ in range(n)
+    ]
+
+
+ZONE_IDS = [zone_id for r in range(4) for zone_id in iter_cell_ids(r)] + _random_ids(5000) + [
+    "N", "S888888888888888", "N000000000000000", "R08",
+]
+
+
+def test_round_trips():
+    for zone_id in ZONE_IDS:
+        assert unpack(pack(zone_id)) == zone_id
+    packed = pack_array(ZONE_IDS)
+    assert packed.dtype == np.int64
+    assert packed.tolist() == [pack(zone_id) for zone_id in ZONE_IDS]
+    assert unpack_array(packed).tolist() == ZONE_IDS
+    assert resolution_of(packed).tolist() == [len(zone_id) - 1 for zone_id in ZONE_IDS]
+
+
+def test_sorted_as_ids():
+    assert unpack_array(np.sort(pack_array(ZONE_IDS))).tolist() == sorted(ZONE_IDS)
+
+
+def test_grid_index():
+    for zone_id in ZONE_IDS:
+        index = grid_index_of(pack(zone_id))
+        assert index == index_from_cell_id(zone_id)
+        assert pack_grid_index(index, len(zone_id) - 1) == pack(zone_id)
+
+
+def test_hierarchy():
+    fine = [zone_id for zone_id in ZONE_IDS if 1 < len(zone_id) < MAX_RESOLUTION + 1]
+    packed = pack_array(fine)
+    assert unpack_array(parent_of(packed)).tolist() == [zone_id[:-1] for zone_id in fine]
+    assert unpack_array(ancestor_of(packed, 1)).tolist() == [zone_id[:2] for zone_id in fine]
+    children = children_of(packed)
+    assert children.shape == (len(fine), 9)
+    assert unpack_array(children).tolist() == [zone_id + str(d) for zone_id in fine for d in range(9)]
+
+
+@pytest.mark.parametrize("zone_id", ["", "X1", "N9", "N0123456789012345", "n1"])
+def test_invalid(zone_id):
+    with pytest.raises(ValueError):
+        pack(zone_id)
+    with pytest.raises(ValueError):
+        pack_array(["N1", zone_id])
+
+
+def test_limits():
+    with pytest.raises(ValueError):
+        parent_of(pack_array(["N", "N1"]))
+    with pytest.raises(ValueError):
+        children_of(pack_array(["S888888888888888"]))
+    with pytest.raises(ValueError):
+        ancestor_of(pack_array(["N1"]), 2)
@@ -1,10 +1,21 @@
-import pickle
+import hashlib
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from datetime import datetime, timezone
 from rdflib import Graph
 from rdflib.namespace import RDF, RDFS
 import glob
 from os.path import join
 from config import *
-from rhealpixdggs.dggs import Cell
+from grid.cells import CELLS0, NUM_CHILDREN
+from grid.neighbours import DIRECTIONS, neighbours, neighbours_batch
+from grid.points import cell_ids_from_points
+from grid.rings import k_rings
+from grid.zoneid import MAX_RESOLUTION
+from snapshot import SnapshotStore, load_snapshot, write_snapshot
 
 
 def calculate_level(zone_id):
@@ -25,10 +36,10 @@ def calculate_parent(zone_id):
 
 def calculate_children(zone_id):
     if zone_id == "Earth":
-        return [(URI_BASE_ZONE + zone_id + str(n), zone_id + str(n)) for n in ["N", "O", "P", "Q", "R", "S"]]
+        return [(URI_BASE_ZONE + n, n) for n in CELLS0]
     else:
-        if len(zone_id) < 10:
-            return [(URI_BASE_ZONE + zone_id + str(n), zone_id + str(n)) for n in range(8)]
+        if len(zone_id) <= MAX_RESOLUTION:
+            return [(URI_BASE_ZONE + zone_id + str(n), zone_id + str(n)) for n in range(NUM_CHILDREN)]
         else:
             return None
 
@@ -43,55 +54,271 @@ def _suid_from_string(zone_id):
             return [zone_id[0]] + [int(x) for x in zone_id[1:]]
 
 
+_ZONE_ID = re.compile("[NOPQRS][0-8]*")
+
+
 def calculate_neighbours(zone_id):
     if zone_id == "Earth":
         return None
     else:
-        c = Cell(TB16Pix, _suid_from_string(zone_id))
-        neighbours = []
-        for k, v in sorted(c.neighbors().items()):
-            neighbours.append((k, str(v)))
-        return neighbours
-
-
-def _load_graph_from_pickle(pickle_file_path):
-    try:
-        with open(pickle_file_path, "rb") as fg:
-            gr = pickle.load(fg)
-            return gr
-    except Exception:
-        return None
+        if _ZONE_ID.fullmatch(zone_id) is None:
+            raise ValueError("'{}' is not a TB16Pix Zone ID".format(zone_id))
+        # table-driven, from the Zone ID alone; matches rhealpixdggs' Cell.neighbors(), see grid/neighbours.py
+        return neighbours(zone_id)
+
+
+def is_zone_id(zone_id):
+    return zone_id == "Earth" or (len(zone_id) <= MAX_RESOLUTION + 1 and _ZONE_ID.fullmatch(zone_id) is not None)
+
+
+def _zone_records(zone_ids, fields):
+    valid = [z for z in zone_ids if z != "Earth" and is_zone_id(z)]
+    if "neighbours" in fields and valid:
+        # the same table-driven engine as calculate_neighbours(), for the whole batch at once
+        neighbour_ids = dict(zip(valid, neighbours_batch(valid).tolist()))
+    for zone_id in zone_ids:
+        if not is_zone_id(zone_id):
+            yield {"id": zone_id, "error": "Not a TB16Pix Zone ID"}
+            continue
+        record = {"id": zone_id, "uri": str(URI_BASE_ZONE[zone_id])}
+        if "parent" in fields:
+            parent = calculate_parent(zone_id)
+            record["parent"] = parent[1] if parent is not None else None
+        if "children" in fields:
+            children = calculate_children(zone_id)
+            record["children"] = [c[1] for c in children] if children is not None else []
+        if "neighbours" in fields:
+            record["neighbours"] = dict(zip(DIRECTIONS, neighbour_ids[zone_id])) if zone_id != "Earth" else None
+        if "geometry" in fields:
+            record["defaultGeometry"] = str(URI_BASE_CELL[zone_id])
+        yield record
+
+
+ZONE_RECORD_FIELDS = ("parent", "children", "neighbours", "geometry")
+
+
+def iter_zone_records(zone_ids, fields=ZONE_RECORD_FIELDS, batch_size=BULK_BATCH_SIZE):
+    """Yields a dict describing each of zone_ids: its parent, children, neighbours and default geometry (Cell)
+
+    The IDs are consumed, and records made, batch_size at a time, so any number of Zones can be described in
+    bounded memory. Invalid IDs get a record with an "error" instead.
+    """
+    batch = []
+    for zone_id in zone_ids:
+        batch.append(zone_id)
+        if len(batch) >= batch_size:
+            yield from _zone_records(batch, fields)
+            batch = []
+    if batch:
+        yield from _zone_records(batch, fields)
+
+
+def ring_record(zone_ids, k, disk=False):
+    """The rings of Zones around one or more Zones of the same resolution, up to k steps out, as
+    grid.rings.k_rings() gives them, or with disk, the sorted IDs of all the Zones within k steps"""
+    rings = k_rings(zone_ids, k)
+    if disk:
+        return {"k": k, "zones": sorted(zone_id for ring in rings for zone_id in ring)}
+    return {"k": k, "rings": rings}
+
+
+def iter_ring_records(zone_ids, k, disk=False):
+    """Yields the ring_record() of each of zone_ids, with its "id". Invalid IDs, and Earth, which has no
+    neighbours, get a record with an "error" instead"""
+    for zone_id in zone_ids:
+        if zone_id == "Earth" or not is_zone_id(zone_id):
+            yield {"id": zone_id, "error": "Not a TB16Pix Zone ID" if zone_id != "Earth" else "Earth has no neighbours"}
+        else:
+            yield dict(id=zone_id, **ring_record([zone_id], k, disk))
+
+
+def _point_records(points, resolution):
+    valid = [
+        (lon, lat) for _, lon, lat in points
+        if lon is not None and lat is not None and -180 <= lon <= 180 and -90 <= lat <= 90
+    ]
+    zone_ids = iter(cell_ids_from_points([p[0] for p in valid], [p[1] for p in valid], resolution).tolist()) \
+        if valid else iter(())
+    for point_id, lon, lat in points:
+        record = {} if point_id is None else {"id": point_id}
+        if lon is None or lat is None or not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            record["error"] = "Not a lon/lat point within -180,-90,180,90"
+        else:
+            record["lon"] = lon
+            record["lat"] = lat
+            record["zone"] = next(zone_ids)
+        yield record
+
+
+def iter_point_records(points, resolution, batch_size=BULK_BATCH_SIZE):
+    """Yields a dict giving the Zone at the given resolution that contains each of the (id, lon, lat) points
+
+    Points are consumed, and projected onto the grid all at once with grid.points.cell_ids_from_points(),
+    batch_size at a time. Points that are missing or out of range get a record with an "error" instead.
+    """
+    batch = []
+    for point in points:
+        batch.append(point)
+        if len(batch) >= batch_size:
+            yield from _point_records(batch, resolution)
+            batch = []
+    if batch:
+        yield from _point_records(batch, resolution)
 
 
-def pickle_graph_to_file(gr, pickle_file_path):
-    with open(pickle_file_path, "wb") as pf:
-        pickle.dump(gr, pf)
+def _source_files():
+    return sorted(glob.glob(join(DATA_DIR, "*.ttl")))
+
+
+def _source_signature():
+    """A cheap signature of the data/*.ttl sources (name, mtime, size) used to detect changes"""
+    signature = []
+    for f in _source_files():
+        st = os.stat(f)
+        signature.append((os.path.basename(f), st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def _source_version():
+    """A content hash of the data/*.ttl sources, identical on every host that holds the same data"""
+    h = hashlib.sha1()
+    for f in _source_files():
+        h.update(os.path.basename(f).encode())
+        with open(f, "rb") as fh:
+            h.update(fh.read())
+    return h.hexdigest()[:16]
+
+
+class GraphStore:
+    """The static dataset graph, loaded once per process and shared, read-only, by all request threads
+
+    The data/*.ttl sources are checked at most every GRAPH_CHECK_SECONDS and the graph is reloaded if they have
+    changed. The graph is a read-only, memory-mapped snapshot of the sources (see snapshot.py), shared by all the
+    processes that load it, which is made from the sources when there isn't one of their content version, so a
+    stale snapshot is never used. If the snapshot can't be written, the graph parsed from the sources is used.
+    """
+    def __init__(self, snapshot_file=GRAPH_SNAPSHOT_FILE, check_seconds=GRAPH_CHECK_SECONDS):
+        self.snapshot_file = snapshot_file
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._current = (None, None)
+        self._signature = None
+        self._checked = 0.0
+        self.loaded_from = None
+        self._modified = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.loads = 0
+
+    def current(self):
+        """Returns the current (graph, version) pair, reloading first if the sources have changed"""
+        if self._current[0] is None or time.monotonic() - self._checked >= self.check_seconds:
+            self._refresh()
+        return self._current
+
+    @property
+    def graph(self):
+        return self.current()[0]
+
+    @property
+    def version(self):
+        return self.current()[1]
+
+    @property
+    def modified(self):
+        """When the sources were last changed: the newest of their modification times, as a UTC datetime"""
+        self.current()
+        return self._modified
+
+    def _refresh(self):
+        with self._lock:
+            # another thread may have refreshed while this one waited
+            if self._current[0] is not None and time.monotonic() - self._checked < self.check_seconds:
+                return
+            signature = _source_signature()
+            if self._current[0] is None or signature != self._signature:
+                self._load(signature)
+            self._checked = time.monotonic()
+
+    def _load(self, signature):
+        start = time.perf_counter()
+        version = _source_version()
+        G = load_snapshot(self.snapshot_file)
+        if G is not None and G.store.version == version:
+            loaded_from = "snapshot"
+        else:
+            G = Graph()
+            G.bind("dggs", DGGS)
+            for f in _source_files():
+                G.parse(f, format="turtle")
+            loaded_from = "turtle"
+            try:
+                write_snapshot(G, self.snapshot_file, version)
+                G = load_snapshot(self.snapshot_file) or G
+            except (OSError, ValueError) as e:
+                logging.warning("Could not write graph snapshot {}: {}".format(self.snapshot_file, e))
+
+        # swap in the new graph in one assignment so readers never see a partial graph or a mismatched version
+        self._current = (G, version)
+        self._signature = signature
+        self._modified = datetime.fromtimestamp(max([s[1] for s in signature] + [0]) / 1e9, timezone.utc)
+        self.loaded_from = loaded_from
+        self.loaded_at = datetime.now(timezone.utc)
+        self.load_seconds = time.perf_counter() - start
+        self.loads += 1
+        logging.info(
+            "Loaded graph version {} from {}: {} triples in {:.3f}s".format(
+                version, loaded_from, len(G), self.load_seconds
+            )
+        )
+
+    def stats(self):
+        G, version = self.current()
+        return {
+            "version": version,
+            "triples": len(G),
+            "loaded_from": self.loaded_from,
+            "snapshot": G.store.stats() if isinstance(G.store, SnapshotStore) else None,
+            "modified": self._modified.isoformat(),
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_seconds": round(self.load_seconds, 6),
+            "loads": self.loads,
+        }
+
+
+GRAPH_STORE = GraphStore()
+
+
+@lru_cache(maxsize=64)
+def markdown_html(text, extensions=()):
+    """Markdown text as HTML. The HTML of static text, such as README.md, is made once per process"""
+    import markdown  # slow to import, so only when it's first needed
+
+    return markdown.markdown(text, extensions=list(extensions))
 
 
 def make_cached_graph():
-    G = Graph()
-    G.bind("dggs", DGGS)
+    return GRAPH_STORE.graph
 
-    if not os.path.isfile(PICKLED_G_FILE):
-        for f in glob.glob(join(APP_DIR, "data", "*")):
-            G.parse(f, format="turtle")
-        pickle_graph_to_file(G, PICKLED_G_FILE)
-    else:
-        G = _load_graph_from_pickle(PICKLED_G_FILE)
 
-    return G
+_collections_cache = (None, None)
 
 
 def get_collections():
+    global _collections_cache
+    g, version = GRAPH_STORE.current()
+    if _collections_cache[0] == version:
+        return list(_collections_cache[1])
+
     collections = []
-    g = make_cached_graph()
     for s in g.subjects(predicate=RDF.type, object=DGGS.Grid):
         for o in g.objects(subject=s, predicate=RDFS.label):
             collections.append((str(s), str(o)))
 
     collections = sorted(collections)
     collections.insert(0, collections.pop(-1))  # move Earth to first place
-    return collections
+    _collections_cache = (version, collections)
+    return list(collections)
 
 
 if __name__ == "__main__":